@@ -0,0 +1,177 @@
+"""
+Compare the original row-by-row imported energy attribution with the vectorized pipeline in
+ba_stats, on synthetic daily EIA data (no API key or network needed).
+
+python benchmarks/attribution_benchmark.py --days 365 --neighbours 12
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from my_climate_dashboard_backend.ba_stats import (
+    consumed_locally_by_source_ba,
+    eia_pages_to_dataframe,
+    get_energy_generated_and_consumed_locally,
+    usage_by_ba_and_generation_type,
+)
+
+FUEL_TYPES = ["Coal", "Natural gas", "Nuclear", "Solar", "Wind", "Hydro", "Other"]
+
+
+def synthetic_frames(local_ba, neighbours, days, seed=0):
+    """
+    Daily interchange, demand and grid mix frames shaped like the get_eia_*_daily helpers return
+    them
+    """
+    rng = np.random.default_rng(seed)
+    first_day = datetime.date(2023, 1, 1)
+    periods = [(first_day + datetime.timedelta(days=day)).isoformat() for day in range(days)]
+
+    interchange = [
+        {"period": period, "fromba": neighbour, "toba": local_ba, "value": rng.normal(0, 1000)}
+        for period in periods for neighbour in neighbours
+    ]
+    demand = [
+        {
+            "period": period, "respondent": local_ba, "type-name": type_name,
+            "value": rng.uniform(5e4, 1e5),
+        }
+        for period in periods for type_name in ["Demand", "Net generation", "Total interchange"]
+    ]
+    mix = [
+        {"period": period, "respondent": ba, "type-name": fuel_type, "value": rng.uniform(0, 2e4)}
+        for period in periods for ba in [local_ba, *neighbours] for fuel_type in FUEL_TYPES
+    ]
+    return (
+        eia_pages_to_dataframe([interchange], "daily").rename(
+            columns={"value": "Interchange to local BA (MWh)"}
+        ),
+        eia_pages_to_dataframe([demand], "daily").rename(columns={"value": "Demand (MWh)"}),
+        eia_pages_to_dataframe([mix], "daily").rename(columns={"value": "Generation (MWh)"}),
+    )
+
+
+# The original implementation, with the EIA fetches taken out
+def legacy_consumed_locally_by_source_ba(local_ba, interchange_df, demand_df):
+    energy_generated_and_used_locally = demand_df.groupby("timestamp").apply(
+        get_energy_generated_and_consumed_locally
+    )
+    consumed_locally_column_name = "Power consumed locally (MWh)"
+    energy_imported_then_consumed_locally_by_source_ba = (
+        interchange_df.groupby(["timestamp", "fromba"], observed=True)[
+            "Interchange to local BA (MWh)"
+        ].sum().astype(int)
+        .apply(lambda interchange: max(interchange, 0))
+    )
+    return pd.concat(
+        [
+            energy_imported_then_consumed_locally_by_source_ba.rename(
+                consumed_locally_column_name
+            ).reset_index("fromba"),
+            pd.DataFrame(
+                {
+                    "fromba": local_ba,
+                    consumed_locally_column_name: energy_generated_and_used_locally,
+                }
+            ),
+        ]
+    ).reset_index()
+
+
+def legacy_usage_by_ba_and_generation_type(
+        energy_consumed_locally_by_source_ba, generation_types_by_ba
+):
+    generation_types_by_ba = generation_types_by_ba.rename(
+        {"respondent": "fromba", "type-name": "generation_type"}, axis="columns"
+    ).astype({"fromba": str})
+    total_generation_by_source_ba = generation_types_by_ba.groupby(["timestamp", "fromba"])[
+        "Generation (MWh)"
+    ].sum()
+    generation_types_by_ba_with_totals = generation_types_by_ba.join(
+        total_generation_by_source_ba,
+        how="left",
+        on=["timestamp", "fromba"],
+        rsuffix=" Total",
+    )
+    generation_types_by_ba_with_totals["Generation (% of BA generation)"] = (
+        generation_types_by_ba_with_totals["Generation (MWh)"]
+        / generation_types_by_ba_with_totals["Generation (MWh) Total"]
+    )
+    full_df_reindexed = generation_types_by_ba_with_totals.merge(
+        energy_consumed_locally_by_source_ba.astype({"fromba": str}).rename(
+            {"Power consumed locally (MWh)": "Power consumed locally from source BA (MWh)"},
+            axis="columns",
+        ),
+        on=["timestamp", "fromba"],
+    ).set_index(["timestamp", "fromba", "generation_type"])
+    return (
+        (
+            full_df_reindexed["Power consumed locally from source BA (MWh)"]
+            * full_df_reindexed["Generation (% of BA generation)"]
+        )
+        .rename("Usage (MWh)")
+        .reset_index()
+    )
+
+
+def timed(function, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def sorted_usage(usage):
+    usage = usage.astype({"fromba": str, "generation_type": str})
+    return usage.sort_values(["timestamp", "fromba", "generation_type"], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--neighbours", type=int, default=12)
+    args = parser.parse_args()
+
+    local_ba = "PSEI"
+    neighbours = [f"N{i:02d}" for i in range(args.neighbours)]
+    interchange_df, demand_df, mix_df = synthetic_frames(local_ba, neighbours, args.days)
+
+    legacy_consumed_time, legacy_consumed = timed(
+        legacy_consumed_locally_by_source_ba, local_ba, interchange_df, demand_df
+    )
+    consumed_time, consumed = timed(
+        consumed_locally_by_source_ba, local_ba, interchange_df, demand_df
+    )
+    legacy_usage_time, legacy_usage = timed(
+        legacy_usage_by_ba_and_generation_type, legacy_consumed, mix_df
+    )
+    usage_time, usage = timed(usage_by_ba_and_generation_type, consumed, mix_df)
+
+    pd.testing.assert_frame_equal(
+        legacy_consumed.astype({"fromba": str}), consumed.astype({"fromba": str}), check_dtype=False
+    )
+    pd.testing.assert_frame_equal(
+        sorted_usage(legacy_usage), sorted_usage(usage), check_dtype=False
+    )
+
+    print(
+        f"{args.days} days, {args.neighbours} neighbouring BAs, {len(mix_df)} grid mix rows "
+        "(results match)"
+    )
+    print(f"{'stage':<40}{'legacy (s)':>12}{'vectorized (s)':>16}{'speedup':>10}")
+    for stage, legacy, vectorized in [
+        ("consumed locally by source BA", legacy_consumed_time, consumed_time),
+        ("usage by BA and generation type", legacy_usage_time, usage_time),
+    ]:
+        print(f"{stage:<40}{legacy:>12.4f}{vectorized:>16.4f}{legacy / vectorized:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
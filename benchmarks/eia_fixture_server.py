@@ -0,0 +1,237 @@
+"""
+Local stand-in for the EIA API, serving synthetic or recorded responses with EIA's paging.
+
+Run it and point the app at it:
+
+python benchmarks/eia_fixture_server.py --port 8765
+export EIA_API_BASE_URL=http://127.0.0.1:8765/v2/electricity/rto
+flask --app my_climate_dashboard_backend run
+
+Recorded responses are read from --fixtures DIR, one EIA response body per endpoint named
+<url_segment>.json (e.g. fuel-type-data.json), and are filtered by the requested facets and date
+range before paging.
+"""
+import argparse
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+FUEL_TYPES = [
+    ("COL", "Coal"), ("NG", "Natural gas"), ("NUC", "Nuclear"), ("OIL", "Petroleum"),
+    ("SUN", "Solar"), ("WND", "Wind"), ("WAT", "Hydro"), ("OTH", "Other"),
+    ("BAT", "Battery storage"), ("GEO", "Geothermal"),
+]
+REGION_TYPES = [
+    ("D", "Demand"), ("DF", "Day-ahead demand forecast"), ("NG", "Net generation"),
+    ("TI", "Total interchange"),
+]
+LAST_PUBLISHED_HOURS = 6  # like EIA, actuals stop a few hours before now, forecasts go further
+# respondents of queries without facets, i.e. the whole grid
+GRID_BAS = [f"BA{i:02d}" for i in range(20)]
+# like EIA, queries without facets also return rows for the regions and the lower 48, which
+# aggregate BAs
+GRID_REGIONS = {"US48": GRID_BAS, "CAL": GRID_BAS[:10], "NW": GRID_BAS[10:]}
+
+
+def _parse_period(period, end=False):
+    timestamp = datetime.datetime.fromisoformat(period[:10])
+    if len(period) >= 13:
+        timestamp = timestamp.replace(hour=int(period[11:13]))
+    elif end:
+        timestamp += datetime.timedelta(hours=23)
+    return timestamp
+
+
+class SyntheticEIA:
+    """
+    Deterministic hourly/daily EIA-like rows for any respondent and date range, except unknown_bas
+    which get no rows like BAs EIA doesn't know
+    """
+
+    def __init__(self, fuel_types=7, unknown_bas=()):
+        self.fuel_types = FUEL_TYPES[:fuel_types]
+        self.unknown_bas = frozenset(unknown_bas)
+
+    @functools.lru_cache(maxsize=64)
+    def rows(self, url_segment, params_key):
+        params = json.loads(params_key)
+        facets = params.get("facets", {})
+        respondents = (
+            facets.get("respondent") or facets.get("toba")
+            or (["PSEI"] if facets else GRID_BAS + list(GRID_REGIONS))
+        )
+        daily = params.get("frequency") == "daily"
+        now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+
+        start = _parse_period(params["start"])
+        end = _parse_period(params["end"], end=True)
+        step = datetime.timedelta(days=1) if daily else datetime.timedelta(hours=1)
+        periods = []
+        timestamp = start
+        while timestamp <= end:
+            periods.append(timestamp)
+            timestamp += step
+
+        if "fuel-type" in url_segment:
+            series = self.fuel_types
+        elif "interchange" in url_segment:
+            series = [(f"N{i:02d}", f"Neighbour {i}") for i in range(5)]
+        else:
+            series = [
+                (code, name) for code, name in REGION_TYPES
+                if code in facets.get("type", [code]) and not (daily and code == "DF")
+            ]
+
+        rows = []
+        for respondent in respondents:
+            if respondent in self.unknown_bas:
+                continue
+            if "interchange" in url_segment and respondent in GRID_BAS:
+                # whole grid BAs are tied to their neighbours on a ring
+                position = GRID_BAS.index(respondent)
+                series = [(GRID_BAS[(position + offset) % len(GRID_BAS)], "") for offset in (-1, 1)]
+            elif "interchange" in url_segment and respondent in GRID_REGIONS:
+                # regions report interchange with each other, the lower 48 with nobody
+                series = [
+                    (region, "") for region in GRID_REGIONS if region not in (respondent, "US48")
+                ]
+            rng = np.random.default_rng(sum(map(ord, respondent)))
+            scale = rng.uniform(500, 5000, size=len(series))
+            last_published = now - datetime.timedelta(hours=LAST_PUBLISHED_HOURS)
+            for timestamp in reversed(periods):
+                hour = timestamp.hour + timestamp.day * 24
+                for (code, name), series_scale in zip(series, scale):
+                    if code != "DF" and timestamp > last_published:
+                        continue
+                    value = series_scale * (1 + 0.3 * np.sin((hour + len(code)) / 24 * 2 * np.pi))
+                    row = {
+                        "period": timestamp.strftime("%Y-%m-%d" if daily else "%Y-%m-%dT%H"),
+                        "respondent": respondent,
+                        "respondent-name": f"{respondent} synthetic",
+                        "type-name": name,
+                        "value": str(round(value, 1)),
+                        "value-units": "megawatthours",
+                    }
+                    if "fuel-type" in url_segment:
+                        row["fueltype"] = code
+                    elif "interchange" in url_segment:
+                        row = {
+                            "period": row["period"],
+                            "fromba": code,
+                            "fromba-name": name,
+                            "toba": respondent,
+                            "toba-name": row["respondent-name"],
+                            "timezone": "Pacific",
+                            "value": str(round(value - series_scale, 1)),
+                            "value-units": "megawatthours",
+                        }
+                    else:
+                        row["type"] = code
+                    if daily and "timezone" in facets:
+                        row["timezone"] = facets["timezone"][0]
+                    rows.append(row)
+        return rows
+
+
+class RecordedEIA:
+    """
+    Replays recorded EIA responses, filtered by the requested facets and period range
+    """
+
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+
+    @functools.lru_cache(maxsize=16)
+    def _recorded(self, url_segment):
+        with open(os.path.join(self.fixtures_dir, f"{url_segment}.json")) as fixture:
+            content = json.load(fixture)
+        return content.get("response", content)["data"]
+
+    @functools.lru_cache(maxsize=64)
+    def rows(self, url_segment, params_key):
+        params = json.loads(params_key)
+        start, end = params["start"], params["end"]
+        rows = [
+            row for row in self._recorded(url_segment)
+            if start <= row["period"] <= end + "T23"
+            and all(
+                row.get(name) in values
+                for name, values in params.get("facets", {}).items() if name in row
+            )
+        ]
+        return sorted(rows, key=lambda row: row["period"], reverse=True)
+
+
+def make_handler(source, latency):
+    class EIAFixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            path = self.path.split("?")[0].rstrip("/")
+            params = json.loads(self.headers.get("X-Params", "{}"))
+            if path.endswith("/data"):
+                url_segment = path.split("/")[-2]
+                offset, length = params.pop("offset", 0), params.pop("length", 5000)
+                rows = source.rows(url_segment, json.dumps(params, sort_keys=True))
+                body = {"response": {"total": str(len(rows)), "data": rows[offset:offset + length]}}
+            else:
+                body = {"response": {"routes": []}}
+
+            content = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    return EIAFixtureHandler
+
+
+def start_fixture_server(port=0, fixtures_dir=None, fuel_types=7, latency=0.0, unknown_bas=()):
+    """
+    Start the server in a background thread, returns (server, base_url for EIA_API_BASE_URL)
+    """
+    source = RecordedEIA(fixtures_dir) if fixtures_dir else SyntheticEIA(fuel_types, unknown_bas)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(source, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v2/electricity/rto"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--fixtures", help="directory of recorded EIA responses, synthetic data if not given"
+    )
+    parser.add_argument(
+        "--fuel-types", type=int, default=7, help="fuel types per BA in synthetic data"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every response"
+    )
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(args.port, args.fixtures, args.fuel_types, args.latency)
+    print(f"Serving EIA fixtures at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
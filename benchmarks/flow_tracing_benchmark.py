@@ -0,0 +1,121 @@
+"""
+Time the consumption based mix of a whole grid (flow_tracing.FlowNetwork) on a synthetic interchange
+graph about the size of the US one, and check that it conserves energy (no API key or network
+needed).
+
+python benchmarks/flow_tracing_benchmark.py --bas 70 --days 1
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from my_climate_dashboard_backend.flow_tracing import FlowNetwork
+from my_climate_dashboard_backend.timeseries import CompactTimeseries
+
+FUEL_TYPES = ["COL", "NG", "NUC", "OIL", "SUN", "WND", "WAT", "OTH"]
+
+
+def synthetic_grid(ba_count, days, neighbours=4, without_mix=5, seed=0):
+    """
+    {ba_name: mix CompactTimeseries} and a two-sided interchange frame, each BA tied to about
+    `neighbours` others. The last `without_mix` BAs report no mix, like the Canadian and Mexican
+    ones.
+    """
+    rng = np.random.default_rng(seed)
+    ba_names = [f"BA{i:03d}" for i in range(ba_count)]
+    timestamps = pd.date_range("2024-01-01", periods=days * 24, freq="h")
+    hours = len(timestamps)
+
+    mix = {}
+    for ba_name in ba_names[:ba_count - without_mix]:
+        fuels = sorted(rng.choice(
+            len(FUEL_TYPES), size=rng.integers(3, len(FUEL_TYPES)), replace=False
+        ))
+        values = rng.uniform(0, 3000, size=(hours, len(fuels)))
+        mix[ba_name] = CompactTimeseries.from_frame(
+            pd.DataFrame({
+                "timestamp": np.repeat(timestamps, len(fuels)),
+                "fueltype": np.tile(np.asarray(FUEL_TYPES, dtype=object)[fuels], hours),
+                "Generation (MWh)": values.reshape(-1),
+            }),
+            "fueltype",
+            "hourly",
+        )
+
+    # a ring keeps the graph connected, random chords give it loops and multi-hop paths
+    edges = {(i, (i + 1) % ba_count) for i in range(ba_count)}
+    while len(edges) < ba_count * neighbours // 2:
+        a, b = rng.choice(ba_count, size=2, replace=False)
+        if (b, a) not in edges:
+            edges.add((a, b))
+    frames = []
+    for a, b in sorted(edges):
+        flow = rng.normal(0, 500, size=hours)
+        for fromba, toba, sign in ((a, b, 1), (b, a, -1)):  # both ends report the tie line
+            frames.append(pd.DataFrame({
+                "timestamp": timestamps,
+                "fromba": ba_names[fromba],
+                "toba": ba_names[toba],
+                "Interchange (MWh)": sign * flow,
+            }))
+    return mix, pd.concat(frames, ignore_index=True)
+
+
+def timed(function, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--bas", type=int, default=70)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--neighbours", type=int, default=4, help="average tie lines per BA")
+    args = parser.parse_args()
+
+    mix, interchange = synthetic_grid(args.bas, args.days, args.neighbours)
+    build_time, network = timed(lambda: FlowNetwork.from_timeseries(mix, interchange))
+
+    def solve():
+        network._shares = None
+        return network.pool_shares()
+
+    solve_time, shares = timed(solve)
+    mix_time, consumption_mix = timed(network.consumption_mix)
+    source_time, _ = timed(lambda: network.usage_by_source(network.ba_names[0]))
+
+    # every MWh generated is consumed somewhere, plus what BAs reported exporting beyond their pool
+    pool = network.generation.sum(axis=2) + network.flows.sum(axis=1)
+    overexported = np.clip(network.flows.sum(axis=2) - pool, 0, None).sum(axis=1)
+    consumed = consumption_mix.groupby("timestamp")["Consumption (MWh)"].sum().to_numpy()
+    generated = network.generation.sum(axis=(1, 2))
+    share_sums = shares[..., :len(network.fuel_types)].sum(axis=2)
+    assert np.allclose(share_sums[pool > 0], 1), "fuel shares of a pool don't add up to 1"
+    assert np.allclose(consumed, generated + overexported, rtol=1e-6), (
+        "consumption doesn't match generation"
+    )
+
+    print(
+        f"{args.bas} BAs, {args.days * 24} hours, {len(interchange)} interchange rows "
+        "(energy conserved)"
+    )
+    print(f"{'stage':<36}{'seconds':>10}")
+    for stage, seconds in [
+        ("build network", build_time),
+        ("solve pool shares", solve_time),
+        ("consumption mix frame", mix_time),
+        ("usage by source of one BA", source_time),
+    ]:
+        print(f"{stage:<36}{seconds:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
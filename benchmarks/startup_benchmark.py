@@ -0,0 +1,73 @@
+"""
+Time importing the package and calling create_app() in fresh interpreters, like a gunicorn worker
+booting, and check that no heavy library is loaded on the way.
+
+python benchmarks/startup_benchmark.py --repeat 10 --target 0.35
+
+Fails (exit code 1) if the median is above --target seconds or if any of HEAVY_MODULES got imported.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "requests", "matplotlib", "pyarrow", "aiohttp"]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+from my_climate_dashboard_backend import create_app
+t1 = time.perf_counter()
+create_app()
+t2 = time.perf_counter()
+print(json.dumps({
+    "import": t1 - t0,
+    "create_app": t2 - t1,
+    "total": t2 - t0,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--target", type=float, default=0.35,
+        help="maximum median seconds to import and create the app",
+    )
+    args = parser.parse_args()
+
+    measure()  # warm the filesystem and bytecode caches
+    runs = [measure() for _ in range(args.repeat)]
+    heavy_modules = sorted({name for run in runs for name in run["heavy_modules"]})
+    results = {
+        stage: {
+            "median": statistics.median(run[stage] for run in runs),
+            "max": max(run[stage] for run in runs),
+        }
+        for stage in ["import", "create_app", "total"]
+    }
+    print(json.dumps(
+        {"target": args.target, "stages": results, "heavy_modules": heavy_modules}, indent=2
+    ))
+
+    if results["total"]["median"] > args.target or heavy_modules:
+        print(
+            f"startup is above the {args.target}s target or loads {heavy_modules}", file=sys.stderr
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Time every stage from EIA request to Flask response against the local EIA stand-in server,
+without an API key or network access.
+
+python benchmarks/stats_benchmark.py --bas 5 --days 30 --output results.json
+python benchmarks/stats_benchmark.py --bas 5 --days 30 --baseline results.json  # fails on
+regressions
+
+Stages (summed over all BAs, per repeat):
+  http               downloading every page of the mix and demand queries
+  json_decode        decoding the page bodies
+  dataframe_build    building the mix and demand DataFrames and their CompactTimeseries
+  create_green_df    BAStats.create_green_df
+  create_demand_df   BAStats.create_demand_df
+  payload_assembly   BAStats.calculate_stats (the create_*_df frames are memoized by then)
+  serialization      json encoding of the response
+  flask_end_to_end   POST to the stats endpoint with a cold cache, over the default 5 day window
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from eia_fixture_server import start_fixture_server
+from my_climate_dashboard_backend import VERSION, create_app
+from my_climate_dashboard_backend import ba_stats
+from my_climate_dashboard_backend.session import EIA_SESSION
+
+STAGES = [
+    "http", "json_decode", "dataframe_build", "create_green_df", "create_demand_df",
+    "payload_assembly", "serialization", "flask_end_to_end",
+]
+
+
+def download_pages(url_segment, facets, start_date, end_date):
+    """
+    Raw page bodies of a query, paged the same way as get_eia_timeseries
+    """
+    api_url = ba_stats.eia_timeseries_url(url_segment)
+    params = ba_stats.eia_timeseries_params(
+        ba_stats.eia_facets(facets, None), start_date, end_date, "hourly"
+    )
+
+    def get(offset):
+        headers = ba_stats.eia_page_headers(params, offset)
+        return EIA_SESSION.get(api_url, endpoint=url_segment, headers=headers).content
+
+    first = get(0)
+    total = int(json.loads(first)["response"]["total"])
+    offsets = range(ba_stats.EIA_PAGE_LENGTH, total, ba_stats.EIA_PAGE_LENGTH)
+    with ThreadPoolExecutor(max_workers=ba_stats.EIA_PAGE_WORKERS) as executor:
+        return [first, *executor.map(get, offsets)]
+
+
+def timed(timings, stage, function, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[stage] += time.perf_counter() - t0
+    return result
+
+
+def run_once(ba_names, days, client):
+    timings = dict.fromkeys(STAGES, 0.0)
+    rows = {"mix": 0, "demand": 0}
+    today = datetime.date.today()
+    start_date = (today - datetime.timedelta(days=days)).isoformat()
+    windows = {
+        "mix": ("fuel-type-data", "fueltype", (today + datetime.timedelta(days=1)).isoformat()),
+        "demand": ("region-data", "type", (today + datetime.timedelta(days=3)).isoformat()),
+    }
+
+    for ba_name in ba_names:
+        frames = {}
+        for dataset, (url_segment, type_column, end_date) in windows.items():
+            bodies = timed(
+                timings, "http", download_pages,
+                url_segment, {"respondent": [ba_name]}, start_date, end_date,
+            )
+            pages = timed(timings, "json_decode", lambda: [
+                ba_stats.unwrap_eia_response(json.loads(body))["data"] for body in bodies
+            ])
+            frames[dataset] = timed(timings, "dataframe_build", lambda: ba_stats.to_timeseries(
+                ba_stats.categorize_columns(ba_stats.eia_pages_to_dataframe(pages, "hourly"))
+                .rename(columns={"value": "Generation (MWh)"}),
+                type_column,
+            ))
+            rows[dataset] += len(frames[dataset])
+
+        stats = ba_stats.BAStats(ba_name)
+        stats.mix_timeseries, stats.demand_timeseries = frames["mix"], frames["demand"]
+        timed(timings, "create_green_df", stats.create_green_df)
+        timed(timings, "create_demand_df", stats.create_demand_df)
+        response = timed(timings, "payload_assembly", stats.calculate_stats)
+        timed(timings, "serialization", json.dumps, response)
+
+        ba_stats.DATA_CACHE.invalidate()
+        flask_response = timed(
+            timings, "flask_end_to_end", client.post,
+            "/my-climate-dashboard/green-energy-stats", json={"ba_name": ba_name},
+        )
+        if flask_response.status_code != 200:
+            raise RuntimeError(
+                f"stats endpoint returned {flask_response.status_code} for {ba_name}"
+            )
+    return timings, rows
+
+
+def summarize(runs):
+    return {
+        stage: {
+            "median": statistics.median(run[stage] for run in runs),
+            "min": min(run[stage] for run in runs),
+            "mean": statistics.mean(run[stage] for run in runs),
+        }
+        for stage in STAGES
+    }
+
+
+def compare(results, baseline, max_regression):
+    """
+    Returns the stages whose median got slower than the baseline by more than max_regression (a
+    fraction)
+    """
+    regressions = {}
+    for stage, summary in results["stages"].items():
+        previous = baseline["stages"].get(stage, {}).get("median")
+        if previous and summary["median"] > previous * (1 + max_regression):
+            regressions[stage] = {"baseline": previous, "current": summary["median"]}
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--bas", type=int, default=3, help="number of balancing authorities")
+    parser.add_argument("--days", type=int, default=5, help="days of history per query")
+    parser.add_argument(
+        "--fuel-types", type=int, default=7,
+        help="fuel types per BA in synthetic data (rows per hour)",
+    )
+    parser.add_argument(
+        "--fixtures", help="directory of recorded EIA responses, synthetic data if not given"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file instead of stdout")
+    parser.add_argument(
+        "--baseline", help="results JSON of a previous run to check for regressions"
+    )
+    parser.add_argument(
+        "--max-regression", type=float, default=0.25,
+        help="allowed slowdown per stage, as a fraction",
+    )
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(fixtures_dir=args.fixtures, fuel_types=args.fuel_types)
+    ba_stats.EIA_API_BASE_URL = base_url
+    app = create_app()
+    client = app.test_client()
+    ba_names = [f"BA{i:02d}" for i in range(args.bas)]
+
+    runs = []
+    with contextlib.redirect_stdout(io.StringIO()):  # the fetch helpers print progress
+        run_once(ba_names, args.days, client)  # warm up
+        for _ in range(args.repeat):
+            timings, rows = run_once(ba_names, args.days, client)
+            runs.append(timings)
+    server.shutdown()
+
+    results = {
+        "meta": {
+            "sw_version": VERSION,
+            "created": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "bas": args.bas,
+            "days": args.days,
+            "fuel_types": args.fuel_types,
+            "fixtures": args.fixtures,
+            "repeat": args.repeat,
+            "rows": rows,
+        },
+        "stages": summarize(runs),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.max_regression)
+        if regressions:
+            print(json.dumps({"regressions": regressions}, indent=2), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,22 @@ import os
 
 from flask import (
     Flask,
+    Response,
+    make_response,
     redirect,
     render_template,
     request,
     send_from_directory,
     url_for,
 )
-from flask_restful import Resource, Api, reqparse
-from .ba_stats import BAStats
+from flask_restful import Api
+from .baselines import BASELINES
+from .cache import DATA_CACHE
+from .encoding import compress, dumps
+from .metrics import REGISTRY
+from .scheduler import PrecomputedStats
+from .session import EIA_SESSION
+from .views import RESOURCES, views
 
 VERSION = "0.0.0"
 DIRNAME = os.path.dirname(__file__)
@@ -17,37 +25,89 @@ DIRNAME = os.path.dirname(__file__)
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__, instance_relative_config=True)
+    app.config.from_mapping(
+        BA_CACHE_TTL_SECONDS=DATA_CACHE.ttl,
+        BA_CACHE_MAX_ENTRIES=DATA_CACHE.max_entries,
+        EIA_POOL_SIZE=EIA_SESSION.pool_size,
+        EIA_CONNECT_TIMEOUT=EIA_SESSION.connect_timeout,
+        EIA_READ_TIMEOUT=EIA_SESSION.read_timeout,
+        EIA_MAX_RETRIES=EIA_SESSION.max_retries,
+        EIA_BACKOFF_BASE=EIA_SESSION.backoff_base,
+        BASELINE_HORIZON_DAYS=BASELINES.horizon_days,
+        BASELINE_MIN_SAMPLES=BASELINES.min_samples,
+    )
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    DATA_CACHE.configure(
+        ttl=app.config["BA_CACHE_TTL_SECONDS"],
+        max_entries=app.config["BA_CACHE_MAX_ENTRIES"],
+    )
+    EIA_SESSION.configure(
+        pool_size=app.config["EIA_POOL_SIZE"],
+        connect_timeout=app.config["EIA_CONNECT_TIMEOUT"],
+        read_timeout=app.config["EIA_READ_TIMEOUT"],
+        max_retries=app.config["EIA_MAX_RETRIES"],
+        backoff_base=app.config["EIA_BACKOFF_BASE"],
+    )
+    BASELINES.configure(
+        horizon_days=app.config["BASELINE_HORIZON_DAYS"],
+        min_samples=app.config["BASELINE_MIN_SAMPLES"],
+    )
     api = Api(app)
 
+    # responses of the resources below: compact JSON, gzip/br compressed when the client accepts it
+    @api.representation("application/json")
+    def output_json(data, code, headers=None):
+        body, content_encoding = compress(dumps(data), request.headers.get("Accept-Encoding"))
+        response = make_response(body, code)
+        response.headers.extend(headers or {})
+        response.headers["Content-Type"] = "application/json"
+        response.headers["Vary"] = "Accept-Encoding"
+        if content_encoding:
+            response.headers["Content-Encoding"] = content_encoding
+        return response
+
+    # serves the stats precomputed by the prewarm job (my_climate_dashboard_backend prewarm), which
+    # refreshes them in one process for every worker, instead of each worker querying EIA on its own
+    precomputed_stats = PrecomputedStats()
+    app.extensions["precomputed_stats"] = precomputed_stats
+
     # a simple page that says hello
     @app.route('/my-climate-dashboard/hello')
     def hello():
         return 'Hello, World!'
 
-    # Post for climate stats
-    class ClimateStats(Resource):
-        def __init__(self, logger=app.logger):
-            self._required_features = ["ba_name"]
-            self.inputs = reqparse.RequestParser()
-            self.logger=logger
-
-            for feature in self._required_features:
-                self.inputs.add_argument(
-                    feature,
-                    type=str,
-                    required=True,
-                    location="json",
-                    help="No {} provided".format(feature),
-                )
-            super(ClimateStats, self).__init__()
-
-        def post(self):
-            args = self.inputs.parse_args()
-            ba_stats = BAStats(args["ba_name"], logger=self.logger)
-            response = ba_stats.return_stats()
-            return response
-
-    api.add_resource(ClimateStats, "/my-climate-dashboard/green-energy-stats")
+    # hit/miss counters for the shared BA data cache
+    @app.route('/my-climate-dashboard/cache-stats')
+    def cache_stats():
+        return DATA_CACHE.stats()
+
+    # per endpoint latency and retry counts for calls to EIA
+    @app.route('/my-climate-dashboard/eia-stats')
+    def eia_stats():
+        return EIA_SESSION.stats()
+
+    # Prometheus text format metrics: per stage latency histograms, rows/bytes fetched, cache hits
+    @app.route('/my-climate-dashboard/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    # rolling hour of the week statistics behind the green and demand thresholds of a BA
+    @app.route('/my-climate-dashboard/baselines')
+    def baselines():
+        ba_name = request.args.get("ba_name")
+        if not ba_name:
+            return {"message": {"ba_name": "No ba_name provided"}}, 400
+        return BASELINES.to_dict(ba_name)
+
+    # when each pre-warmed BA was last refreshed
+    @app.route('/my-climate-dashboard/prewarm-status')
+    def prewarm_status():
+        return precomputed_stats.status()
+
+    app.register_blueprint(views)
+    for resource, url in RESOURCES:
+        api.add_resource(resource, url)
 
     return app
 
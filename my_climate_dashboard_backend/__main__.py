@@ -0,0 +1,154 @@
+"""
+Command line interface, installed as my_climate_dashboard_backend
+
+my_climate_dashboard_backend fleet --bas PSEI,CISO,BPAT,ERCO --workers 1,2,4 --output fleet.json
+my_climate_dashboard_backend plot PSEI
+my_climate_dashboard_backend prewarm --bas PSEI,CISO
+my_climate_dashboard_backend trace --start 2024-06-01 --end 2024-06-02 --output consumption-mix.csv
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import signal
+import sys
+
+
+def fleet(args):
+    from .fleet import fetch_fleet_data, fleet_throughput
+
+    ba_names = [ba_name for ba_name in args.bas.split(",") if ba_name]
+    if args.bas_file:
+        with open(args.bas_file) as bas_file:
+            ba_names += [line.strip() for line in bas_file if line.strip()]
+    if not ba_names:
+        sys.exit("no BAs given, use --bas or --bas-file")
+    worker_counts = [int(workers) for workers in args.workers.split(",")]
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the fetch helpers print progress
+        data, fetch_errors = fetch_fleet_data(ba_names)
+    print(f"fetched {len(data['mix'])} BAs, {len(fetch_errors)} failed")
+
+    rows = fleet_throughput(data, worker_counts)
+    print(
+        f"{'workers':>8}{'BAs':>6}{'errors':>8}"
+        f"{'startup (s)':>13}{'compute (s)':>13}{'BAs/s':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['workers']:>8}{row['bas']:>6}{row['errors']:>8}"
+            f"{row['startup_seconds']:>13.2f}{row['compute_seconds']:>13.2f}"
+            f"{row['bas_per_second'] or 0:>9.1f}"
+        )
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"fetch_errors": fetch_errors, "throughput": rows}, output_file, indent=2)
+
+
+def plot(args):
+    from .plotting import plot_ba
+
+    plot_ba(args.ba_name.upper())
+
+
+def prewarm(args):
+    from .scheduler import StatsRefresher
+
+    refresher = StatsRefresher(
+        [ba_name for ba_name in args.bas.split(",") if ba_name],
+        publish_minute=args.publish_minute,
+        stagger_seconds=args.stagger_seconds,
+        concurrency=args.concurrency,
+        logger=logging.getLogger("my_climate_dashboard_backend.prewarm"),
+    )
+    if not refresher.ba_names:
+        refresher.logger.info(
+            "no BAs given (--bas or PREWARM_BAS), only refreshing BAs with alert rules"
+        )
+    if not refresher.start():
+        sys.exit(f"another process holds {refresher.lock_path}, it is already pre-warming")
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: refresher.interrupt())
+    refresher.wait()
+    refresher.stop()
+
+
+def trace(args):
+    from .flow_tracing import fetch_flow_network
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the fetch helpers print progress
+        network = fetch_flow_network(args.start, args.end)
+    consumption_mix = network.consumption_mix()
+    print(f"traced {len(network.ba_names)} BAs over {len(network.hours)} hours")
+    if args.output:
+        consumption_mix.to_csv(args.output, index=False)
+    else:
+        totals = (
+            consumption_mix.groupby(["ba_name", "fueltype"])["Consumption (MWh)"]
+            .sum()
+            .unstack(fill_value=0)
+        )
+        print(totals.round(0).to_string())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="my_climate_dashboard_backend", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fleet_parser = commands.add_parser(
+        "fleet", help="compute stats for many BAs on a pool of processes"
+    )
+    fleet_parser.add_argument("--bas", default="", help="comma separated BA names")
+    fleet_parser.add_argument("--bas-file", help="file with one BA name per line")
+    fleet_parser.add_argument(
+        "--workers", default="1,2,4", help="comma separated worker counts to report throughput for"
+    )
+    fleet_parser.add_argument("--output", help="write the throughput table as JSON to this file")
+    fleet_parser.set_defaults(run=fleet)
+
+    plot_parser = commands.add_parser(
+        "plot", help="plot the data behind the stats of a BA (needs matplotlib)"
+    )
+    plot_parser.add_argument("ba_name", nargs="?", default="PSEI")
+    plot_parser.set_defaults(run=plot)
+
+    prewarm_parser = commands.add_parser(
+        "prewarm",
+        help="keep the stats of some BAs precomputed for every worker of the app on this machine",
+    )
+    prewarm_parser.add_argument(
+        "--bas", default=os.environ.get("PREWARM_BAS", ""), help="comma separated BA names"
+    )
+    prewarm_parser.add_argument(
+        "--publish-minute", type=int, default=int(os.environ.get("PREWARM_PUBLISH_MINUTE", 15))
+    )
+    prewarm_parser.add_argument(
+        "--stagger-seconds",
+        type=float,
+        default=float(os.environ.get("PREWARM_STAGGER_SECONDS", 60)),
+    )
+    prewarm_parser.add_argument(
+        "--concurrency", type=int, default=int(os.environ.get("PREWARM_CONCURRENCY", 4))
+    )
+    prewarm_parser.set_defaults(run=prewarm)
+
+    trace_parser = commands.add_parser(
+        "trace", help="consumption based fuel mix of every BA, through all interchange"
+    )
+    trace_parser.add_argument("--start", required=True, help="first day, YYYY-MM-DD")
+    trace_parser.add_argument("--end", required=True, help="last day, YYYY-MM-DD")
+    trace_parser.add_argument(
+        "--output", help="write the hourly mix of every BA as CSV to this file"
+    )
+    trace_parser.set_defaults(run=trace)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.command == "prewarm" else logging.WARNING)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+
+from .encoding import dumps
+from .metrics import REGISTRY, CallbackMetric, Counter
+from .scheduler import seconds_until_minute
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+
+# Fields of a stats response that make up a BA's alert state, an event is sent when any of them
+# changes
+ALERT_FIELDS = [
+    "green_alert_text", "demand_alert_text",
+    "green_ratio_current", "green_threshold_low", "green_threshold_high",
+    "demand_ratio_current", "demand_threshold_low", "demand_threshold_high",
+]
+
+ALERT_EVENTS = REGISTRY.register(Counter(
+    "alert_events_total", "Alert state changes sent to stream subscribers, per BA", ["ba_name"]
+))
+ALERT_EVENTS_DROPPED = REGISTRY.register(Counter(
+    "alert_events_dropped_total",
+    "Alert events replaced by a newer one before a slow subscriber read them",
+))
+
+
+def alert_state(response):
+    """
+    The alert state of a stats response, with the timestamp of the mix it was computed from
+    """
+    state = {"ba_name": response["ba_name"]}
+    state.update({field: response.get(field) for field in ALERT_FIELDS})
+    state["timestamp"] = response.get("source_ratio_current", {}).get("timestamp")
+    return state
+
+
+def format_event(event_id, event, data):
+    """
+    One server-sent event as bytes
+    """
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), dumps(data))
+
+
+class Subscriber:
+    """
+    One stream connection. Holds at most max_pending unsent events: when a slow client falls further
+    behind the oldest is dropped, which loses nothing as every event carries the whole alert state.
+    """
+
+    def __init__(self, ba_name, max_pending=4):
+        self.ba_name = ba_name
+        self._queue = asyncio.Queue(max_pending)
+
+    def offer(self, payload):
+        if self._queue.full():
+            self._queue.get_nowait()
+            ALERT_EVENTS_DROPPED.inc()
+        self._queue.put_nowait(payload)
+
+    async def next(self, timeout):
+        """
+        The next event payload, or None after timeout seconds without one
+        """
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class AlertBroker:
+    """
+    Fans the alert state of each BA out to its stream subscribers, only when it changes.
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(self, max_pending=4):
+        self.max_pending = max_pending
+        self._subscribers = {}  # ba_name: set of Subscriber
+        self._states = {}  # ba_name: (event id, state, event payload)
+        self._last_id = 0
+
+    def subscribe(self, ba_name, last_event_id=None):
+        """
+        Add a subscriber for ba_name. It gets the current state right away unless it has seen it
+        already, i.e. reconnected with the Last-Event-ID of the current state.
+        """
+        ba_name = ba_name.upper()
+        subscriber = Subscriber(ba_name, self.max_pending)
+        self._subscribers.setdefault(ba_name, set()).add(subscriber)
+        current = self._states.get(ba_name)
+        if current is not None and str(current[0]) != last_event_id:
+            subscriber.offer(current[2])
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.ba_name, set())
+        subscribers.discard(subscriber)
+        if not subscribers:
+            # nothing keeps the state of an unwatched BA up to date, the next subscriber has it
+            # computed afresh
+            self._subscribers.pop(subscriber.ba_name, None)
+            self._states.pop(subscriber.ba_name, None)
+
+    def ba_names(self):
+        """
+        BAs with at least one subscriber
+        """
+        return list(self._subscribers)
+
+    def has_state(self, ba_name):
+        return ba_name.upper() in self._states
+
+    def subscriber_counts(self):
+        # also read by metric scrapes from other threads, so iterate over a copy
+        return {
+            ba_name: len(subscribers) for ba_name, subscribers in list(self._subscribers.items())
+        }
+
+    def publish(self, response):
+        """
+        Send the alert state of a stats response to the subscribers of its BA if it changed,
+        returns whether it did
+        """
+        ba_name, state = response["ba_name"].upper(), alert_state(response)
+        current = self._states.get(ba_name)
+        if current is not None and current[1] == state:
+            return False
+
+        self._last_id += 1
+        payload = format_event(self._last_id, "alert", state)
+        self._states[ba_name] = (self._last_id, state, payload)
+        ALERT_EVENTS.inc(ba_name)
+        for subscriber in self._subscribers.get(ba_name, ()):
+            subscriber.offer(payload)
+        return True
+
+
+class AlertPublisher:
+    """
+    Computes the stats of every subscribed BA once per refresh, shortly after EIA publishes each
+    hour, and publishes them to an AlertBroker. compute(ba_name, refresh) is a coroutine returning a
+    stats response, refresh is True when cached data should be refetched.
+    """
+
+    def __init__(self, broker, compute, publish_minute=15, concurrency=4, logger=LOCAL_LOGGER):
+        self.broker = broker
+        self.compute = compute
+        self.publish_minute = publish_minute
+        self.logger = logger
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight = {}  # ba_name: Task, so concurrent callers share one computation
+
+    def ensure_state(self, ba_name):
+        """
+        Start computing the state of a BA nobody subscribed to yet, e.g. for its first subscriber
+        """
+        ba_name = ba_name.upper()
+        if not self.broker.has_state(ba_name):
+            self.refresh(ba_name, refresh=False)
+
+    def refresh(self, ba_name, refresh=True):
+        """
+        Task computing and publishing ba_name, shared with any refresh of it that is already running
+        """
+        task = self._in_flight.get(ba_name)
+        if task is None:
+            task = self._in_flight[ba_name] = asyncio.ensure_future(self._refresh(ba_name, refresh))
+            task.add_done_callback(lambda _: self._in_flight.pop(ba_name, None))
+        return task
+
+    async def _refresh(self, ba_name, refresh):
+        async with self._semaphore:
+            try:
+                self.broker.publish(await self.compute(ba_name, refresh))
+            except Exception:
+                self.logger.exception(f"computing alerts for {ba_name} failed")
+
+    async def refresh_all(self):
+        await asyncio.gather(*(self.refresh(ba_name) for ba_name in self.broker.ba_names()))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(seconds_until_minute(self.publish_minute))
+            await self.refresh_all()
+
+
+# Alert states of the process, shared by every stream connection
+ALERT_BROKER = AlertBroker(max_pending=int(os.environ.get("ALERT_MAX_PENDING", 4)))
+REGISTRY.register(CallbackMetric(
+    "alert_subscribers", "Open alert stream connections, per BA", "gauge",
+    lambda: {(ba_name,): count for ba_name, count in ALERT_BROKER.subscriber_counts().items()},
+    ["ba_name"],
+))
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+
+from aiohttp import web
+
+from .alerts import ALERT_BROKER, AlertPublisher
+from .async_client import AsyncEIAClient
+from .ba_stats import VERSION, BAStats, compact_stats
+from .conditional import is_not_modified, stats_validator, validator_headers
+from .encoding import dumps
+from .metrics import STATS_RESPONSES
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+CLIENT_KEY = web.AppKey("eia_client", AsyncEIAClient)
+PUBLISHER_KEY = web.AppKey("alert_publisher", AlertPublisher)
+# keeps proxies from closing idle streams
+ALERT_HEARTBEAT_SECONDS = float(os.environ.get("ALERT_HEARTBEAT_SECONDS", 15))
+ALERT_WRITE_TIMEOUT_SECONDS = float(os.environ.get("ALERT_WRITE_TIMEOUT_SECONDS", 10))
+ALERT_RETRY_MILLISECONDS = 10000  # how long EventSource clients wait before reconnecting
+
+
+def _not_modified(request, validator):
+    """
+    A 304 response if the client's copy of the stats is the one with this validator, else None
+    """
+    if_none_match, if_modified_since = (
+        request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since")
+    )
+    if is_not_modified(validator, if_none_match, if_modified_since):
+        STATS_RESPONSES.inc("304")
+        return web.Response(status=304, headers=validator_headers(validator))
+    return None
+
+
+async def green_energy_stats(request):
+    try:
+        ba_name = (await request.json())["ba_name"]
+    except (ValueError, KeyError, TypeError):
+        return web.json_response({"message": {"ba_name": "No ba_name provided"}}, status=400)
+
+    # the stats that computing them now would give, from the cached data
+    validator = stats_validator(str(ba_name), VERSION, request.query.get("format"))
+    not_modified = _not_modified(request, validator)
+    if not_modified is not None:
+        return not_modified
+
+    ba_stats = BAStats(str(ba_name), logger=LOCAL_LOGGER)
+    response = await ba_stats.return_stats_async(request.app[CLIENT_KEY])
+    # the validator of what the response was actually computed from, a refresh that brought no new
+    # data still saves sending the body
+    validator = ba_stats.stats_validator(request.query.get("format"))
+    not_modified = _not_modified(request, validator)
+    if not_modified is not None:
+        return not_modified
+    if request.query.get("format") == "compact":
+        response = compact_stats(response)
+    STATS_RESPONSES.inc("200")
+    web_response = web.Response(
+        body=dumps(response), content_type="application/json", headers=validator_headers(validator)
+    )
+    # gzip, deflate or br (with brotli installed), as the client accepts
+    web_response.enable_compression()
+    return web_response
+
+
+async def alert_stream(request):
+    """
+    Server-sent events with the alert state of ?ba_name=, sent on connect and whenever it changes
+    """
+    ba_name = request.query.get("ba_name")
+    if not ba_name:
+        return web.json_response({"message": {"ba_name": "No ba_name provided"}}, status=400)
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx would otherwise hold the events back
+    })
+    await response.prepare(request)
+    subscriber = ALERT_BROKER.subscribe(ba_name, request.headers.get("Last-Event-ID"))
+    request.app[PUBLISHER_KEY].ensure_state(ba_name)
+    try:
+        await response.write(b"retry: %d\n\n" % ALERT_RETRY_MILLISECONDS)
+        while True:
+            payload = await subscriber.next(ALERT_HEARTBEAT_SECONDS)
+            # write() waits while the client's socket buffer is full. A client that stays stuck that
+            # long is dropped, its EventSource reconnects and gets the current state.
+            await asyncio.wait_for(
+                response.write(payload or b": heartbeat\n\n"), ALERT_WRITE_TIMEOUT_SECONDS
+            )
+    except (ConnectionResetError, asyncio.TimeoutError):
+        LOCAL_LOGGER.debug(f"alert stream of {ba_name} closed")
+    finally:
+        ALERT_BROKER.unsubscribe(subscriber)
+    return response
+
+
+async def _compute_stats(app, ba_name, refresh):
+    ba_stats = BAStats(ba_name, logger=LOCAL_LOGGER)
+    if refresh:
+        ba_stats.expire_cached_data()
+    return await ba_stats.return_stats_async(app[CLIENT_KEY])
+
+
+async def _alert_publisher(app):
+    # recomputes each subscribed BA once per hour, for all of its subscribers
+    publisher = AlertPublisher(
+        ALERT_BROKER,
+        lambda ba_name, refresh: _compute_stats(app, ba_name, refresh),
+        publish_minute=int(os.environ.get("PREWARM_PUBLISH_MINUTE", 15)),
+        logger=LOCAL_LOGGER,
+    )
+    app[PUBLISHER_KEY] = publisher
+    task = asyncio.ensure_future(publisher.run())
+    yield
+    task.cancel()
+
+
+async def _eia_client(app):
+    # one connection pool for the whole process, closed when the app shuts down
+    async with AsyncEIAClient() as client:
+        app[CLIENT_KEY] = client
+        yield
+
+
+def create_async_app():
+    """
+    asyncio version of the stats endpoint, plus the alert stream, e.g. run with
+    gunicorn "my_climate_dashboard_backend.async_app:create_async_app()" --worker-class
+    aiohttp.GunicornWebWorker
+    """
+    app = web.Application()
+    app.cleanup_ctx.append(_eia_client)
+    app.cleanup_ctx.append(_alert_publisher)
+    app.router.add_post("/my-climate-dashboard/green-energy-stats", green_energy_stats)
+    app.router.add_get("/my-climate-dashboard/alerts", alert_stream)
+    return app
@@ -0,0 +1,242 @@
+import asyncio
+import datetime
+import json
+import logging
+import time
+
+try:
+    import aiohttp
+except ImportError:  # the async client is optional, install with pip install -e .[async]
+    aiohttp = None
+
+from .ba_stats import (
+    EIA_PAGE_LENGTH,
+    EIA_PAGE_WORKERS,
+    categorize_columns,
+    eia_facets,
+    eia_page_headers,
+    eia_pages_to_dataframe,
+    eia_rto_url,
+    eia_timeseries_params,
+    eia_timeseries_url,
+    unwrap_eia_response,
+)
+from .metrics import EIA_RESPONSE_BYTES, EIA_ROWS_FETCHED
+from .session import EIA_SESSION, RETRY_STATUS_CODES
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+
+
+class AsyncEIAClient:
+    """
+    asyncio version of the get_eia_* helpers, sharing one aiohttp connection pool.
+    Retries, timeouts and latency/retry counters follow the settings of EIA_SESSION.
+
+    async with AsyncEIAClient() as client:
+        data = await client.get_eia_grid_mix_timeseries(["PSEI"], start_date="2024-01-01",
+        end_date="2024-01-02")
+
+    The local data store (EIA_STORE_DIR) is not used on this path.
+    """
+
+    def __init__(self, max_connections=100, page_concurrency=EIA_PAGE_WORKERS, logger=LOCAL_LOGGER):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncEIAClient needs aiohttp, install it with pip install -e .[async]"
+            )
+        self.max_connections = max_connections
+        self.page_concurrency = page_concurrency  # pages of one query fetched at the same time
+        self.logger = logger
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=EIA_SESSION.connect_timeout,
+                    sock_read=EIA_SESSION.read_timeout,
+                ),
+            )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_json(self, url, endpoint=None, headers=None):
+        """
+        GET url with retries, returns (status, decoded json or None)
+        """
+        endpoint = endpoint or url.split("?")[0]
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    retryable = response.status in RETRY_STATUS_CODES
+                    if not retryable or attempt >= EIA_SESSION.max_retries:
+                        content = None
+                        if response.status < 400:
+                            body = await response.read()
+                            EIA_RESPONSE_BYTES.inc(endpoint, amount=len(body))
+                            content = json.loads(body)
+                        EIA_SESSION.record(
+                            endpoint, time.perf_counter() - t0, attempt, response.status >= 400
+                        )
+                        return response.status, content
+                    retry_after = response.headers.get("Retry-After")
+                    self.logger.warning(f"EIA {endpoint} returned {response.status}, retrying")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if attempt >= EIA_SESSION.max_retries:
+                    EIA_SESSION.record(endpoint, time.perf_counter() - t0, attempt, True)
+                    raise
+                # only the type: the error's message holds the URL, api_key and all
+                self.logger.warning(f"EIA {endpoint} failed with {type(error).__name__}, retrying")
+
+            await asyncio.sleep(EIA_SESSION.backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    async def _get_eia_page(self, api_url, params, offset, endpoint=None):
+        status, response_content = await self.get_json(
+            api_url, endpoint, eia_page_headers(params, offset)
+        )
+        if response_content is None:
+            print(f"EIA API returned {status}")
+            return None
+        return unwrap_eia_response(response_content)
+
+    async def get_api_data(self):
+        """
+        Returns available data from the api
+        """
+        status, response_content = await self.get_json(
+            eia_rto_url(),
+            endpoint="rto",
+        )
+        return response_content
+
+    async def get_eia_timeseries(
+            self,
+            url_segment,
+            facets,
+            value_column_name="value",
+            start_date=None,
+            end_date=None,
+            frequency="daily",
+            timezone="Pacific",
+    ):
+        """
+        Same as ba_stats.get_eia_timeseries, the remaining pages are fetched concurrently on the
+        event loop
+        """
+        await self.open()
+        today = datetime.date.today()
+        start_date = start_date or (today - datetime.timedelta(days=365)).isoformat()
+        end_date = end_date or today.isoformat()
+        api_url = eia_timeseries_url(url_segment)
+        params = eia_timeseries_params(
+            eia_facets(facets, timezone), start_date, end_date, frequency
+        )
+
+        response_content = await self._get_eia_page(api_url, params, offset=0, endpoint=url_segment)
+        if response_content is None:
+            return None
+
+        pages = [response_content["data"]]
+        total = int(response_content.get("total", len(pages[0])))
+        offsets = range(EIA_PAGE_LENGTH, total, EIA_PAGE_LENGTH)
+        if len(offsets) > 0:
+            print(f"{total} rows available, fetching {len(offsets)} more page(s)")
+            semaphore = asyncio.Semaphore(self.page_concurrency)
+
+            async def get_page(offset):
+                async with semaphore:
+                    return await self._get_eia_page(api_url, params, offset, endpoint=url_segment)
+
+            for page in await asyncio.gather(*(get_page(offset) for offset in offsets)):
+                if page is None:
+                    return None
+                pages.append(page["data"])
+
+        # building the frame is CPU work, keep it off the event loop
+        dataframe = await asyncio.to_thread(eia_pages_to_dataframe, pages, frequency)
+        EIA_ROWS_FETCHED.inc(url_segment, amount=len(dataframe))
+        return categorize_columns(dataframe).rename(columns={"value": value_column_name})
+
+    async def get_eia_interchange_timeseries_daily(self, balancing_authorities, **kwargs):
+        """
+        Fetch electricity interchange data (imports & exports from other utilities)
+        """
+        return await self.get_eia_timeseries(
+            url_segment="daily-interchange-data",
+            facets={"toba": balancing_authorities},
+            value_column_name="Interchange to local BA (MWh)",
+            **kwargs,
+        )
+
+    async def get_eia_net_demand_and_generation_timeseries_daily(
+            self, balancing_authorities, **kwargs
+    ):
+        """
+        Fetch electricity demand data
+        """
+        return await self.get_eia_timeseries(
+            url_segment="daily-region-data",
+            facets={
+                "respondent": balancing_authorities,
+                "type": ["D", "NG", "TI"],  # Filter out the "Demand forecast" (DF) type
+            },
+            value_column_name="Demand (MWh)",
+            **kwargs,
+        )
+
+    async def get_eia_grid_mix_timeseries_daily(self, balancing_authorities, **kwargs):
+        """
+        Fetch electricity generation data by fuel type
+        """
+        return await self.get_eia_timeseries(
+            url_segment="daily-fuel-type-data",
+            facets={"respondent": balancing_authorities},
+            value_column_name="Generation (MWh)",
+            **kwargs,
+        )
+
+    async def get_eia_grid_mix_timeseries(
+            self, balancing_authorities, frequency="hourly", **kwargs
+    ):
+        """
+        Fetch electricity generation data by fuel type
+        """
+        return await self.get_eia_timeseries(
+            url_segment="fuel-type-data",
+            facets={"respondent": balancing_authorities},
+            value_column_name="Generation (MWh)",
+            frequency=frequency,
+            timezone=None,
+            **kwargs,
+        )
+
+    async def get_eia_demand_forecast_generation_interchange(
+            self, balancing_authorities, frequency="hourly", **kwargs
+    ):
+        """
+        Fetch hourly demand with demand "D", demand forecast "DF", generation as "NG" and
+        interchange as "TI"
+        """
+        return await self.get_eia_timeseries(
+            url_segment="region-data",
+            facets={"respondent": balancing_authorities},
+            value_column_name="Generation (MWh)",
+            frequency=frequency,
+            timezone=None,
+            **kwargs,
+        )
@@ -1,15 +1,27 @@
+import asyncio
 import logging
 import os
-import time
 import datetime
-import requests
 import json
 import copy
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 
+from .baselines import BASELINES
+from .cache import DATA_CACHE
+from .metrics import EIA_RESPONSE_BYTES, EIA_ROWS_FETCHED, STAGE_SECONDS
+from .session import EIA_SESSION
+from .store import EIAStore
+from .timeseries import PERIOD_FORMATS, CompactTimeseries
+
 VERSION = "0.0.0"
 EIA_API_KEY = os.environ.get("EIA_API_KEY")
+# Point this at a stand-in server to run without network, e.g. benchmarks/eia_fixture_server.py
+EIA_API_BASE_URL = os.environ.get("EIA_API_BASE_URL", "https://api.eia.gov/v2/electricity/rto")
+EIA_PAGE_LENGTH = 5000  # This is the maximum allowed
+EIA_PAGE_WORKERS = int(os.environ.get("EIA_PAGE_WORKERS", 4))
 DUMMY_RESPONSE = {
     "created": datetime.datetime.now().isoformat(),
     "sw_version": VERSION,
@@ -26,91 +38,502 @@ LOCAL_LOGGER = logging.getLogger(__name__)
 LOW_THRESHOLD_PCT = 0.75
 HIGH_THRESHOLD_PCT = 1.1
 
+# Optional local store of fetched data, shared by every worker on the machine
+EIA_STORE = EIAStore(os.environ["EIA_STORE_DIR"]) if os.environ.get("EIA_STORE_DIR") else None
+
+# Only fetch periods newer than the cached data when it expires, instead of the whole window
+INCREMENTAL_REFRESH = os.environ.get("BA_INCREMENTAL_REFRESH", "1") == "1"
+INCREMENTAL_OVERLAP_HOURS = 2  # EIA revises the most recent hours, so refetch a few of them
+MIX_WINDOW_DAYS = (5, 1)  # days back, days ahead
+DEMAND_WINDOW_DAYS = (5, 3)  # forecasts go a few days ahead
+# Value dtype of the cached CompactTimeseries, float32 halves their size but rounds the values in
+# the responses
+TIMESERIES_DTYPE = np.dtype(os.environ.get("BA_TIMESERIES_DTYPE", "float64"))
+# Label columns that repeat on every row, stored as categoricals to save memory
+CATEGORICAL_COLUMNS = [
+    "respondent", "respondent-name", "fueltype", "type", "type-name", "value-units",
+    "fromba", "fromba-name", "toba", "toba-name", "timezone",
+]
+GREEN_FUEL_TYPES = ['SUN', 'WND', 'NUC', 'WAT']
+# Alert texts by level: 1 above the high threshold, -1 below the low one
+DEMAND_ALERT_TEXTS = {
+    1: f"Demand Energy {int(HIGH_THRESHOLD_PCT*100)}% Higher Than Normal: Shed Loads!",
+    -1: f"Demand Energy {int(LOW_THRESHOLD_PCT*100)}% Lower Than Normal: Plug in Loads!",
+    0: "",
+}
+GREEN_ALERT_TEXTS = {
+    1: f"Green Energy {int(HIGH_THRESHOLD_PCT * 100)}% Higher Than Normal: Plug in Loads!",
+    -1: f"Green Energy {int(LOW_THRESHOLD_PCT * 100)}% Lower Than Normal: Shed Loads!",
+    0: "",
+}
+
+# Frames derived from fetched data (e.g. its green ratios), by id() of the fetched
+# CompactTimeseries. An entry lives exactly as long as its fetched data, so replacing the cached
+# data invalidates it.
+_DERIVED_FRAMES = {}
+
+
+def derived_frames(source):
+    """
+    Returns the {kind: derived frame} memo of the fetched data source
+    """
+    memo = _DERIVED_FRAMES.get(id(source))
+    if memo is None:
+        memo = _DERIVED_FRAMES[id(source)] = {}
+        weakref.finalize(source, _DERIVED_FRAMES.pop, id(source), None)
+    return memo
+
+
+def green_ratio_by_period(mix):
+    """
+    Green and total generation and their ratio per period of a mix CompactTimeseries, newest first
+    """
+    values = mix.values
+    green_rows = mix.rows_of(GREEN_FUEL_TYPES)
+    # Only the periods with some green generation, newest first
+    hours = np.flatnonzero((~np.isnan(values[green_rows])).any(axis=0))[::-1]
+
+    green_df = pd.DataFrame({
+        'period': np.asarray(mix.periods(mix.hours[hours]), dtype=object),
+        'Generation (MWh)_green': np.nansum(values[green_rows][:, hours], axis=0, dtype=np.float64),
+        'Generation (MWh)_total': np.nansum(values[:, hours], axis=0, dtype=np.float64),
+    })
+    # Calculate the ratio (Solar+Wind) / total
+    green_df['Green ratio'] = (
+        green_df['Generation (MWh)_green'] / green_df['Generation (MWh)_total']
+    )
+    green_df['Date'] = mix.timestamps(mix.hours[hours])
+    return green_df
+
+
+def demand_by_period(demand):
+    """
+    Demand next to its forecast per period of a demand CompactTimeseries, without the columns
+    normalized over the whole window
+    """
+    actual, forecast = demand.row('D'), demand.row('DF')
+    hours = np.flatnonzero(~np.isnan(actual) & ~np.isnan(forecast))[::-1]
+
+    demand_df = pd.DataFrame({
+        'period': np.asarray(demand.periods(demand.hours[hours]), dtype=object),
+        'respondent': demand.label('D', 'respondent'),
+        'Demand': actual[hours].astype(np.float64),
+        'value-units': demand.label('D', 'value-units'),
+        'Demand Forecast': forecast[hours].astype(np.float64),
+    })
+    demand_df['Demand ratio'] = demand_df['Demand'] / demand_df['Demand Forecast']
+    demand_df['Demand diff'] = demand_df['Demand'] - demand_df['Demand Forecast']
+    return demand_df
+
+
+def normalize_demand(demand_df):
+    """
+    Add demand and forecast relative to the highest demand of the window
+    """
+    max_demand = demand_df['Demand'].max()
+    demand_df.insert(5, 'Demand_norm', demand_df['Demand'] / max_demand)
+    demand_df.insert(6, 'Demand Forecast_norm', demand_df['Demand Forecast'] / max_demand)
+    return demand_df
+
+
+def append_green_ratio(previous_green_df, mix, since, window_start):
+    """
+    green_ratio_by_period of mix, reusing previous_green_df for the periods before since
+    """
+    dates = previous_green_df["Date"]
+    kept = previous_green_df[(dates < since) & (dates >= window_start)]
+    new = green_ratio_by_period(mix.since(since))
+    return pd.concat([new, kept], ignore_index=True)
+
+
+def append_demand(previous_demand_df, demand, since, window_start):
+    """
+    create_demand_df of demand, reusing previous_demand_df for the periods before since
+    """
+    periods = pd.to_datetime(previous_demand_df["period"])
+    kept = previous_demand_df[(periods < since) & (periods >= window_start)]
+    kept = kept.drop(columns=['Demand_norm', 'Demand Forecast_norm'])
+    new = demand_by_period(demand.since(since))
+    return normalize_demand(pd.concat([new, kept], ignore_index=True))
+
+
+# How each kind of derived frame is brought up to date after an incremental refresh
+DERIVED_APPENDERS = {"green": append_green_ratio, "demand": append_demand}
+
+
+def default_window(days_back, days_ahead):
+    """
+    Returns (start_date, end_date) iso strings relative to today
+    """
+    return (
+        (datetime.date.today() - datetime.timedelta(days=days_back)).isoformat(),
+        (datetime.date.today() + datetime.timedelta(days=days_ahead)).isoformat(),
+    )
+
+
+def to_timeseries(dataframe, type_column, frequency="hourly"):
+    """
+    CompactTimeseries of a single BA's frame from the get_eia_* helpers, None stays None
+    """
+    if dataframe is None:
+        return None
+    return CompactTimeseries.from_frame(dataframe, type_column, frequency, dtype=TIMESERIES_DTYPE)
+
+
 class BAStats:
     """
     Class that handles pulling data and calculating stats for a specific BA
     """
 
-    def __init__(self, ba_name, logger=LOCAL_LOGGER ):
-        self.data_mix = pd.DataFrame()
-        self.data_demand = pd.DataFrame()
+    def __init__(
+            self,
+            ba_name,
+            logger=LOCAL_LOGGER,
+            cache=None,
+            incremental=INCREMENTAL_REFRESH,
+            baselines=None,
+    ):
+        self._derived = {}
+        self.mix_timeseries = None
+        self.demand_timeseries = None
         self.data_mix_datetime = None
         self.data_demand_datetime = None
+        self.baseline_token = None  # versions of the baselines the last stats were computed with
         self.ba_name = ba_name.upper()
         self.logger = logger
+        self.cache = DATA_CACHE if cache is None else cache
+        self.incremental = incremental
+        self.baselines = BASELINES if baselines is None else baselines
         self.logger.info(f"initialized with {self.ba_name}")
 
-    def get_data_mix(self,
-                     start_date_input=(datetime.date.today() - datetime.timedelta(days=5)).isoformat(),  # 5 days ago
-                     end_date_input=(datetime.date.today() + datetime.timedelta(days=1)).isoformat(),  # tomorrow
-                     ):
+    # The fetched data is held as CompactTimeseries, shared with the cache and other BAStats so
+    # don't modify them. data_mix and data_demand give the long format DataFrames, which are only
+    # built when asked for.
+    @property
+    def mix_timeseries(self):
+        return self._mix_timeseries
+
+    @mix_timeseries.setter
+    def mix_timeseries(self, mix_timeseries):
+        # new data, so the green ratios have to be derived again
+        self._mix_timeseries = mix_timeseries
+        self._data_mix = None
+        self._derived.pop("green", None)
+
+    @property
+    def demand_timeseries(self):
+        return self._demand_timeseries
+
+    @demand_timeseries.setter
+    def demand_timeseries(self, demand_timeseries):
+        self._demand_timeseries = demand_timeseries
+        self._data_demand = None
+        self._derived.pop("demand", None)
+
+    @property
+    def data_mix(self):
+        if self._data_mix is None:
+            self._data_mix = (
+                pd.DataFrame() if self._mix_timeseries is None else self._mix_timeseries.to_frame()
+            )
+        return self._data_mix
+
+    @data_mix.setter
+    def data_mix(self, data_mix):
+        self.mix_timeseries = None if data_mix.empty else to_timeseries(data_mix, "fueltype")
+        self._data_mix = data_mix
+
+    @property
+    def data_demand(self):
+        if self._data_demand is None:
+            self._data_demand = (
+                pd.DataFrame() if self._demand_timeseries is None
+                else self._demand_timeseries.to_frame()
+            )
+        return self._data_demand
+
+    @data_demand.setter
+    def data_demand(self, data_demand):
+        self.demand_timeseries = None if data_demand.empty else to_timeseries(data_demand, "type")
+        self._data_demand = data_demand
+
+    def _derive(self, kind, source, build):
+        """
+        Memoized build(), shared with other BAStats through the fetched data it was derived from
+        """
+        if kind not in self._derived:
+            memo = derived_frames(source)
+            if kind not in memo:
+                memo[kind] = build()
+            self._derived[kind] = memo[kind]
+        return self._derived[kind]
+
+    @STAGE_SECONDS.time("get_data_mix")
+    def get_data_mix(self, start_date_input=None, end_date_input=None, frequency="hourly"):
 
         self.logger.info("Getting data")
-        # only get new data if it is more than an hour old
-        if (self.data_mix_datetime is None) or (self.data_mix_datetime > (datetime.datetime.now() - datetime.timedelta(hours=1))):
-            # This provides generation mix, but only goes up to 00 the day before, T08 = 00H PST
-            self.data_mix = get_eia_grid_mix_timeseries(
-                [self.ba_name],
-                # Get last 5 days of data
-                start_date=start_date_input,
-                end_date=end_date_input,
-                frequency="hourly"
-            ).copy()
-
-            self.data_mix_datetime = datetime.datetime.now().isoformat()
-            print(f"Received mix data up to {max(self.data_mix['timestamp'])}!")
-
-    def get_data_demand(self,
-                        start_date_input=(datetime.date.today() - datetime.timedelta(days=5)).isoformat(),  # 5 days ago,
-                        end_date_input=(datetime.date.today() + datetime.timedelta(days=3)).isoformat(),  # tomorrow
-                        ):
+        if start_date_input is None and end_date_input is None:
+            # The default window is shared by every request, so serve it from the process wide cache
+            # which only gets new data if it is more than BA_CACHE_TTL_SECONDS old
+            entry = self.cache.get_or_fetch(
+                (self.ba_name, "mix", frequency),
+                lambda previous: self._refresh(
+                    previous, "fueltype", MIX_WINDOW_DAYS, frequency, self._fetch_data_mix
+                ),
+            )
+            mix_timeseries, fetched_at = entry.value, entry.fetched_at
+        else:
+            mix_timeseries = to_timeseries(
+                self._fetch_data_mix(start_date_input, end_date_input, frequency),
+                "fueltype",
+                frequency,
+            )
+            fetched_at = datetime.datetime.now()
+
+        self.mix_timeseries = mix_timeseries
+        self.data_mix_datetime = fetched_at.isoformat()
+        print(f"Received mix data up to {self.mix_timeseries.latest()}!")
+
+    def _fetch_data_mix(self, start_date_input=None, end_date_input=None, frequency="hourly"):
+        if start_date_input is None or end_date_input is None:
+            default_start, default_end = default_window(*MIX_WINDOW_DAYS)
+            start_date_input = start_date_input or default_start
+            end_date_input = end_date_input or default_end
+
+        # This provides generation mix, but only goes up to 00 the day before, T08 = 00H PST
+        return get_eia_grid_mix_timeseries(
+            [self.ba_name],
+            start_date=start_date_input,
+            end_date=end_date_input,
+            frequency=frequency
+        )
+
+    @STAGE_SECONDS.time("get_data_demand")
+    def get_data_demand(self, start_date_input=None, end_date_input=None, frequency="hourly"):
 
         self.logger.info("Getting data")
-        # only get new data if it is more than an hour old
-        if (self.data_demand_datetime is None) or (self.data_demand_datetime > (datetime.datetime.now() - datetime.timedelta(hours=1))):
-            # This provides most up to date demand and forecast data, but not mix
-            self.data_demand = get_eia_demand_forecast_generation_interchange(
-                [self.ba_name],  # needs to be in a list
-                start_date=start_date_input,
-                end_date=end_date_input
-            ).copy()
-
-            self.data_demand_datetime = datetime.datetime.now().isoformat()
-            print(f"Received demand data up to {max(self.data_demand['timestamp'])}!")
+        if start_date_input is None and end_date_input is None:
+            entry = self.cache.get_or_fetch(
+                (self.ba_name, "demand", frequency),
+                lambda previous: self._refresh(
+                    previous, "type", DEMAND_WINDOW_DAYS, frequency, self._fetch_data_demand
+                ),
+            )
+            demand_timeseries, fetched_at = entry.value, entry.fetched_at
+        else:
+            demand_timeseries = to_timeseries(
+                self._fetch_data_demand(start_date_input, end_date_input, frequency),
+                "type",
+                frequency,
+            )
+            fetched_at = datetime.datetime.now()
+
+        self.demand_timeseries = demand_timeseries
+        self.data_demand_datetime = fetched_at.isoformat()
+        print(f"Received demand data up to {self.demand_timeseries.latest()}!")
+
+    def _fetch_data_demand(self, start_date_input=None, end_date_input=None, frequency="hourly"):
+        if start_date_input is None or end_date_input is None:
+            default_start, default_end = default_window(*DEMAND_WINDOW_DAYS)
+            start_date_input = start_date_input or default_start
+            end_date_input = end_date_input or default_end
+
+        # This provides most up to date demand and forecast data, but not mix
+        return get_eia_demand_forecast_generation_interchange(
+            [self.ba_name],  # needs to be in a list
+            start_date=start_date_input,
+            end_date=end_date_input,
+            frequency=frequency
+        )
 
-    def create_green_df(self):
-        # Filter rows with fuel types Solar and Wind
-        green_df = self.data_mix[self.data_mix['fueltype'].isin(['SUN', 'WND', 'NUC', 'WAT'])]
-        green_df = green_df.groupby('period')['Generation (MWh)'].sum().reset_index()
+    def expire_cached_data(self, frequency="hourly"):
+        """
+        Make the next get_data_mix/get_data_demand go back to EIA even if the cached data hasn't
+        expired yet
+        """
+        for dataset in ("mix", "demand"):
+            self.cache.expire((self.ba_name, dataset, frequency))
+
+    def _refresh(self, previous, type_column, window_days, frequency, fetch):
+        """
+        Bring cached data up to date, only asking EIA for periods after the newest one we
+        already have
+        """
+        start_date, end_date = default_window(*window_days)
+        if not self.incremental or previous is None or not len(previous):
+            return to_timeseries(fetch(start_date, end_date, frequency), type_column, frequency)
+
+        since_period = previous.delta_start(INCREMENTAL_OVERLAP_HOURS)
+        delta = fetch(since_period, end_date, frequency)
+        return self._merge_delta(previous, delta, type_column, since_period, start_date)
+
+    def _merge_delta(self, previous, delta, type_column, since_period, start_date):
+        if delta is None:
+            self.logger.warning(
+                f"Incremental refresh of {self.ba_name} failed, keeping previous data"
+            )
+            return previous
 
-        # Calculate the total generation for each time period
-        total_generation = self.data_mix.groupby('period')['Generation (MWh)'].sum().reset_index()
-        # Merge the total generation back to the green_df
-        green_df = pd.merge(green_df, total_generation, on='period', suffixes=('_green', '_total'))
-        # Calculate the ratio (Solar+Wind) / total
-        green_df['Green ratio'] = green_df['Generation (MWh)_green'] / green_df['Generation (MWh)_total']
-        green_df[["Date"]] = green_df[["period"]].apply(pd.to_datetime)
-        green_df = green_df.sort_values(by=['Date'], ascending=False)
+        self.logger.info(
+            f"Incremental refresh of {self.ba_name} from {since_period}: {len(delta)} rows"
+        )
+        since, window_start = pd.Timestamp(since_period), pd.Timestamp(start_date)
+        delta = to_timeseries(delta, type_column, previous.frequency)
+        merged = CompactTimeseries.merge(previous, delta, since, window_start)
+        # derived frames of the previous data only need the new periods added
+        for kind, derived in _DERIVED_FRAMES.get(id(previous), {}).items():
+            derived_frames(merged)[kind] = DERIVED_APPENDERS[kind](
+                derived, merged, since, window_start
+            )
+        return merged
+
+    async def get_data_mix_async(self, client, frequency="hourly"):
+        """
+        Same as get_data_mix for the default window, fetching with an AsyncEIAClient
+        """
+        entry = await self._get_cached_async(
+            "mix", "fueltype", MIX_WINDOW_DAYS, frequency,
+            lambda start_date, end_date, frequency: client.get_eia_grid_mix_timeseries(
+                [self.ba_name], start_date=start_date, end_date=end_date, frequency=frequency),
+        )
+        self.mix_timeseries = entry.value
+        self.data_mix_datetime = entry.fetched_at.isoformat()
+
+    async def get_data_demand_async(self, client, frequency="hourly"):
+        """
+        Same as get_data_demand for the default window, fetching with an AsyncEIAClient
+        """
+        entry = await self._get_cached_async(
+            "demand", "type", DEMAND_WINDOW_DAYS, frequency,
+            lambda start_date, end_date, frequency: (
+                client.get_eia_demand_forecast_generation_interchange(
+                    [self.ba_name], start_date=start_date, end_date=end_date, frequency=frequency
+                )
+            ),
+        )
+        self.demand_timeseries = entry.value
+        self.data_demand_datetime = entry.fetched_at.isoformat()
+
+    async def _get_cached_async(self, dataset, type_column, window_days, frequency, fetch):
+        async def refresh(previous):
+            start_date, end_date = default_window(*window_days)
+            if not self.incremental or previous is None or not len(previous):
+                data = await fetch(start_date, end_date, frequency)
+                return to_timeseries(data, type_column, frequency)
+
+            since_period = previous.delta_start(INCREMENTAL_OVERLAP_HOURS)
+            delta = await fetch(since_period, end_date, frequency)
+            return self._merge_delta(previous, delta, type_column, since_period, start_date)
+
+        # concurrent requests for a BA share one fetch, like get_or_fetch does for threads
+        return await self.cache.get_or_fetch_async((self.ba_name, dataset, frequency), refresh)
+
+    async def return_stats_async(self, client):
+        """
+        return_stats with mix and demand fetched concurrently, the pandas work runs in a thread
+        so the event loop stays free for other requests
+        """
+        self.logger.info("calculating results")
+        await asyncio.gather(self.get_data_mix_async(client), self.get_data_demand_async(client))
+        return await asyncio.to_thread(self.calculate_stats)
 
-        return green_df
+    @STAGE_SECONDS.time("create_green_df")
+    def create_green_df(self):
+        """
+        Green generation ratio per period. Memoized until the mix data changes, so don't modify the
+        returned frame.
+        """
+        return self._derive(
+            "green", self.mix_timeseries, lambda: green_ratio_by_period(self.mix_timeseries)
+        )
 
+    @STAGE_SECONDS.time("create_demand_df")
     def create_demand_df(self):
-        demand_df = self.data_demand[self.data_demand['type'] == 'D'].copy()
-        demand_df = demand_df.rename(columns={"Generation (MWh)": "Demand"})
-        demand_df = demand_df[['period', 'respondent', 'Demand', 'value-units']]
-
-        forecast_df = self.data_demand[self.data_demand['type'] == 'DF']
-        forecast_df = forecast_df.rename(columns={"Generation (MWh)": "Demand Forecast"})
-
-        demand_df = pd.merge(demand_df, forecast_df[['period', 'Demand Forecast']], on='period')
-        max_demand = demand_df['Demand'].max()
-        demand_df['Demand_norm'] = demand_df['Demand'] / max_demand
-        demand_df['Demand Forecast_norm'] = demand_df['Demand Forecast'] / max_demand
+        """
+        Demand and forecast per period. Memoized until the demand data changes, so don't modify the
+        returned frame.
+        """
+        return self._derive(
+            "demand",
+            self.demand_timeseries,
+            lambda: normalize_demand(demand_by_period(self.demand_timeseries)),
+        )
 
-        demand_df['Demand ratio'] = demand_df['Demand'] / demand_df['Demand Forecast']
-        demand_df['Demand diff'] = demand_df['Demand'] - demand_df['Demand Forecast']
+    def update_baselines(self, green_df, backfill=False):
+        """
+        Add the hours of green_df and the actual demand to the rolling baselines of this BA
+        """
+        self.baselines.update(
+            self.ba_name, "green", green_df["Date"], green_df["Green ratio"], backfill
+        )
+        demand = self.demand_timeseries
+        positions, actual_demand = demand.series_values("D")
+        self.baselines.update(
+            self.ba_name, "demand", demand.timestamps(demand.hours[positions]), actual_demand,
+            backfill,
+        )
 
-        return demand_df
+    def backfill_baselines(self):
+        """
+        Fill the rolling baselines with their whole horizon of history, instead of waiting for it to
+        accumulate
+        """
+        start_date, end_date = default_window(self.baselines.horizon_days, 1)
+        self.get_data_mix(start_date, end_date)
+        self.get_data_demand(start_date, end_date)
+        self.update_baselines(self.create_green_df(), backfill=True)
+        self.baselines.mark_backfilled(self.ba_name)
+
+    def refresh_baselines(self):
+        """
+        Add the hours of the fetched data to the baselines of this BA, backfilling them first if
+        they aren't yet. Only the prewarm job (StatsRefresher.refresh) does this, serving stats only
+        reads the baselines.
+        """
+        self.ensure_backfilled()
+        self.update_baselines(self.create_green_df())
+
+    def ensure_backfilled(self):
+        """
+        Backfill the baselines if they aren't yet, unless another process is already on it. Uses a
+        BAStats of its own, so the data fetched for the stats isn't replaced by the longer history.
+        """
+        if not self.baselines.claim_backfill(self.ba_name):
+            return
+        try:
+            backfiller = BAStats(
+                self.ba_name, logger=self.logger, cache=self.cache, baselines=self.baselines
+            )
+            backfiller.backfill_baselines()
+        except Exception:
+            self.logger.exception(f"backfilling the baselines of {self.ba_name} failed")
+            self.baselines.release_backfill(self.ba_name)
+
+    def stats_tag(self):
+        """
+        conditional.data_tag of the data and baselines the stats last computed by this BAStats
+        come from
+        """
+        from .conditional import data_tag
+
+        return data_tag(self.mix_timeseries, self.demand_timeseries, self.baseline_token)
+
+    def stats_validator(self, wire_format=None):
+        """
+        Validator of the stats last computed by this BAStats, from the data and baselines they
+        were computed with
+        """
+        from .conditional import make_validator
+
+        fetched_at = max(
+            datetime.datetime.fromisoformat(self.data_mix_datetime),
+            datetime.datetime.fromisoformat(self.data_demand_datetime),
+        )
+        # the data is refetched once it is older than the cache TTL
+        max_age = self.cache.ttl - (datetime.datetime.now() - fetched_at).total_seconds()
+        return make_validator(
+            self.ba_name, VERSION, wire_format, self.stats_tag(), fetched_at, max_age
+        )
 
     def return_stats(self):
 
@@ -119,90 +542,274 @@ class BAStats:
         # response["ba_name"] = ba_name
         self.get_data_mix()
         self.get_data_demand()
+        return self.calculate_stats()
+
+    @STAGE_SECONDS.time("calculate_stats")
+    def calculate_stats(self):
+        """
+        Build the stats response from the mix and demand data already fetched
+        """
+        response = assemble_stats([self.stats_inputs()])[0]
+
+        # the full payload is only formatted when debug logging is on
+        self.logger.info("returning stats for %s", self.ba_name)
+        self.logger.debug("returning %s", response)
+        return response
+
+    def stats_inputs(self):
+        """
+        The parts of the stats response that come from this BA's data: current ratios, dial centres
+        and timeseries. assemble_stats adds the thresholds and alerts, for many BAs at once.
+        """
+        mix, demand = self.mix_timeseries, self.demand_timeseries
 
         # Get source mix ratios for pie chart display
-        latest_mix = self.data_mix[self.data_mix["timestamp"] == max(self.data_mix["timestamp"])]
-        latest_mix["mix_ratio"] = latest_mix["Generation (MWh)"] / sum(latest_mix["Generation (MWh)"])
-        source_ratio_current = latest_mix[["type-name", "mix_ratio"]].set_index("type-name").to_dict()
-        source_ratio_current["timestamp"] = str(max(self.data_mix["timestamp"]))
+        latest_hour = mix.latest_hour()
+        latest_values = mix.values[:, latest_hour]
+        latest_rows = np.flatnonzero(~np.isnan(latest_values))
+        latest_total = sum(latest_values[latest_rows].tolist())
+        source_ratio_current = {"mix_ratio": {
+            mix.labels["type-name"][row]: float(latest_values[row]) / latest_total
+            for row in latest_rows
+        }}
+        source_ratio_current["timestamp"] = str(mix.latest())
 
         # Create time series, for time series display
-        demand_data = {
-                    "timestamp_demand": self.data_demand[self.data_demand["type"] == "D"]["timestamp"].astype(str).tolist(),
-                    "demand": self.data_demand[self.data_demand["type"] == "D"]["Generation (MWh)"].tolist(),
-                    "timestamp_forecast": self.data_demand[self.data_demand["type"] == "DF"]["timestamp"].astype(str).tolist(),
-                    "forecast": self.data_demand[self.data_demand["type"] == "DF"]["Generation (MWh)"].tolist(),
-                },
+        # Timestamps are formatted once per hour of the axis and every series is sliced out of
+        # the matrix
+        demand_timestamps = np.asarray(demand.timestamps().astype(str), dtype=object)
+        actual_positions, actual_values = demand.series_values("D")
+        forecast_positions, forecast_values = demand.series_values("DF")
+        demand_data = (  # the response has always wrapped demand_data in a list
+            {
+                "timestamp_demand": demand_timestamps[actual_positions].tolist(),
+                "demand": actual_values.tolist(),
+                "timestamp_forecast": demand_timestamps[forecast_positions].tolist(),
+                "forecast": forecast_values.tolist(),
+            },
+        )
+        mix_timestamps = np.asarray(mix.timestamps().astype(str), dtype=object)
         mix_data = {}
-        for fuel_type in self.data_mix["type-name"].unique():
-            mix_data[fuel_type + "_timestamp"] = self.data_mix[self.data_mix["type-name"] == fuel_type]["timestamp"].astype(str).tolist()
-            mix_data[fuel_type] = self.data_mix[self.data_mix["type-name"] == fuel_type]["Generation (MWh)"].tolist()
-
+        for row, fuel_type in enumerate(mix.labels["type-name"]):
+            positions = np.flatnonzero(~np.isnan(mix.values[row]))[::-1]
+            mix_data[fuel_type + "_timestamp"] = mix_timestamps[positions].tolist()
+            mix_data[fuel_type] = mix.values[row, positions].tolist()
 
         demand_df = self.create_demand_df()
         green_df = self.create_green_df()
 
-        # Merge the demand information from df_demand
-        analysis_df = pd.merge(green_df, demand_df[
-            ['period', 'Demand', 'Demand Forecast', 'Demand_norm', 'Demand Forecast_norm', 'Demand ratio',
-             'Demand diff']], on='period')
-
         latest_row_green = green_df.head(1)
         latest_row_demand = demand_df.head(1)
 
         latest_green_ratio = latest_row_green['Green ratio'].values[0]
-        max_green = green_df['Green ratio'].max()
-        min_green = green_df['Green ratio'].min()
-
         latest_demand_ratio = latest_row_demand['Demand_norm'].values[0]
-        max_demand = demand_df['Demand_norm'].max()
-        min_demand = demand_df['Demand_norm'].min()
-
-        green_ratio_mean = (min_green+max_green)/2
-        green_threshold_low = green_ratio_mean * LOW_THRESHOLD_PCT
-        green_threshold_high = green_ratio_mean * HIGH_THRESHOLD_PCT
-
-        demand_ratio_mean = (min_demand+max_demand)/2
-        demand_threshold_low = demand_ratio_mean * LOW_THRESHOLD_PCT
-        demand_threshold_high = demand_ratio_mean * HIGH_THRESHOLD_PCT
-
-        demand_alert_text = ""
-        if latest_demand_ratio > demand_threshold_high:
-            demand_alert_text = f"Demand Energy {int(HIGH_THRESHOLD_PCT*100)}% Higher Than Normal: Shed Loads!"
-        elif latest_demand_ratio < demand_threshold_low:
-            demand_alert_text = f"Demand Energy {int(LOW_THRESHOLD_PCT*100)}% Lower Than Normal: Plug in Loads!"
-
-        green_alert_text = ""
-        if latest_green_ratio > green_threshold_high:
-            green_alert_text = f"Green Energy {int(HIGH_THRESHOLD_PCT * 100)}% Higher Than Normal: Plug in Loads!"
-        elif latest_green_ratio < green_threshold_low:
-            green_alert_text = f"Green Energy {int(LOW_THRESHOLD_PCT * 100)}% Lower Than Normal: Shed Loads!"
-
-        response = {
-            "created": datetime.datetime.now().isoformat(),
-            "sw_version": VERSION,
+
+        # The dial centres are the usual value for this hour of the week from the rolling baselines,
+        # or the middle of the downloaded window until the baselines have enough history. They are
+        # only read here, the prewarm job keeps them up to date (refresh_baselines).
+        self.baseline_token = self.baselines.token(self.ba_name)
+        green_baseline = self.baselines.lookup(
+            self.ba_name, "green", latest_row_green['Date'].values[0]
+        )
+        if green_baseline is not None:
+            green_ratio_mean = green_baseline["mean"]
+        else:
+            green_ratio_mean = (green_df['Green ratio'].min() + green_df['Green ratio'].max()) / 2
+
+        demand_baseline = self.baselines.lookup(
+            self.ba_name, "demand", latest_row_demand['period'].values[0]
+        )
+        if demand_baseline is not None:
+            # same normalisation as Demand_norm
+            demand_ratio_mean = demand_baseline["mean"] / demand_df['Demand'].max()
+        else:
+            demand_ratio_mean = (
+                demand_df['Demand_norm'].min() + demand_df['Demand_norm'].max()
+            ) / 2
+        return {
             "ba_name": self.ba_name,
-            "source_ratio_current": copy.copy(source_ratio_current),
-            "green_ratio_current": latest_green_ratio,   # this case would be bad
-            "green_ratio_mean": green_ratio_mean,  # this should be center point of dial
+            "source_ratio_current": source_ratio_current,
+            "green_ratio_current": latest_green_ratio,
+            "green_ratio_mean": green_ratio_mean,
+            "demand_ratio_current": latest_demand_ratio,
+            "demand_ratio_mean": demand_ratio_mean,
+            "demand_data": demand_data,
+            "mix_data": mix_data,
+        }
+
+
+def assemble_stats(inputs):
+    """
+    Stats responses from the stats_inputs of several BAs, their thresholds and alert levels are
+    computed in one pass over arrays of all of them
+    """
+    green_current = np.array([item["green_ratio_current"] for item in inputs], dtype=np.float64)
+    green_mean = np.array([item["green_ratio_mean"] for item in inputs], dtype=np.float64)
+    demand_current = np.array([item["demand_ratio_current"] for item in inputs], dtype=np.float64)
+    demand_mean = np.array([item["demand_ratio_mean"] for item in inputs], dtype=np.float64)
+
+    green_low, green_high = green_mean * LOW_THRESHOLD_PCT, green_mean * HIGH_THRESHOLD_PCT
+    demand_low, demand_high = demand_mean * LOW_THRESHOLD_PCT, demand_mean * HIGH_THRESHOLD_PCT
+    # 1 above the high threshold, -1 below the low one, 0 in between
+    green_levels = np.select([green_current > green_high, green_current < green_low], [1, -1], 0)
+    demand_levels = np.select(
+        [demand_current > demand_high, demand_current < demand_low], [1, -1], 0
+    )
+
+    created = datetime.datetime.now().isoformat()
+    columns = zip(
+        inputs,
+        green_current.tolist(), green_mean.tolist(), green_low.tolist(), green_high.tolist(),
+        demand_current.tolist(), demand_mean.tolist(), demand_low.tolist(), demand_high.tolist(),
+        green_levels.tolist(), demand_levels.tolist(),
+    )
+    responses = []
+    for (item,
+         green_ratio, green_centre, green_threshold_low, green_threshold_high,
+         demand_ratio, demand_centre, demand_threshold_low, demand_threshold_high,
+         green_level, demand_level) in columns:
+        demand_alert_text = DEMAND_ALERT_TEXTS[demand_level]
+        responses.append({
+            "created": created,
+            "sw_version": VERSION,
+            "ba_name": item["ba_name"],
+            "source_ratio_current": copy.copy(item["source_ratio_current"]),
+            "green_ratio_current": green_ratio,   # this case would be bad
+            "green_ratio_mean": green_centre,  # this should be center point of dial
             "green_threshold_low": green_threshold_low,  # below this dashboard popup says “shed loads”
             "green_threshold_high": green_threshold_high,  # above this dashboard popup says “plug in loads”
-            "demand_ratio_current": latest_demand_ratio,  # ratio of demand to max demand
-            "demand_ratio_mean": demand_ratio_mean,  # this should be center point of dial
+            "demand_ratio_current": demand_ratio,  # ratio of demand to max demand
+            "demand_ratio_mean": demand_centre,  # this should be center point of dial
             "demand_threshold_low": demand_threshold_low,  # below this dashboard popup says "plug in loads"
             "demand_threshold_high": demand_threshold_high,  # above this dashboard popup says "shed loads"
             "alert_text": demand_alert_text,  # only doing demand since green energy calculations lag currently
             "demand_alert_text": demand_alert_text,
-            "green_alert_text": green_alert_text,
+            "green_alert_text": GREEN_ALERT_TEXTS[green_level],
             "data_timeseries": {
-                "demand_data": copy.copy(demand_data),
-                "mix_data": copy.copy(mix_data),
+                "demand_data": copy.copy(item["demand_data"]),
+                "mix_data": copy.copy(item["mix_data"]),
 
             }
-        }
+        })
+    return responses
 
-        self.logger.info(f"returning {response}")
-        return response
+
+def prefetch_bas(ba_names, cache=None, frequency="hourly"):
+    """
+    Fill the cache for every BA in ba_names that isn't cached yet, with one (paginated) EIA query
+    per dataset for all of them, split by respondent.
+    Returns {ba_name: error} for the BAs that couldn't be fetched, e.g. those EIA has no data for.
+    """
+    cache = DATA_CACHE if cache is None else cache
+    datasets = [
+        ("mix", "fueltype", get_eia_grid_mix_timeseries, MIX_WINDOW_DAYS),
+        ("demand", "type", get_eia_demand_forecast_generation_interchange, DEMAND_WINDOW_DAYS),
+    ]
+    errors = {}
+    for dataset, type_column, fetch, window_days in datasets:
+        missing = [
+            ba_name for ba_name in ba_names if not cache.is_fresh((ba_name, dataset, frequency))
+        ]
+        if not missing:
+            continue
+
+        start_date, end_date = default_window(*window_days)
+        try:
+            data = fetch(missing, start_date=start_date, end_date=end_date, frequency=frequency)
+        except Exception:
+            LOCAL_LOGGER.exception(f"fetching {dataset} data for {missing} failed")
+            data = None
+        if data is None:
+            for ba_name in missing:
+                errors.setdefault(ba_name, f"fetching {dataset} data from EIA failed")
+            continue
+
+        fetched = group_positions(data["respondent"].astype(str)) if len(data) else {}
+        for ba_name, positions in fetched.items():
+            cache.put(
+                (ba_name, dataset, frequency),
+                to_timeseries(data.iloc[positions], type_column, frequency),
+            )
+        for ba_name in missing:
+            if ba_name not in fetched:
+                errors.setdefault(ba_name, f"EIA has no {dataset} data for {ba_name}")
+    return errors
+
+
+def get_batch_stats(ba_names, logger=LOCAL_LOGGER, cache=None):
+    """
+    Returns ({ba_name: stats response}, {ba_name: error}) for several BAs. The uncached ones are
+    fetched together, then the thresholds and alerts of all of them are computed in one pass.
+    """
+    ba_names = list(dict.fromkeys(ba_name.upper() for ba_name in ba_names))
+    errors = prefetch_bas(ba_names, cache=cache)
+
+    inputs = []
+    for ba_name in ba_names:
+        if ba_name in errors:
+            continue
+        try:
+            ba_stats = BAStats(ba_name, logger=logger, cache=cache)
+            ba_stats.get_data_mix()
+            ba_stats.get_data_demand()
+            inputs.append(ba_stats.stats_inputs())
+        except Exception as error:
+            logger.exception(f"calculating stats for {ba_name} failed")
+            errors[ba_name] = repr(error)
+    return {response["ba_name"]: response for response in assemble_stats(inputs)}, errors
+
+
+def group_positions(labels):
+    """
+    Returns {label: row positions} in order of first appearance, computed in a single pass over
+    labels
+    """
+    codes, uniques = pd.factorize(labels)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))
+    # rows with a missing label sort first (code -1) and are skipped
+    skipped = len(codes) - bounds[-1] if len(bounds) else len(codes)
+    return {
+        label: order[skipped + start:skipped + end]
+        for label, start, end in zip(uniques, np.concatenate([[0], bounds[:-1]]), bounds)
+    }
+
+
+def compact_stats(response):
+    """
+    Copy of a stats response whose data_timeseries puts every series on one shared, ascending
+    timestamp axis: {"format": "compact", "timestamps": [...], "demand": [...], "forecast": [...],
+    "mix": {fuel type: [...]}} Values are float arrays aligned with timestamps, null where a series
+    has no value for that hour.
+    """
+    demand_data = response["data_timeseries"]["demand_data"][0]
+    mix_data = response["data_timeseries"]["mix_data"]
+    series = {
+        "demand": (demand_data["timestamp_demand"], demand_data["demand"]),
+        "forecast": (demand_data["timestamp_forecast"], demand_data["forecast"]),
+    }
+    mix_names = [name for name in mix_data if not name.endswith("_timestamp")]
+    series.update({name: (mix_data[name + "_timestamp"], mix_data[name]) for name in mix_names})
+
+    # the timestamps share one string format, so sorting them as strings sorts them in time
+    axis = np.unique(np.concatenate([
+        np.asarray(timestamps, dtype=str) for timestamps, _ in series.values()
+    ]))
+    aligned = {}
+    for name, (timestamps, values) in series.items():
+        column = np.full(len(axis), np.nan)
+        column[np.searchsorted(axis, np.asarray(timestamps, dtype=str))] = values
+        aligned[name] = column
+
+    compact = dict(response)
+    compact["data_timeseries"] = {
+        "format": "compact",
+        "timestamps": axis.tolist(),
+        "demand": aligned["demand"],
+        "forecast": aligned["forecast"],
+        "mix": {name: aligned[name] for name in mix_names},
+    }
+    return compact
 
 
 # methods from Software Stack from Climate Tech class at Terra.do
@@ -211,57 +818,63 @@ def get_api_data():
     """
     Returns available data from the api
     """
-    api_url = f"https://api.eia.gov/v2/electricity/rto?api_key={EIA_API_KEY}"
+    api_url = eia_rto_url()
     print(api_url)
 
-    response_content = requests.get(
+    response_content = EIA_SESSION.get(
         api_url,
+        endpoint="rto",
     ).json()
 
     return response_content
 
 
-# Time series get functions
-def get_eia_timeseries(
-        url_segment,
-        facets,
-        value_column_name="value",
-        start_date=(datetime.date.today() - datetime.timedelta(days=365)).isoformat(),
-        end_date=datetime.date.today().isoformat(),
-        frequency="daily",
-        timezone="Pacific",
-):
+def parse_eia_periods(periods, frequency=None):
+    """
+    Convert EIA period strings to timestamps in one vectorized call.
+    Known frequencies use their exact format, anything else falls back to ISO8601 parsing.
     """
-    A generalized helper function to fetch data from the EIA API
+    period_format = PERIOD_FORMATS.get(frequency)
+    if period_format is not None:
+        try:
+            return pd.to_datetime(periods, format=period_format)
+        except ValueError:
+            pass
+    try:
+        return pd.to_datetime(periods, format="ISO8601")
+    except ValueError:
+        # e.g. local-hourly periods with mixed UTC offsets can't share a single dtype
+        return periods.apply(pd.to_datetime, format="ISO8601")
+
+
+def categorize_columns(dataframe):
     """
-    api_url = f"https://api.eia.gov/v2/electricity/rto/{url_segment}/data/?api_key={EIA_API_KEY}"
+    Convert the repeated label columns of an EIA frame to categoricals
+    """
+    columns = {column: "category" for column in CATEGORICAL_COLUMNS if column in dataframe.columns}
+    return dataframe.astype(columns)
 
-    if timezone is not None:
-        facet_dict = dict(**{"timezone": ["Pacific"]}, **facets)
-    else:
-        facet_dict = dict(**facets)
 
-    headers = {
-            "X-Params": json.dumps(
-                {
-                    "frequency": frequency,
-                    "data": ["value"],
-                    "facets": facet_dict,
-                    "start": start_date,
-                    "end": end_date,
-                    "sort": [{"column": "period", "direction": "desc"}],
-                    "offset": 0,
-                    "length": 5000,  # This is the maximum allowed
-                }
+# Time series get functions
+def eia_page_headers(params, offset):
+    """
+    Request headers for one page of an EIA timeseries query
+    """
+    return {
+        "X-Params": json.dumps(
+            dict(
+                **params,
+                offset=offset,
+                length=EIA_PAGE_LENGTH,
             )
-        }
+        )
+    }
 
-    response_content = requests.get(
-        api_url,
-        headers=headers,
-    )
-    response_content = response_content.json()
 
+def unwrap_eia_response(response_content):
+    """
+    Returns the content of an EIA response holding the "data", or None on error
+    """
     # Sometimes EIA API responses are nested under a "response" key. Sometimes not 🤷
     if "error" in response_content:
         print(response_content)
@@ -279,18 +892,171 @@ def get_eia_timeseries(
         print(str(response_content))
         return None
 
-    # Convert the data to a Pandas DataFrame and clean it up for plotting
-    dataframe = pd.DataFrame(response_content["data"])
-    dataframe["timestamp"] = dataframe["period"].apply(
-        pd.to_datetime,
-        format="ISO8601"
+    return response_content
+
+
+def _get_eia_page(api_url, params, offset, endpoint=None):
+    """
+    Fetch a single page of an EIA timeseries query, returns the response content or None on error
+    """
+    response = EIA_SESSION.get(
+        api_url,
+        endpoint=endpoint,
+        headers=eia_page_headers(params, offset),
     )
+    if not response.ok:
+        print(f"EIA API returned {response.status_code}: {response.text[:200]}")
+        return None
+    EIA_RESPONSE_BYTES.inc(endpoint, amount=len(response.content))
+    return unwrap_eia_response(response.json())
+
+
+def get_eia_timeseries(
+        url_segment,
+        facets,
+        value_column_name="value",
+        start_date=(datetime.date.today() - datetime.timedelta(days=365)).isoformat(),
+        end_date=datetime.date.today().isoformat(),
+        frequency="daily",
+        timezone="Pacific",
+):
+    """
+    A generalized helper function to fetch data from the EIA API, following pagination past the
+    EIA_PAGE_LENGTH row limit
+    """
+    api_url = eia_timeseries_url(url_segment)
+    facet_dict = eia_facets(facets, timezone)
+
+    if EIA_STORE is not None:
+        dataframe = EIA_STORE.read_through(
+            url_segment,
+            facet_dict,
+            frequency,
+            start_date,
+            end_date,
+            lambda download_start: _download_eia_timeseries(
+                api_url, url_segment, facet_dict, download_start, end_date, frequency
+            ),
+        )
+    else:
+        dataframe = _download_eia_timeseries(
+            api_url, url_segment, facet_dict, start_date, end_date, frequency
+        )
+    if dataframe is None:
+        return None
+
+    # EIA always sends the value we asked for in a column called "value", set the name to a more
+    # useful one
+    return categorize_columns(dataframe).rename(columns={"value": value_column_name})
+
+
+def eia_rto_url():
+    return f"{EIA_API_BASE_URL}?api_key={EIA_API_KEY}"
+
+
+def eia_timeseries_url(url_segment):
+    return f"{EIA_API_BASE_URL}/{url_segment}/data/?api_key={EIA_API_KEY}"
+
+
+def eia_facets(facets, timezone):
+    if timezone is not None:
+        return dict(**{"timezone": ["Pacific"]}, **facets)
+    return dict(**facets)
+
+
+def eia_timeseries_params(facet_dict, start_date, end_date, frequency):
+    return {
+        "frequency": frequency,
+        "data": ["value"],
+        "facets": facet_dict,
+        "start": start_date,
+        "end": end_date,
+        "sort": [{"column": "period", "direction": "desc"}],
+    }
+
+
+def _download_eia_timeseries(api_url, url_segment, facet_dict, start_date, end_date, frequency):
+    """
+    Fetch every page of a timeseries query from EIA into a DataFrame with a "timestamp" and a float
+    "value" column
+    """
+    params = eia_timeseries_params(facet_dict, start_date, end_date, frequency)
+
+    # The first page tells us how many rows there are in total, the rest are fetched in parallel
+    response_content = _get_eia_page(api_url, params, offset=0, endpoint=url_segment)
+    if response_content is None:
+        return None
+
+    pages = [response_content["data"]]
+    total = int(response_content.get("total", len(pages[0])))
+    offsets = range(EIA_PAGE_LENGTH, total, EIA_PAGE_LENGTH)
+    if len(offsets) > 0:
+        print(f"{total} rows available, fetching {len(offsets)} more page(s)")
+        with ThreadPoolExecutor(max_workers=min(EIA_PAGE_WORKERS, len(offsets))) as executor:
+            fetched_pages = executor.map(
+                lambda offset: _get_eia_page(api_url, params, offset, endpoint=url_segment), offsets
+            )
+            for page in fetched_pages:
+                if page is None:
+                    return None
+                pages.append(page["data"])
+
+    dataframe = eia_pages_to_dataframe(pages, frequency)
+    EIA_ROWS_FETCHED.inc(url_segment, amount=len(dataframe))
+    return dataframe
+
+
+def iter_eia_pages(url_segment, facets, start_date, end_date, frequency="hourly", timezone=None):
+    """
+    Lazily yield the "data" rows of each page of a timeseries query, newest period first.
+    The next page downloads while the current one is consumed, so at most two pages are held in
+    memory. Raises RuntimeError if EIA fails part way through.
+    """
+    api_url = eia_timeseries_url(url_segment)
+    params = eia_timeseries_params(eia_facets(facets, timezone), start_date, end_date, frequency)
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        offset = 0
+        next_page = executor.submit(_get_eia_page, api_url, params, offset, url_segment)
+        previous_rows = set()
+        while next_page is not None:
+            page = next_page.result()
+            if page is None:
+                raise RuntimeError(f"EIA {url_segment} failed at offset {offset}")
+            total = int(page.get("total", len(page["data"])))
+            offset += EIA_PAGE_LENGTH
+            next_page = None
+            if offset < total:
+                next_page = executor.submit(_get_eia_page, api_url, params, offset, url_segment)
+
+            # Rows can shift between pages if EIA publishes new data while we are paging, skip
+            # the repeats
+            rows = [row for row in page["data"] if tuple(row.values()) not in previous_rows]
+            previous_rows = {tuple(row.values()) for row in page["data"]}
+            EIA_ROWS_FETCHED.inc(url_segment, amount=len(rows))
+            yield rows
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@STAGE_SECONDS.time("dataframe_build")
+def eia_pages_to_dataframe(pages, frequency):
+    """
+    Convert the "data" lists of every page of an EIA response to a Pandas DataFrame and clean it up
+    for plotting
+    """
+    rows = [row for page in pages for row in page]
+    # a query EIA has no rows for still gives the columns every frame has
+    dataframe = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["period", "value"])
+    if len(pages) > 1:
+        # Rows can shift between pages if EIA publishes new data while we are paging
+        dataframe = dataframe.drop_duplicates(ignore_index=True)
+    dataframe["timestamp"] = parse_eia_periods(dataframe["period"], frequency)
+    dataframe = categorize_columns(dataframe)
     # Clean up the "value" column-
-    # EIA always sends the value we asked for in a column called "value"
     # Oddly, this is sometimes sent as a string though it should always be a number.
-    # We convert its dtype and set the name to a more useful one
-    eia_value_column_name = "value"
-    return dataframe.astype({eia_value_column_name: float}).rename(columns={eia_value_column_name: value_column_name})
+    # We convert its dtype here, get_eia_timeseries sets the name to a more useful one
+    return dataframe.astype({"value": float})
 
 
 def get_eia_interchange_timeseries_daily(balancing_authorities, **kwargs):
@@ -332,11 +1098,11 @@ def get_eia_grid_mix_timeseries_daily(balancing_authorities, **kwargs):
 
 def get_eia_grid_mix_timeseries(balancing_authorities, frequency="hourly", **kwargs):
     """
-    Fetch electricity generation data by fuel type
+    Fetch electricity generation data by fuel type, of every BA when balancing_authorities is None
     """
     return get_eia_timeseries(
         url_segment="fuel-type-data",
-        facets={"respondent": balancing_authorities},
+        facets={} if balancing_authorities is None else {"respondent": balancing_authorities},
         value_column_name="Generation (MWh)",
         frequency=frequency,
         timezone=None,
@@ -344,6 +1110,21 @@ def get_eia_grid_mix_timeseries(balancing_authorities, frequency="hourly", **kwa
     )
 
 
+def get_eia_interchange_timeseries(balancing_authorities, frequency="hourly", **kwargs):
+    """
+    Fetch interchange between neighbouring BAs, positive values flow from "fromba" to "toba".
+    Of every BA when balancing_authorities is None.
+    """
+    return get_eia_timeseries(
+        url_segment="interchange-data",
+        facets={} if balancing_authorities is None else {"toba": balancing_authorities},
+        value_column_name="Interchange (MWh)",
+        frequency=frequency,
+        timezone=None,
+        **kwargs,
+    )
+
+
 def get_eia_demand_forecast_generation_interchange(balancing_authorities, frequency="hourly", **kwargs):
     """
     Fetch hourly demand with demand "D", demand forecast "DF", generation as "NG" and interchange as "TI"
@@ -361,31 +1142,53 @@ def get_eia_demand_forecast_generation_interchange(balancing_authorities, freque
 
 # Dataframe cleaning and processing functions
 def get_energy_generated_and_consumed_locally(df):
-    demand_stats = df.groupby("type-name")["Demand (MWh)"].sum()
+    demand_stats = df.groupby("type-name", observed=True)["Demand (MWh)"].sum()
     # If local demand is smaller than net (local) generation, that means: amount generated and used locally == Demand (net export)
     # If local generation is smaller than local demand, that means: amount generated and used locally == Net generation (net import)
     # Therefore, the amount generated and used locally is the minimum of these two
     return min(demand_stats["Demand"], demand_stats["Net generation"])
 
 
+def get_energy_generated_and_consumed_locally_by_timestamp(demand_df):
+    """
+    get_energy_generated_and_consumed_locally for every timestamp at once
+    """
+    demand_stats = (
+        demand_df.groupby(["timestamp", "type-name"], observed=True)["Demand (MWh)"]
+        .sum()
+        .unstack("type-name")
+    )
+    return pd.Series(
+        np.minimum(demand_stats["Demand"].to_numpy(), demand_stats["Net generation"].to_numpy()),
+        index=demand_stats.index,
+    )
+
+
 def energy_consumed_locally_by_source_ba(local_ba):
     interchange_df = get_eia_interchange_timeseries_daily([local_ba])
     demand_df = get_eia_net_demand_and_generation_timeseries_daily([local_ba])
+    return consumed_locally_by_source_ba(local_ba, interchange_df, demand_df)
 
-    energy_generated_and_used_locally = demand_df.groupby("timestamp").apply(
-        get_energy_generated_and_consumed_locally
+
+def consumed_locally_by_source_ba(local_ba, interchange_df, demand_df):
+    """
+    Energy used at local_ba per timestamp, grouped by the BA which generated it (local_ba itself and
+    the BAs it imports from), from already fetched daily interchange and demand frames
+    """
+    energy_generated_and_used_locally = (
+        get_energy_generated_and_consumed_locally_by_timestamp(demand_df)
     )
 
     consumed_locally_column_name = "Power consumed locally (MWh)"
 
     # How much energy is imported and then used locally, grouped by the source BA (i.e. the BA which generated the energy)
     energy_imported_then_consumed_locally_by_source_ba = (
-        interchange_df.groupby(["timestamp", "fromba"])[
+        interchange_df.groupby(["timestamp", "fromba"], observed=True)[
             "Interchange to local BA (MWh)"
         ].sum().astype(int)
         # We're only interested in data points where energy is coming *in* to the local BA, i.e. where net export is negative
         # Therefore, ignore positive net exports
-        .apply(lambda interchange: max(interchange, 0))
+        .clip(lower=0)
     )
 
     # Combine these two together to get all energy used locally, grouped by the source BA (both local and connected)
@@ -424,126 +1227,40 @@ def get_usage_by_ba_and_generation_type(energy_consumed_locally_by_source_ba):
     all_source_bas = energy_consumed_locally_by_source_ba["fromba"].unique().tolist()
 
     # Then, fetch the fuel type breakdowns for each of those BAs
-    generation_types_by_ba = get_eia_grid_mix_timeseries_daily(all_source_bas).rename(
-        {"respondent": "fromba", "type-name": "generation_type"}, axis="columns"
+    generation_types_by_ba = get_eia_grid_mix_timeseries_daily(all_source_bas)
+    return usage_by_ba_and_generation_type(
+        energy_consumed_locally_by_source_ba, generation_types_by_ba
     )
 
-    total_generation_by_source_ba = generation_types_by_ba.groupby(["timestamp", "fromba"])[
-        "Generation (MWh)"
-    ].sum()
 
-    generation_types_by_ba_with_totals = generation_types_by_ba.join(
-        total_generation_by_source_ba,
-        how="left",
-        on=["timestamp", "fromba"],
-        rsuffix=" Total",
-    )
-    generation_types_by_ba_with_totals["Generation (% of BA generation)"] = (
-        generation_types_by_ba_with_totals["Generation (MWh)"]
-        / generation_types_by_ba_with_totals["Generation (MWh) Total"]
-    )
-    generation_types_by_ba_with_totals_and_source_ba_breakdown = generation_types_by_ba_with_totals.merge(
-        energy_consumed_locally_by_source_ba.rename(
-            {"Power consumed locally (MWh)": "Power consumed locally from source BA (MWh)"},
-            axis="columns",
-        ),
-        on=["timestamp", "fromba"],
-    )
-    full_df_reindexed = (
-        generation_types_by_ba_with_totals_and_source_ba_breakdown.set_index(
-            ["timestamp", "fromba", "generation_type"]
-        )
-    )
-    usage_by_ba_and_generation_type = (
-        (
-            full_df_reindexed["Power consumed locally from source BA (MWh)"]
-            * full_df_reindexed["Generation (% of BA generation)"]
-        )
-        .rename("Usage (MWh)")
-        .reset_index()
+def usage_by_ba_and_generation_type(energy_consumed_locally_by_source_ba, generation_types_by_ba):
+    """
+    get_usage_by_ba_and_generation_type from an already fetched daily grid mix frame for all source
+    BAs, computed on aligned arrays instead of joining and merging the full frames
+    """
+    timestamps = generation_types_by_ba["timestamp"]
+    source_bas = generation_types_by_ba["respondent"]
+    generation = generation_types_by_ba["Generation (MWh)"].to_numpy()
+
+    # fuel type as a % of source BA's generation
+    total_generation = generation_types_by_ba.groupby(
+        ["timestamp", "respondent"], observed=True, sort=False
+    )["Generation (MWh)"].transform("sum").to_numpy()
+    generation_share = generation / total_generation
+
+    # look up the power consumed locally from each row's source BA, there is one row per (timestamp,
+    # source BA)
+    consumed = energy_consumed_locally_by_source_ba
+    consumed_index = pd.MultiIndex.from_arrays([consumed["timestamp"], consumed["fromba"]])
+    positions = consumed_index.get_indexer(pd.MultiIndex.from_arrays([timestamps, source_bas]))
+    matched = positions >= 0
+
+    usage_by_ba_and_generation_type = generation_types_by_ba.loc[
+        matched, ["timestamp", "respondent", "type-name"]
+    ]
+    usage_by_ba_and_generation_type.columns = ["timestamp", "fromba", "generation_type"]
+    consumed_locally = consumed["Power consumed locally (MWh)"].to_numpy()
+    usage_by_ba_and_generation_type["Usage (MWh)"] = (
+        consumed_locally[positions[matched]] * generation_share[matched]
     )
-
-    return usage_by_ba_and_generation_type
-
-
-if __name__ == "__main__":
-    import matplotlib.pyplot as plt
-
-    ba_authority = "PSEI"
-
-    t0=time.time()
-    ba_stats = BAStats(ba_authority)
-    results = ba_stats.return_stats()
-
-    print("data_demand_datetime", ba_stats.data_demand_datetime)
-    print("data_demand\n", ba_stats.data_demand)
-
-    print("data_mix_datetime", ba_stats.data_mix_datetime)
-    print("data_mix\n", ba_stats.data_mix)
-    print("Process time:", time.time()-t0)
-
-    print(results)
-
-    # Plot results
-    fig, ax = plt.subplots(figsize=(12, 8))
-    for fuel_type in ba_stats.data_mix["type-name"].unique():
-        df = ba_stats.data_mix[ba_stats.data_mix["type-name"] == fuel_type]
-        ax.plot(df["timestamp"], df["Generation (MWh)"], label=fuel_type)
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.title(f"{ba_authority} Power Generation")
-    plt.xlabel("Timestamp")
-    plt.ylabel("Generation (MWh)")
-    plt.show()
-
-    fig, ax = plt.subplots(figsize=(12, 8))
-    for fuel_type in ba_stats.data_demand["type-name"].unique():
-        df = ba_stats.data_demand[ba_stats.data_demand["type-name"] == fuel_type]
-        ax.plot(df["timestamp"], df["Generation (MWh)"], label=fuel_type)
-
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.title(f"{ba_authority} Power Generation")
-    plt.xlabel("Timestamp")
-    plt.ylabel("Generation (MWh)")
-    plt.show()
-
-
-    # plot green
-    demand_df = ba_stats.create_demand_df()
-    green_df = ba_stats.create_green_df()
-
-    # Merge the demand information from df_demand
-    analysis_df = pd.merge(green_df, demand_df[
-        ['period', 'Demand', 'Demand Forecast', 'Demand_norm', 'Demand Forecast_norm', 'Demand ratio',
-         'Demand diff']], on='period')
-
-    # Plot Ratios
-    fig, ax = plt.subplots(figsize=(12, 8))
-    ax.plot(analysis_df['Date'], analysis_df['Green ratio'], "g", label="green_ratio")
-    ax.plot(analysis_df['Date'], analysis_df['Demand ratio'], "b", label="demand2forecast_ratio")
-    ax.plot(analysis_df['Date'], analysis_df['Demand_norm'], "c", label="demand2max_ratio")
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    # plt.tight_layout()
-    plt.xlabel("Timestamp")
-    plt.ylabel("Ratio")
-    plt.title(f"{ba_authority} Green energy / Demand ratio vs time (latest: {max(analysis_df['Date'])})")
-
-    # Plot correlation
-    correlation = analysis_df["Green ratio"].corr(analysis_df["Demand ratio"])
-    fig, ax = plt.subplots(figsize=(12, 8))
-    ax.scatter(analysis_df["Green ratio"], analysis_df["Demand ratio"], label='')
-    # ax.scatter(analysis_df["Green ratio"], analysis_df["Demand diff"], label='')
-    ax.annotate(f'Correlation: {correlation:.2f}', xy=(0.5, 0.95), xycoords='axes fraction', ha='center', fontsize=12)
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    # plt.tight_layout()
-    plt.title(f"{ba_authority} Green energy ratio vs Demand ratio")
-    plt.xlabel("Green ratio")
-    plt.ylabel("Demand ratio")
-    plt.show()
\ No newline at end of file
+    return usage_by_ba_and_generation_type.reset_index(drop=True)
@@ -0,0 +1,349 @@
+import datetime
+import os
+import threading
+import time
+
+from .shared import SHARED_STATE
+
+# numpy and pandas are imported where they are used, so creating the app doesn't load them
+
+HOURS_PER_WEEK = 7 * 24
+PERCENTILES = (10, 50, 90)
+# EIA revises the most recent hours, so accept updates to them
+REVISION_HOURS = datetime.timedelta(hours=2)
+# a backfill claimed longer ago than this is presumed dead and can be taken over
+BACKFILL_CLAIM_SECONDS = 600
+
+
+def week_hour(timestamp):
+    """
+    Hour of the week of a timestamp, 0 is Monday 00h (UTC, like EIA's hourly periods)
+    """
+    return timestamp.dayofweek * 24 + timestamp.hour
+
+
+class RollingBaseline:
+    """
+    Rolling statistics of one hourly series for each hour of the week (hour of day x day of week)
+    over the last horizon_days. New hours only recompute the buckets they fall in, so a lookup
+    is O(1).
+    """
+
+    def __init__(self, horizon_days=28):
+        self.horizon = datetime.timedelta(days=horizon_days)
+        self.latest = None
+        self.version = 0  # changes whenever the samples do
+        self._lock = threading.Lock()
+        # timestamp: value, per hour of the week
+        self._samples = [{} for _ in range(HOURS_PER_WEEK)]
+        self._summaries = [None] * HOURS_PER_WEEK
+
+    def pending(self, timestamps, values, backfill=False):
+        """
+        (timestamps, values) of the hours update would add or change: those newer than what has been
+        seen already (plus a few revised ones), or every hour when backfilling history, unless their
+        value is known
+        """
+        import numpy as np
+        import pandas as pd
+
+        timestamps = pd.DatetimeIndex(timestamps)
+        values = np.asarray(values, dtype=float)
+        with self._lock:
+            new = ~np.isnan(values)
+            if self.latest is not None and not backfill:
+                new &= timestamps > self.latest - REVISION_HOURS
+            positions = np.flatnonzero(new)
+            buckets = week_hour(timestamps[positions])
+            positions = [
+                position for position, bucket in zip(positions.tolist(), buckets)
+                if self._samples[bucket].get(timestamps[position]) != values[position]
+            ]
+        return timestamps[positions], values[positions]
+
+    def update(self, timestamps, values, backfill=False):
+        """
+        Add the hours of a series newer than what has been seen already (plus a few revised ones),
+        or every hour of it when backfilling history
+        """
+        new_timestamps, new_values = self.pending(timestamps, values, backfill)
+        with self._lock:
+            if not len(new_timestamps):
+                return
+
+            self.version += 1
+            touched = set()
+            buckets = week_hour(new_timestamps)
+            for timestamp, bucket, value in zip(new_timestamps, buckets, new_values):
+                self._samples[bucket][timestamp] = value
+                touched.add(bucket)
+            self.latest = max(new_timestamps.max(), self.latest or new_timestamps.max())
+
+            cutoff = self.latest - self.horizon
+            for bucket in touched:
+                samples = self._samples[bucket]
+                for timestamp in [timestamp for timestamp in samples if timestamp <= cutoff]:
+                    del samples[timestamp]
+                self._summaries[bucket] = self._summarize(list(samples.values()))
+
+    @staticmethod
+    def _summarize(samples):
+        import numpy as np
+
+        percentiles = np.percentile(samples, PERCENTILES)
+        summary = {"mean": float(np.mean(samples)), "samples": len(samples)}
+        summary.update({
+            f"p{percentile}": float(value) for percentile, value in zip(PERCENTILES, percentiles)
+        })
+        return summary
+
+    def lookup(self, timestamp):
+        """
+        Statistics for the hour of the week of timestamp, None if there is no data for it yet
+        """
+        import pandas as pd
+
+        return self._summaries[week_hour(pd.Timestamp(timestamp))]
+
+    def summaries(self):
+        return list(self._summaries)
+
+
+class BaselineIndex:
+    """
+    RollingBaselines per (BA, metric), e.g. ("PSEI", "green"). With a SharedState their samples and
+    backfills are kept in it, so every worker on the machine uses the same baselines and they
+    survive restarts: each process holds a copy of a baseline and reloads it when the stored version
+    is no longer the copy's version.
+    """
+
+    def __init__(self, horizon_days=28, min_samples=3, state=None, read_only=False):
+        self.horizon_days = horizon_days
+        self.min_samples = min_samples  # fewer samples than this and a baseline isn't used
+        self.state = state  # None keeps the baselines in this process only
+        # only lookups, e.g. in fleet workers: updates raise and nothing gets backfilled
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._baselines = {}
+        self._backfilled = set()
+        self._claimed = set()
+
+    def configure(self, horizon_days=None, min_samples=None):
+        with self._lock:
+            if horizon_days is not None and horizon_days != self.horizon_days:
+                self.horizon_days = horizon_days
+                self._baselines.clear()
+                self._backfilled.clear()
+            if min_samples is not None:
+                self.min_samples = min_samples
+
+    def _stored_version(self, key):
+        row = self.state.execute(
+            "SELECT version FROM baseline_series WHERE ba_name = ? AND metric = ?", key
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def get(self, ba_name, metric):
+        key = (ba_name.upper(), metric)
+        version = None if self.state is None else self._stored_version(key)
+        with self._lock:
+            baseline = self._baselines.get(key)
+            if baseline is not None and (version is None or baseline.version == version):
+                return baseline
+        if version is None:
+            with self._lock:
+                return self._baselines.setdefault(key, RollingBaseline(self.horizon_days))
+
+        import pandas as pd
+
+        baseline = RollingBaseline(self.horizon_days)
+        rows = self.state.execute(
+            "SELECT hour, value FROM baseline_samples WHERE ba_name = ? AND metric = ? "
+            "ORDER BY hour",
+            key,
+        ).fetchall()
+        if rows:
+            hours, values = zip(*rows)
+            baseline.update(pd.to_datetime(list(hours), unit="h"), values, backfill=True)
+        baseline.version = version
+        with self._lock:
+            self._baselines[key] = baseline
+        return baseline
+
+    def update(self, ba_name, metric, timestamps, values, backfill=False):
+        """
+        RollingBaseline.update of the baseline of ba_name and metric, storing the new samples in the
+        shared state
+        """
+        if self.read_only:
+            raise RuntimeError(f"the baselines of {ba_name} are read only")
+        key = (ba_name.upper(), metric)
+        baseline = self.get(*key)
+        if self.state is None:
+            baseline.update(timestamps, values, backfill)
+            return
+
+        from .timeseries import epoch_hours
+
+        new_timestamps, new_values = baseline.pending(timestamps, values, backfill)
+        if not len(new_timestamps):
+            return
+        hours = epoch_hours(new_timestamps).tolist()
+        with self.state.transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO baseline_samples (ba_name, metric, hour, value) "
+                "VALUES (?, ?, ?, ?)",
+                [(*key, hour, value) for hour, value in zip(hours, new_values.tolist())],
+            )
+            latest, version = connection.execute(
+                "INSERT INTO baseline_series (ba_name, metric, latest, version) "
+                "VALUES (?, ?, ?, 1) ON CONFLICT (ba_name, metric) DO UPDATE SET "
+                "latest = max(latest, excluded.latest), version = version + 1 "
+                "RETURNING latest, version",
+                (*key, max(hours)),
+            ).fetchone()
+            connection.execute(
+                "DELETE FROM baseline_samples WHERE ba_name = ? AND metric = ? AND hour <= ?",
+                (*key, latest - self.horizon_days * 24),
+            )
+        loaded_version = baseline.version
+        baseline.update(new_timestamps, new_values, backfill=True)
+        # the copy is current unless another process changed the stored samples since it was loaded,
+        # then the next get reloads it
+        baseline.version = version if loaded_version == version - 1 else -1
+
+    def token(self, ba_name):
+        """
+        Versions of the baselines of ba_name, which change whenever its dial centres and thresholds
+        may change. Only reads the stored versions, the baselines aren't (re)loaded.
+        """
+        keys = [(ba_name.upper(), metric) for metric in ("green", "demand")]
+        if self.state is None:
+            with self._lock:
+                baselines = [self._baselines.get(key) for key in keys]
+            versions = [0 if baseline is None else baseline.version for baseline in baselines]
+        else:
+            versions = [self._stored_version(key) for key in keys]
+        return ".".join(str(version) for version in versions)
+
+    def lookup(self, ba_name, metric, timestamp):
+        """
+        Statistics of metric for the hour of the week of timestamp, None if there aren't min_samples
+        of them
+        """
+        summary = self.get(ba_name, metric).lookup(timestamp)
+        if summary is None or summary["samples"] < self.min_samples:
+            return None
+        return summary
+
+    def is_backfilled(self, ba_name):
+        ba_name = ba_name.upper()
+        with self._lock:
+            if ba_name in self._backfilled or self.state is None:
+                return ba_name in self._backfilled
+        row = self.state.execute(
+            "SELECT horizon_days FROM baseline_backfills "
+            "WHERE ba_name = ? AND backfilled_at IS NOT NULL",
+            (ba_name,),
+        ).fetchone()
+        if row is None or row[0] < self.horizon_days:
+            return False
+        with self._lock:
+            self._backfilled.add(ba_name)
+        return True
+
+    def claim_backfill(self, ba_name):
+        """
+        True if ba_name isn't backfilled and the caller should do it. Only one caller (across
+        processes with a SharedState) gets it until it calls mark_backfilled or release_backfill, or
+        its claim goes stale.
+        """
+        ba_name = ba_name.upper()
+        if self.read_only or self.is_backfilled(ba_name):
+            return False
+        if self.state is None:
+            with self._lock:
+                if ba_name in self._claimed:
+                    return False
+                self._claimed.add(ba_name)
+                return True
+
+        now = time.time()
+        with self.state.transaction() as connection:
+            row = connection.execute(
+                "SELECT claimed_at FROM baseline_backfills WHERE ba_name = ?", (ba_name,)
+            ).fetchone()
+            if row is not None and row[0] is not None and now - row[0] < BACKFILL_CLAIM_SECONDS:
+                return False
+            connection.execute(
+                "INSERT INTO baseline_backfills (ba_name, claimed_at) VALUES (?, ?) "
+                "ON CONFLICT (ba_name) DO UPDATE SET claimed_at = excluded.claimed_at",
+                (ba_name, now),
+            )
+        return True
+
+    def release_backfill(self, ba_name):
+        """
+        Give up a claim_backfill, e.g. because the backfill failed
+        """
+        ba_name = ba_name.upper()
+        with self._lock:
+            self._claimed.discard(ba_name)
+        if self.state is not None:
+            self.state.execute(
+                "UPDATE baseline_backfills SET claimed_at = NULL WHERE ba_name = ?", (ba_name,)
+            )
+
+    def mark_backfilled(self, ba_name):
+        if self.read_only:
+            raise RuntimeError(f"the baselines of {ba_name} are read only")
+        ba_name = ba_name.upper()
+        with self._lock:
+            self._backfilled.add(ba_name)
+            self._claimed.discard(ba_name)
+        if self.state is not None:
+            self.state.execute(
+                "INSERT INTO baseline_backfills (ba_name, claimed_at, backfilled_at, horizon_days) "
+                "VALUES (?, NULL, ?, ?) ON CONFLICT (ba_name) DO UPDATE SET claimed_at = NULL, "
+                "backfilled_at = excluded.backfilled_at, horizon_days = excluded.horizon_days",
+                (ba_name, time.time(), self.horizon_days),
+            )
+
+    def to_dict(self, ba_name):
+        """
+        Every hour of the week of every metric of ba_name, for the baselines endpoint
+        """
+        ba_name = ba_name.upper()
+        if self.state is not None:
+            metrics = [
+                metric for metric, in self.state.execute(
+                    "SELECT metric FROM baseline_series WHERE ba_name = ? ORDER BY metric",
+                    (ba_name,),
+                )
+            ]
+            baselines = {metric: self.get(ba_name, metric) for metric in metrics}
+        else:
+            with self._lock:
+                baselines = {
+                    metric: baseline
+                    for (name, metric), baseline in self._baselines.items() if name == ba_name
+                }
+        return {
+            "horizon_days": self.horizon_days,
+            "min_samples": self.min_samples,
+            "metrics": {
+                metric: {
+                    "latest": None if baseline.latest is None else baseline.latest.isoformat(),
+                    "week_hours": baseline.summaries(),
+                }
+                for metric, baseline in baselines.items()
+            },
+        }
+
+
+# Baselines of every BA, shared by the workers of this machine
+BASELINES = BaselineIndex(
+    horizon_days=int(os.environ.get("BASELINE_HORIZON_DAYS", 28)),
+    min_samples=int(os.environ.get("BASELINE_MIN_SAMPLES", 3)),
+    state=SHARED_STATE,
+)
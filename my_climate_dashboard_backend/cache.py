@@ -0,0 +1,255 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from .metrics import REGISTRY, CallbackMetric
+
+CacheEntry = namedtuple("CacheEntry", ["value", "fetched_at", "stored_at"])
+
+
+class _InFlight:
+    """
+    A fetch that is currently running, other callers for the same key wait on it
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Process wide, thread safe cache with a time to live, a size bound and LRU eviction.
+
+    Concurrent misses for the same key share a single fetch: the first caller runs it,
+    the others wait for its result instead of starting their own. get_or_fetch does this for
+    threads, get_or_fetch_async for the tasks of an event loop.
+    """
+
+    def __init__(self, ttl=3600, max_entries=128, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._async_in_flight = {}  # key: asyncio.Future of the running fetch
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def configure(self, ttl=None, max_entries=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if max_entries is not None:
+                self.max_entries = max_entries
+                self._evict()
+
+    def _is_fresh(self, entry):
+        return (self._clock() - entry.stored_at) < self.ttl
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def is_fresh(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and self._is_fresh(entry)
+
+    def lookup(self, key):
+        """
+        Returns (fresh entry or None, previous value or None) for callers that fetch on their own
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, entry.value
+            self.misses += 1
+            return None, entry.value if entry is not None else None
+
+    def put(self, key, value):
+        """
+        Store a value fetched outside of get_or_fetch, e.g. one BA split out of a batch query.
+        None values are not stored.
+        """
+        entry = CacheEntry(value, datetime.datetime.now(), self._clock())
+        if value is None:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry
+
+    def peek(self, key):
+        """
+        Return the entry stored for key, fresh or not, without touching counters or LRU order
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def time_left(self, key):
+        """
+        Seconds until the entry for key goes stale (negative once it has), None if there is no
+        entry. Doesn't touch counters or LRU order.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry.stored_at + self.ttl - self._clock()
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Return a fresh CacheEntry for key, calling fetch(previous) to fill it on a miss.
+
+        previous is the expired value for key, or None, so fetch can refresh it incrementally.
+        fetch results of None are handed back to the caller but never stored.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            previous = entry.value if entry is not None else None
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+                self.misses += 1
+            else:
+                self.waits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+
+        try:
+            value = fetch(previous)
+            flight.entry = CacheEntry(value, datetime.datetime.now(), self._clock())
+            if value is not None:
+                with self._lock:
+                    self._entries[key] = flight.entry
+                    self._entries.move_to_end(key)
+                    self._evict()
+            return flight.entry
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    async def get_or_fetch_async(self, key, fetch):
+        """
+        get_or_fetch for asyncio code: a miss is filled by awaiting fetch(previous), and the other
+        tasks missing the same key meanwhile await that fetch instead of starting their own
+        """
+        import asyncio  # only the async app needs it, keep it out of the Flask app's startup
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._is_fresh(entry):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+                previous = entry.value if entry is not None else None
+                flight = self._async_in_flight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = asyncio.get_running_loop().create_future()
+                    self._async_in_flight[key] = flight
+                    self.misses += 1
+                else:
+                    self.waits += 1
+
+            if leader:
+                break
+            # cancelling a waiter doesn't cancel the fetch, and if the task fetching is cancelled we
+            # try again
+            await asyncio.wait([flight])
+            if not flight.cancelled():
+                return flight.result()
+
+        try:
+            value = await fetch(previous)
+            entry = CacheEntry(value, datetime.datetime.now(), self._clock())
+            if value is not None:
+                with self._lock:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    self._evict()
+            flight.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as error:
+            flight.set_exception(error)
+            # the waiters get it, don't log it as never retrieved when there are none
+            flight.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_in_flight[key]
+
+    def expire(self, key):
+        """
+        Mark key as stale so the next get_or_fetch refreshes it, keeping the old value for
+        fetch(previous)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = entry._replace(stored_at=float("-inf"))
+
+    def invalidate(self, key=None):
+        """
+        Drop one key, or everything when key is None
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "evictions": self.evictions,
+            }
+
+
+# Fetched EIA frames shared by every BAStats in the process, keyed by (BA, dataset, frequency)
+DATA_CACHE = TTLCache(
+    ttl=int(os.environ.get("BA_CACHE_TTL_SECONDS", 3600)),
+    max_entries=int(os.environ.get("BA_CACHE_MAX_ENTRIES", 128)),
+)
+for counter in ("hits", "misses", "waits", "evictions", "entries"):
+    REGISTRY.register(CallbackMetric(
+        f"ba_cache_{counter}" + ("" if counter == "entries" else "_total"),
+        f"BA data cache {counter}",
+        "gauge" if counter == "entries" else "counter",
+        lambda counter=counter: {(): DATA_CACHE.stats()[counter]},
+    ))
@@ -0,0 +1,109 @@
+import datetime
+import email.utils
+from collections import namedtuple
+
+from .baselines import BASELINES
+from .cache import DATA_CACHE
+
+# etag and last_modified as header values, max_age in whole seconds
+Validator = namedtuple("Validator", ["etag", "last_modified", "max_age"])
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def data_tag(mix, demand, baseline_token):
+    """
+    What a stats response is computed from: the newest period and fingerprint of its mix and demand
+    CompactTimeseries and the version of its baselines. None if there is no data.
+    """
+    parts = []
+    for timeseries in (mix, demand):
+        latest_hour = timeseries.latest_hour()
+        if latest_hour is None:
+            return None
+        latest = EPOCH + datetime.timedelta(hours=int(timeseries.hours[latest_hour]))
+        # the newest period is readable in the tag, the fingerprint catches revisions of older ones
+        parts += [latest.strftime("%Y%m%dT%H"), timeseries.fingerprint]
+    # the dial centres and thresholds change with the baselines
+    parts.append(baseline_token)
+    return "-".join(parts)
+
+
+def make_validator(ba_name, version, wire_format, tag, fetched_at, max_age):
+    """
+    Validator of a stats response with the data_tag tag, computed from data fetched at fetched_at,
+    which may be reused for max_age seconds. None without a tag.
+    """
+    if tag is None:
+        return None
+    last_modified = fetched_at.astimezone(datetime.timezone.utc)
+    return Validator(
+        f'W/"{version}-{ba_name.upper()}-{wire_format or "full"}-{tag}"',
+        email.utils.format_datetime(last_modified, usegmt=True),
+        max(int(max_age), 0),
+    )
+
+
+def stats_validator(
+        ba_name, version, wire_format=None, cache=DATA_CACHE, baselines=BASELINES,
+        frequency="hourly",
+):
+    """
+    Validator of the stats response that computing them now would give, from the cached data and
+    the baselines of ba_name. Returns None if that data isn't cached or has gone stale, i.e. the
+    response would be computed from new data.
+
+    Cheap enough to run on every poll: no pandas, and the data fingerprints are computed once
+    per fetch.
+    """
+    ba_name = ba_name.upper()
+    entries, max_age = [], None
+    for dataset in ("mix", "demand"):
+        key = (ba_name, dataset, frequency)
+        time_left, entry = cache.time_left(key), cache.peek(key)
+        if time_left is None or time_left <= 0 or entry is None:
+            return None
+        entries.append(entry)
+        max_age = time_left if max_age is None else min(max_age, time_left)
+    tag = data_tag(entries[0].value, entries[1].value, baselines.token(ba_name))
+    fetched_at = max(entry.fetched_at for entry in entries)
+    return make_validator(ba_name, version, wire_format, tag, fetched_at, max_age)
+
+
+def validator_headers(validator):
+    """
+    ETag, Last-Modified and Cache-Control headers for a stats response, no-cache without a validator
+    """
+    if validator is None:
+        return {"Cache-Control": "no-cache"}
+    return {
+        "ETag": validator.etag,
+        "Last-Modified": validator.last_modified,
+        # clients may reuse the response until our cached data expires, then have to revalidate
+        "Cache-Control": f"max-age={validator.max_age}, must-revalidate",
+    }
+
+
+def _opaque_tag(etag):
+    return etag.strip().removeprefix("W/")
+
+
+def is_not_modified(validator, if_none_match=None, if_modified_since=None):
+    """
+    Whether a request with these conditional headers can be answered with 304 Not Modified.
+    If-None-Match uses the weak comparison and takes precedence over If-Modified-Since.
+    """
+    if validator is None:
+        return False
+    if if_none_match:
+        tags = [_opaque_tag(etag) for etag in if_none_match.split(",")]
+        return "*" in tags or _opaque_tag(validator.etag) in tags
+    if if_modified_since:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        return email.utils.parsedate_to_datetime(validator.last_modified) <= since
+    return False
@@ -0,0 +1,70 @@
+import gzip
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:  # optional, install with pip install -e .[speedups]
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, install with pip install -e .[speedups]
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024  # smaller bodies aren't worth the cpu
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4  # the higher qualities are far too slow for per-request compression
+
+
+def _default(obj):
+    # numpy values left in a response by the compact format, missing values become null.
+    # If numpy isn't loaded yet there can't be any, so don't import it here
+    np = sys.modules.get("numpy")
+    if np is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "f":
+            return np.where(np.isnan(obj), None, obj).tolist()
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """
+    Encode obj as compact JSON bytes, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Content codings from an Accept-Encoding header, without the ones refused with q=0
+    """
+    encodings = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        if coding and not (params and quality.replace(".", "").strip("0") == ""):
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+def compress(body, accept_encoding):
+    """
+    Compress body with the best coding the client accepts, returns (body, Content-Encoding or None)
+    """
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and ("br" in encodings or "*" in encodings):
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in encodings or "*" in encodings:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
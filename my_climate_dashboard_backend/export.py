@@ -0,0 +1,88 @@
+import csv
+import io
+import logging
+
+from .encoding import dumps
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+
+# dataset name: (EIA url segment, columns in CSV exports)
+EXPORT_DATASETS = {
+    "mix": (
+        "fuel-type-data",
+        [
+            "period", "respondent", "respondent-name", "fueltype", "type-name", "value",
+            "value-units",
+        ],
+    ),
+    "demand": (
+        "region-data",
+        ["period", "respondent", "respondent-name", "type", "type-name", "value", "value-units"],
+    ),
+}
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# last line of an NDJSON export that EIA failed in the middle of
+INCOMPLETE_RECORD = {"error": "EIA request failed, the export is incomplete"}
+
+
+def parse_export_date(value):
+    """
+    The start or end of an export, parsed like EIA's periods: a day ("2024-01-31" or "20240131") or
+    an hour ("2024-01-31T05"). Returns it in the format EIA takes, raises ValueError otherwise.
+    """
+    import pandas as pd
+
+    from .ba_stats import parse_eia_periods
+
+    timestamp = parse_eia_periods(pd.Series([value or ""]), "daily")[0]
+    if pd.isna(timestamp):
+        raise ValueError(f"{value!r} is not a date")
+    return timestamp.strftime("%Y-%m-%dT%H" if timestamp.hour else "%Y-%m-%d")
+
+
+def export_chunks(
+        ba_name, dataset, start_date, end_date, export_format="ndjson", frequency="hourly"
+):
+    """
+    Yield a BA's raw EIA rows of dataset between start_date and end_date as NDJSON or CSV text,
+    one chunk per EIA page as it arrives, newest period first
+    """
+    from .ba_stats import iter_eia_pages
+
+    url_segment, columns = EXPORT_DATASETS[dataset]
+    pages = iter_eia_pages(
+        url_segment, {"respondent": [ba_name.upper()]}, start_date, end_date, frequency
+    )
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(
+            buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n"
+        )
+        writer.writeheader()
+        for rows in pages:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        for rows in pages:
+            if rows:
+                yield b"\n".join(dumps(row) for row in rows) + b"\n"
+
+
+def end_on_eia_failure(chunks, export_format, logger=LOCAL_LOGGER):
+    """
+    Pass chunks of export_chunks through, and if EIA fails once the response has started, end an
+    NDJSON export with INCOMPLETE_RECORD. A CSV export has nowhere to put it and is aborted instead,
+    so the client sees a truncated response rather than a file that looks complete.
+    """
+    import requests
+
+    try:
+        yield from chunks
+    except (RuntimeError, requests.RequestException):
+        logger.exception("EIA failed in the middle of an export")
+        if export_format != "ndjson":
+            raise
+        yield dumps(INCOMPLETE_RECORD) + b"\n"
@@ -0,0 +1,217 @@
+import logging
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .ba_stats import BAStats, prefetch_bas
+from .baselines import BASELINES, BaselineIndex
+from .cache import TTLCache
+from .shared import SharedState
+from .timeseries import CompactTimeseries
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+ALIGNMENT = 64  # bytes, so every array starts on a cache line
+
+# Set in each worker process by _init_worker
+_WORKER_TIMESERIES = {}  # {dataset: SharedTimeseries}
+_WORKER_BASELINES = None  # read only BaselineIndex
+
+
+class SharedTimeseries:
+    """
+    Several CompactTimeseries packed into one shared memory block: the hour axis, value matrix and
+    null mask of each, as they are. Worker processes get numpy views of them, so nothing is copied
+    or pickled but the labels, one value per series, which travel with the manifest.
+    """
+
+    def __init__(self, manifest, shm):
+        self.manifest = manifest
+        self.shm = shm
+
+    @classmethod
+    def pack(cls, timeseries):
+        """
+        Copy {key: CompactTimeseries} into a new shared memory block, the caller has to close() and
+        unlink() it
+        """
+        entries, arrays, offset = {}, [], 0
+        for key, series in timeseries.items():
+            layout = {}
+            for name in ("hours", "values", "nulls"):
+                if getattr(series, name) is None:
+                    continue
+                array = np.ascontiguousarray(getattr(series, name))
+                layout[name] = (offset, array.shape, array.dtype.str)
+                arrays.append((offset, array))
+                offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+            entries[key] = {
+                "layout": layout,
+                "series_column": series.series_column,
+                "labels": {column: list(labels) for column, labels in series.labels.items()},
+                "columns": series.columns,
+                "frequency": series.frequency,
+                "value_column": series.value_column,
+            }
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for array_offset, array in arrays:
+            np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=array_offset)[:] = array
+        return cls({"name": shm.name, "timeseries": entries}, shm)
+
+    @classmethod
+    def attach(cls, manifest):
+        # spawned workers share the parent's resource tracker, so the block is unlinked once,
+        # by the parent
+        return cls(manifest, shared_memory.SharedMemory(name=manifest["name"]))
+
+    def timeseries(self, key):
+        """
+        The CompactTimeseries stored under key, its arrays are read only views of the shared memory,
+        drop them before close()
+        """
+        entry = self.manifest["timeseries"][key]
+        arrays = {}
+        for name, (offset, shape, dtype) in entry["layout"].items():
+            array = np.ndarray(shape, np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+            array.flags.writeable = False
+            arrays[name] = array
+        labels = {
+            column: np.array(labels, dtype=object) for column, labels in entry["labels"].items()
+        }
+        return CompactTimeseries(
+            arrays["hours"], arrays["values"], entry["series_column"], labels, entry["columns"],
+            entry["frequency"], entry["value_column"], arrays.get("nulls"),
+        )
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _init_worker(manifests, horizon_days, min_samples, state_path):
+    global _WORKER_BASELINES
+
+    for dataset, manifest in manifests.items():
+        _WORKER_TIMESERIES[dataset] = SharedTimeseries.attach(manifest)
+    # the workers only read the baselines, the prewarm job keeps them up to date
+    _WORKER_BASELINES = BaselineIndex(
+        horizon_days,
+        min_samples,
+        state=None if state_path is None else SharedState(state_path),
+        read_only=True,
+    )
+
+
+def _worker_ready(_):
+    return True
+
+
+def _compute_ba(ba_name):
+    """
+    return_stats of one BA from the timeseries in shared memory, returns (ba_name, response, error)
+    """
+    try:
+        stats = BAStats(ba_name, logger=LOCAL_LOGGER, baselines=_WORKER_BASELINES)
+        stats.mix_timeseries = _WORKER_TIMESERIES["mix"].timeseries(ba_name)
+        stats.demand_timeseries = _WORKER_TIMESERIES["demand"].timeseries(ba_name)
+        return ba_name, stats.calculate_stats(), None
+    except Exception as error:
+        return ba_name, None, repr(error)
+
+
+def fetch_fleet_data(ba_names, logger=LOCAL_LOGGER):
+    """
+    Fetch the default window of mix and demand data of every BA, with one EIA query per dataset for
+    all of them. Returns ({"mix": {ba_name: CompactTimeseries}, "demand": {...}}, {ba_name: error})
+    """
+    ba_names = list(dict.fromkeys(ba_name.upper() for ba_name in ba_names))
+    # the shared DATA_CACHE may be smaller than the fleet
+    cache = TTLCache(max_entries=2 * len(ba_names))
+    errors = prefetch_bas(ba_names, cache=cache)
+
+    data = {"mix": {}, "demand": {}}
+    for ba_name in ba_names:
+        if ba_name in errors:
+            continue
+        try:
+            stats = BAStats(ba_name, logger=logger, cache=cache)
+            stats.get_data_mix()
+            stats.get_data_demand()
+        except Exception as error:
+            logger.exception(f"fetching data for {ba_name} failed")
+            errors[ba_name] = repr(error)
+            continue
+        data["mix"][ba_name] = stats.mix_timeseries
+        data["demand"][ba_name] = stats.demand_timeseries
+    return data, errors
+
+
+def compute_fleet_stats(data, workers=None, logger=LOCAL_LOGGER, baselines=None):
+    """
+    Compute return_stats of every BA in data (as returned by fetch_fleet_data) on a pool of worker
+    processes. Returns ({ba_name: response}, {ba_name: error}, timings) where timings has the
+    seconds spent starting the pool ("startup") and computing ("compute").
+
+    The workers read the baselines (default BASELINES) but never update or backfill them, nor
+    query EIA: keep them up to date with the prewarm job.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    baselines = BASELINES if baselines is None else baselines
+    ba_names = list(data["mix"])
+    shared = {
+        dataset: SharedTimeseries.pack(timeseries) for dataset, timeseries in data.items()
+    }
+    results, errors = {}, {}
+    try:
+        t0 = time.perf_counter()
+        # forking a process with running threads isn't safe
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(
+                workers,
+                initializer=_init_worker,
+                initargs=(
+                    {dataset: block.manifest for dataset, block in shared.items()},
+                    baselines.horizon_days,
+                    baselines.min_samples,
+                    None if baselines.state is None else baselines.state.path,
+                ),
+        ) as pool:
+            pool.map(_worker_ready, range(workers))
+            t1 = time.perf_counter()
+            chunksize = max(1, len(ba_names) // (workers * 4))
+            computed = pool.imap_unordered(_compute_ba, ba_names, chunksize=chunksize)
+            for ba_name, response, error in computed:
+                if error is None:
+                    results[ba_name] = response
+                else:
+                    logger.error(f"calculating stats for {ba_name} failed: {error}")
+                    errors[ba_name] = error
+            t2 = time.perf_counter()
+    finally:
+        for block in shared.values():
+            block.close()
+            block.unlink()
+    return results, errors, {"startup": t1 - t0, "compute": t2 - t1}
+
+
+def fleet_throughput(data, worker_counts, logger=LOCAL_LOGGER):
+    """
+    Compute the fleet with each of worker_counts processes, returns one row of timings and BAs per
+    second per count
+    """
+    rows = []
+    for workers in worker_counts:
+        results, errors, timings = compute_fleet_stats(data, workers, logger=logger)
+        rows.append({
+            "workers": workers,
+            "bas": len(results),
+            "errors": len(errors),
+            "startup_seconds": timings["startup"],
+            "compute_seconds": timings["compute"],
+            "bas_per_second": len(results) / timings["compute"] if timings["compute"] else None,
+        })
+    return rows
@@ -0,0 +1,206 @@
+"""
+Consumption based fuel mix of every BA, tracing power through any number of interchange hops.
+
+Each BA is a pool that mixes its own generation with its imports. Exports leave at the pool's mix,
+so for every hour the fuel shares p_i of BA i's pool solve
+
+    p_i * (g_i + sum_j F_ji) - sum_j F_ji * p_j = G_i
+
+where G_i is its generation by fuel type, g_i its total and F_ji the flow from BA j to BA i. That's
+one linear system per hour over all BAs, solved for all hours at once.
+"""
+import numpy as np
+import pandas as pd
+
+from .timeseries import epoch_hours
+
+UNKNOWN_FUEL = "UNK"  # generation of BAs without fuel mix data, e.g. the Canadian and Mexican ones
+# Respondents of EIA's hourly data that aggregate BAs: the lower 48, its regions and the
+# neighbouring countries. Whole grid queries return them alongside the BAs, counting their
+# generation and interchange twice.
+REGION_RESPONDENTS = frozenset([
+    "US48", "CAL", "CAR", "CENT", "FLA", "MIDA", "MIDW", "NE", "NW", "NY", "SE", "SW", "TEN", "TEX",
+    "CAN", "MEX",
+])
+
+
+class FlowNetwork:
+    """
+    Hourly generation by fuel type and interchange flows of a set of BAs, on one hour axis
+    """
+
+    def __init__(self, hours, ba_names, fuel_types, generation, flows):
+        self.hours = hours  # int64 hours since the epoch, ascending
+        self.ba_names = ba_names  # list of BA names
+        self.fuel_types = fuel_types  # list of fuel type codes
+        self.generation = generation  # hours x BAs x fuel types, MWh
+        self.flows = flows  # hours x BAs x BAs, MWh flowing from the row BA to the column BA
+        self._shares = None
+
+    @classmethod
+    def from_timeseries(cls, mix, interchange, value_column="Interchange (MWh)"):
+        """
+        Build the network from {ba_name: mix CompactTimeseries} and an interchange frame as returned
+        by get_eia_interchange_timeseries. Positive interchange values flow from "fromba" to "toba".
+        Negative generation (e.g. pumped storage charging) counts as none. REGION_RESPONDENTS are
+        left out.
+        """
+        mix = {
+            ba_name: timeseries for ba_name, timeseries in mix.items()
+            if ba_name not in REGION_RESPONDENTS
+        }
+        between_bas = ~(
+            interchange["fromba"].astype(str).isin(REGION_RESPONDENTS)
+            | interchange["toba"].astype(str).isin(REGION_RESPONDENTS)
+        )
+        interchange = interchange[between_bas.to_numpy()]
+        ba_names = sorted(
+            set(mix) | set(interchange["fromba"].astype(str)) | set(interchange["toba"].astype(str))
+        )
+        fuel_types = list(dict.fromkeys(
+            fuel for timeseries in mix.values() for fuel in timeseries.series
+        ))
+        interchange_hours = epoch_hours(interchange["timestamp"])
+        hours = np.unique(np.concatenate(
+            [interchange_hours] + [timeseries.hours for timeseries in mix.values()]
+        ))
+
+        generation = np.zeros((len(hours), len(ba_names), len(fuel_types) + 1))
+        ba_index = {ba_name: position for position, ba_name in enumerate(ba_names)}
+        fuel_index = {fuel: position for position, fuel in enumerate(fuel_types)}
+        for ba_name, timeseries in mix.items():
+            fuels = [fuel_index[fuel] for fuel in timeseries.series]
+            hour_positions = np.searchsorted(hours, timeseries.hours)
+            generation[np.ix_(hour_positions, [ba_index[ba_name]], fuels)] = np.clip(
+                np.nan_to_num(timeseries.values.T), 0, None
+            )[:, None, :]
+
+        # Both ends of a tie line usually report it, with opposite signs, so average what was
+        # reported by each
+        hour_positions = np.searchsorted(hours, interchange_hours)
+        from_positions = pd.Index(ba_names).get_indexer(interchange["fromba"].astype(str))
+        to_positions = pd.Index(ba_names).get_indexer(interchange["toba"].astype(str))
+        values = interchange[value_column].to_numpy()
+        reported = np.zeros((len(hours), len(ba_names), len(ba_names)))
+        reports = np.zeros_like(reported)
+        valid = ~np.isnan(values)
+        cells = (hour_positions[valid], from_positions[valid], to_positions[valid])
+        np.add.at(reported, cells, values[valid])
+        np.add.at(reports, cells, 1)
+        reports = reports + reports.transpose(0, 2, 1)
+        net = np.divide(
+            reported - reported.transpose(0, 2, 1), reports,
+            out=np.zeros_like(reported), where=reports > 0,
+        )
+        flows = np.clip(net, 0, None)
+
+        # BAs without mix data supply whatever they export on balance
+        unknown = [ba_index[ba_name] for ba_name in ba_names if ba_name not in mix]
+        net_exports = flows.sum(axis=2) - flows.sum(axis=1)
+        generation[:, unknown, -1] = np.clip(net_exports[:, unknown], 0, None)
+        if generation[..., -1].any():
+            fuel_types.append(UNKNOWN_FUEL)
+        else:
+            generation = generation[..., :-1]
+        return cls(hours, ba_names, fuel_types, generation, flows)
+
+    @classmethod
+    def from_frames(cls, mix, interchange, frequency="hourly"):
+        """
+        from_timeseries with the mix of all BAs in one frame, as returned by
+        get_eia_grid_mix_timeseries
+        """
+        from .ba_stats import group_positions, to_timeseries
+
+        return cls.from_timeseries(
+            {
+                str(ba_name): to_timeseries(mix.iloc[positions], "fueltype", frequency)
+                for ba_name, positions in group_positions(mix["respondent"]).items()
+                if str(ba_name) not in REGION_RESPONDENTS
+            },
+            interchange,
+        )
+
+    def timestamps(self):
+        return pd.to_datetime(self.hours, unit="h")
+
+    def pool_shares(self):
+        """
+        hours x BAs x (fuel types + BAs) shares of each BA's pool by fuel type, then by the BA that
+        generated it
+        """
+        if self._shares is None:
+            total_generation = self.generation.sum(axis=2)
+            pool = total_generation + self.flows.sum(axis=1)
+            system = -self.flows.transpose(0, 2, 1)
+            diagonal = np.arange(len(self.ba_names))
+            # an empty pool (no generation nor imports) gets all zero shares
+            system[:, diagonal, diagonal] += np.where(pool > 0, pool, 1)
+            sources = np.zeros_like(system)
+            sources[:, diagonal, diagonal] = total_generation
+            self._shares = np.linalg.solve(
+                system, np.concatenate([self.generation, sources], axis=2)
+            )
+        return self._shares
+
+    def consumption(self):
+        """
+        hours x BAs MWh consumed locally: the pool less what is exported
+        """
+        pool = self.generation.sum(axis=2) + self.flows.sum(axis=1)
+        return np.clip(pool - self.flows.sum(axis=2), 0, None)
+
+    def consumption_mix(self):
+        """
+        Long frame of the share and MWh of each fuel type in what each BA consumes, per hour
+        """
+        shares = self.pool_shares()[..., :len(self.fuel_types)]
+        hours, bas, fuels = np.indices(shares.shape).reshape(3, -1)
+        return pd.DataFrame({
+            "timestamp": self.timestamps()[hours],
+            "ba_name": np.asarray(self.ba_names, dtype=object)[bas],
+            "fueltype": np.asarray(self.fuel_types, dtype=object)[fuels],
+            "share": shares.reshape(-1),
+            "Consumption (MWh)": (shares * self.consumption()[..., None]).reshape(-1),
+        })
+
+    def usage_by_source(self, ba_name):
+        """
+        What ba_name consumes per hour by the BA that generated it and its fuel type, through any
+        number of hops. Same columns as usage_by_ba_and_generation_type, which only follows direct
+        imports.
+        """
+        position = self.ba_names.index(ba_name.upper())
+        source_shares = self.pool_shares()[:, position, len(self.fuel_types):]  # hours x source BAs
+        total_generation = self.generation.sum(axis=2, keepdims=True)
+        fuel_shares = np.divide(
+            self.generation, total_generation,
+            out=np.zeros_like(self.generation), where=total_generation > 0,
+        )
+        usage = source_shares[..., None] * fuel_shares * self.consumption()[:, position, None, None]
+
+        hours, sources, fuels = np.nonzero(usage > 0)
+        return pd.DataFrame({
+            "timestamp": self.timestamps()[hours],
+            "fromba": np.asarray(self.ba_names, dtype=object)[sources],
+            "generation_type": np.asarray(self.fuel_types, dtype=object)[fuels],
+            "Usage (MWh)": usage[hours, sources, fuels],
+        })
+
+
+def fetch_flow_network(start_date, end_date, frequency="hourly"):
+    """
+    FlowNetwork of every BA between start_date and end_date, with one (paginated) EIA query per
+    dataset
+    """
+    from .ba_stats import get_eia_grid_mix_timeseries, get_eia_interchange_timeseries
+
+    mix = get_eia_grid_mix_timeseries(
+        None, start_date=start_date, end_date=end_date, frequency=frequency
+    )
+    interchange = get_eia_interchange_timeseries(
+        None, start_date=start_date, end_date=end_date, frequency=frequency
+    )
+    if mix is None or interchange is None:
+        raise RuntimeError(f"fetching EIA data from {start_date} to {end_date} failed")
+    return FlowNetwork.from_frames(mix, interchange, frequency)
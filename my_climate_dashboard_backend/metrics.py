@@ -0,0 +1,161 @@
+import bisect
+import contextlib
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "climate_dashboard_"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self._header() + [
+            f"{self.name}{_labels(self.label_names, label_values)} {value}"
+            for label_values, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        # only a bisect and a few increments, so recording stays cheap when nobody scrapes
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def time(self, *label_values):
+        """
+        Context manager / decorator observing the wall time of the block
+        """
+        histogram = self
+
+        class _Timer(contextlib.ContextDecorator):
+            def _recreate_cm(self):
+                # a fresh timer per decorated call, so concurrent calls don't share t0
+                return _Timer()
+
+            def __enter__(self):
+                self.t0 = time.perf_counter()
+                return self
+
+            def __exit__(self, *exc_info):
+                histogram.observe(time.perf_counter() - self.t0, *label_values)
+                return False
+
+        return _Timer()
+
+    def render(self):
+        with self._lock:
+            values = {
+                label_values: (list(counts[0]), counts[1])
+                for label_values, counts in self._values.items()
+            }
+        lines = self._header()
+        for label_values, (bucket_counts, total) in sorted(values.items()):
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + ("+Inf",), bucket_counts):
+                cumulative += count
+                labels = _labels(self.label_names, label_values, [("le", upper_bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Metric read from elsewhere (e.g. the cache counters) only when scraped
+    """
+
+    def __init__(self, name, documentation, metric_type, callback, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self.type = metric_type
+        self.callback = callback  # returns {label_values: value}
+
+    def render(self):
+        return self._header() + [
+            f"{self.name}{_labels(self.label_names, label_values)} {value}"
+            for label_values, value in sorted(self.callback().items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+EIA_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "eia_request_seconds", "Latency of EIA API requests including retries", ["endpoint"]
+))
+EIA_RETRIES = REGISTRY.register(Counter(
+    "eia_retries_total", "Retried EIA API requests", ["endpoint"]
+))
+EIA_ERRORS = REGISTRY.register(Counter("eia_errors_total", "Failed EIA API requests", ["endpoint"]))
+EIA_RESPONSE_BYTES = REGISTRY.register(Counter(
+    "eia_response_bytes_total", "Bytes received from the EIA API", ["endpoint"]
+))
+EIA_ROWS_FETCHED = REGISTRY.register(Counter(
+    "eia_rows_fetched_total", "Rows fetched from the EIA API", ["endpoint"]
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "stage_seconds", "Wall time of each stage of building the stats", ["stage"]
+))
+STATS_RESPONSES = REGISTRY.register(Counter(
+    "stats_responses_total",
+    "Responses of the stats endpoint, 304 when the client's copy was still current",
+    ["status"],
+))
@@ -0,0 +1,170 @@
+"""
+When to run a flexible load (e.g. charge an EV) in the next hours, from the demand forecast and the
+usual green ratio of each hour of the day.
+
+Green generation (solar, wind, nuclear, hydro) hardly follows demand, so an hour whose demand is
+forecast above its usual level gets that extra from other sources. The expected green ratio of an
+upcoming hour is therefore its hour of day green ratio, scaled by the usual demand of that hour over
+the forecast demand. Windows are compared by their mean expected green ratio, with sliding window
+sums over BAs x hours arrays.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from .timeseries import epoch_hours
+
+DEFAULT_HORIZON_HOURS = 24
+
+
+def hour_of_day_profile(hours, values):
+    """
+    Mean of values per hour of the day (0-23) of hours since the epoch, NaN for hours without values
+    """
+    valid = ~np.isnan(values)
+    hour_of_day = hours[valid] % 24
+    totals = np.bincount(hour_of_day, weights=values[valid], minlength=24)
+    counts = np.bincount(hour_of_day, minlength=24)
+    return np.divide(totals, counts, out=np.full(24, np.nan), where=counts > 0)
+
+
+def current_hour(now=None):
+    """
+    The UTC hour now (a unix time, default the current time) is in, as hours since the epoch like
+    EIA's periods
+    """
+    return int((time.time() if now is None else now) // 3600)
+
+
+def expected_green_ratios(green_df, demand, horizon_hours=DEFAULT_HORIZON_HOURS, now=None):
+    """
+    (first upcoming hour since the epoch, expected green ratio of each of the horizon_hours from it)
+    of one BA, from its create_green_df frame and demand CompactTimeseries. Upcoming hours start at
+    the current UTC hour (of now, a unix time), so forecasts of hours already past are left out.
+    Hours without a forecast are NaN.
+    """
+    actual, forecast = demand.row("D"), demand.row("DF")
+    if np.isnan(actual).all():
+        raise ValueError("no actual demand to plan from")
+    first_hour = current_hour(now)
+
+    green_profile = hour_of_day_profile(
+        epoch_hours(green_df["Date"]), green_df["Green ratio"].to_numpy()
+    )
+    demand_profile = hour_of_day_profile(demand.hours, actual.astype(np.float64))
+
+    upcoming = first_hour + np.arange(horizon_hours)
+    forecast_demand = np.full(horizon_hours, np.nan)
+    upcoming_positions = np.searchsorted(demand.hours, upcoming)
+    known = upcoming_positions < len(demand.hours)
+    known[known] = demand.hours[upcoming_positions[known]] == upcoming[known]
+    forecast_demand[known] = forecast[upcoming_positions[known]]
+
+    hour_of_day = upcoming % 24
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = green_profile[hour_of_day] * demand_profile[hour_of_day] / forecast_demand
+    return first_hour, np.clip(np.where(forecast_demand > 0, ratios, np.nan), 0, 1)
+
+
+def best_windows(scores, durations):
+    """
+    Best contiguous window of each duration in each row of scores (BAs x hours, NaN for unknown
+    hours), i.e. the one with the highest mean score and no unknown hour. Returns (starts, means),
+    both rows x durations: the window's first position on the hour axis and its mean, -1 and NaN if
+    none fits.
+    """
+    scores = np.atleast_2d(scores)
+    durations = np.asarray(durations, dtype=np.int64)
+    rows, hours = scores.shape
+    # window sums are differences of cumulative sums, unknown hours are counted alongside
+    sums = np.zeros((rows, hours + 1))
+    np.cumsum(np.nan_to_num(scores), axis=1, out=sums[:, 1:])
+    unknown = np.zeros((rows, hours + 1), dtype=np.int64)
+    np.cumsum(np.isnan(scores), axis=1, out=unknown[:, 1:])
+
+    starts = np.arange(hours)
+    ends = starts[None, :] + durations[:, None]  # durations x starts
+    fits = (ends <= hours) & (durations[:, None] > 0)
+    ends = np.minimum(ends, hours)
+    window_sums = sums[:, ends] - sums[:, starts][:, None, :]  # rows x durations x starts
+    complete = fits[None] & (unknown[:, ends] == unknown[:, starts][:, None, :])
+    means = np.where(complete, window_sums / np.maximum(durations, 1)[None, :, None], -np.inf)
+
+    best = means.argmax(axis=2)
+    best_means = np.take_along_axis(means, best[..., None], axis=2)[..., 0]
+    found = np.isfinite(best_means)
+    return np.where(found, best, -1), np.where(found, best_means, np.nan)
+
+
+def plan_green_windows(
+        ba_names, durations, horizon_hours=DEFAULT_HORIZON_HOURS, logger=None, cache=None, now=None
+):
+    """
+    Returns ({ba_name: plan}, {ba_name: error}): the upcoming hours of each BA from the current hour
+    (of now, a unix time) ranked by expected green ratio and its best window for each duration in
+    hours, fetching all the uncached BAs together
+    """
+    from .ba_stats import LOCAL_LOGGER, BAStats, prefetch_bas
+
+    logger = LOCAL_LOGGER if logger is None else logger
+    ba_names = list(dict.fromkeys(ba_name.upper() for ba_name in ba_names))
+    durations = sorted({int(duration) for duration in durations})
+    errors = prefetch_bas(ba_names, cache=cache)
+
+    planned, first_hours, scores = [], [], []
+    for ba_name in ba_names:
+        if ba_name in errors:
+            continue
+        try:
+            ba_stats = BAStats(ba_name, logger=logger, cache=cache)
+            ba_stats.get_data_mix()
+            ba_stats.get_data_demand()
+            first_hour, expected = expected_green_ratios(
+                ba_stats.create_green_df(), ba_stats.demand_timeseries, horizon_hours, now
+            )
+        except Exception as error:
+            logger.exception(f"planning green windows for {ba_name} failed")
+            errors[ba_name] = repr(error)
+            continue
+        planned.append(ba_name)
+        first_hours.append(first_hour)
+        scores.append(expected)
+    if not planned:
+        return {}, errors
+
+    scores = np.vstack(scores)
+    starts, means = best_windows(scores, durations)
+    # hours of every BA's axis as strings, like the timestamps of the stats response
+    axis_hours = np.asarray(first_hours)[:, None] + np.arange(horizon_hours + 1)
+    timestamps = pd.to_datetime(axis_hours.reshape(-1), unit="h").astype(str)
+    timestamps = np.asarray(timestamps, dtype=object).reshape(axis_hours.shape)
+    ranked = np.argsort(-np.nan_to_num(scores, nan=-np.inf), axis=1, kind="stable")
+
+    plans = {}
+    for row, ba_name in enumerate(planned):
+        known = ~np.isnan(scores[row, ranked[row]])
+        hours = ranked[row][known]
+        plans[ba_name] = {
+            "ba_name": ba_name,
+            "forecast_start": timestamps[row, 0],
+            "ranked_hours": [
+                {
+                    "timestamp": timestamps[row, hour],
+                    "expected_green_ratio": float(scores[row, hour]),
+                }
+                for hour in hours.tolist()
+            ],
+            "windows": [
+                {
+                    "duration_hours": duration,
+                    "start": timestamps[row, start] if start >= 0 else None,
+                    "end": timestamps[row, start + duration] if start >= 0 else None,
+                    "expected_green_ratio": None if start < 0 else float(mean),
+                }
+                for duration, start, mean in zip(
+                    durations, starts[row].tolist(), means[row].tolist()
+                )
+            ],
+        }
+    return plans, errors
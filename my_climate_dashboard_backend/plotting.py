@@ -0,0 +1,106 @@
+"""
+Plots of the data behind the stats of a BA, for exploring it locally. Needs matplotlib (pip install
+-e .[plot]):
+
+my_climate_dashboard_backend plot PSEI
+"""
+import time
+
+import pandas as pd
+
+try:
+    import matplotlib.pyplot as plt
+except ImportError:  # optional, install with pip install -e .[plot]
+    plt = None
+
+from .ba_stats import BAStats
+
+
+def plot_ba(ba_authority="PSEI"):
+    """
+    Fetch the stats of ba_authority and plot its generation mix, demand, green/demand ratios and
+    their correlation
+    """
+    if plt is None:
+        raise ImportError("plotting needs matplotlib, install it with pip install -e .[plot]")
+
+    t0 = time.time()
+    ba_stats = BAStats(ba_authority)
+    results = ba_stats.return_stats()
+
+    print("data_demand_datetime", ba_stats.data_demand_datetime)
+    print("data_demand\n", ba_stats.data_demand)
+
+    print("data_mix_datetime", ba_stats.data_mix_datetime)
+    print("data_mix\n", ba_stats.data_mix)
+    print("Process time:", time.time()-t0)
+
+    print(results)
+
+    # Plot results
+    fig, ax = plt.subplots(figsize=(12, 8))
+    for fuel_type in ba_stats.data_mix["type-name"].unique():
+        df = ba_stats.data_mix[ba_stats.data_mix["type-name"] == fuel_type]
+        ax.plot(df["timestamp"], df["Generation (MWh)"], label=fuel_type)
+    plt.legend()
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    plt.title(f"{ba_authority} Power Generation")
+    plt.xlabel("Timestamp")
+    plt.ylabel("Generation (MWh)")
+    plt.show()
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    for fuel_type in ba_stats.data_demand["type-name"].unique():
+        df = ba_stats.data_demand[ba_stats.data_demand["type-name"] == fuel_type]
+        ax.plot(df["timestamp"], df["Generation (MWh)"], label=fuel_type)
+
+    plt.legend()
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    plt.title(f"{ba_authority} Power Generation")
+    plt.xlabel("Timestamp")
+    plt.ylabel("Generation (MWh)")
+    plt.show()
+
+    # plot green
+    demand_df = ba_stats.create_demand_df()
+    green_df = ba_stats.create_green_df()
+
+    # Merge the demand information from df_demand
+    analysis_df = pd.merge(green_df, demand_df[
+        ['period', 'Demand', 'Demand Forecast', 'Demand_norm', 'Demand Forecast_norm',
+         'Demand ratio', 'Demand diff']], on='period')
+
+    # Plot Ratios
+    fig, ax = plt.subplots(figsize=(12, 8))
+    ax.plot(analysis_df['Date'], analysis_df['Green ratio'], "g", label="green_ratio")
+    ax.plot(analysis_df['Date'], analysis_df['Demand ratio'], "b", label="demand2forecast_ratio")
+    ax.plot(analysis_df['Date'], analysis_df['Demand_norm'], "c", label="demand2max_ratio")
+    plt.legend()
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    # plt.tight_layout()
+    plt.xlabel("Timestamp")
+    plt.ylabel("Ratio")
+    plt.title(
+        f"{ba_authority} Green energy / Demand ratio vs time (latest: {max(analysis_df['Date'])})"
+    )
+
+    # Plot correlation
+    correlation = analysis_df["Green ratio"].corr(analysis_df["Demand ratio"])
+    fig, ax = plt.subplots(figsize=(12, 8))
+    ax.scatter(analysis_df["Green ratio"], analysis_df["Demand ratio"], label='')
+    # ax.scatter(analysis_df["Green ratio"], analysis_df["Demand diff"], label='')
+    ax.annotate(
+        f'Correlation: {correlation:.2f}',
+        xy=(0.5, 0.95), xycoords='axes fraction', ha='center', fontsize=12,
+    )
+    plt.legend()
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    # plt.tight_layout()
+    plt.title(f"{ba_authority} Green energy ratio vs Demand ratio")
+    plt.xlabel("Green ratio")
+    plt.ylabel("Demand ratio")
+    plt.show()
@@ -0,0 +1,359 @@
+"""
+Per user alert rules, evaluated in bulk against each new stats response of a BA.
+
+Rules, their firing state and the events are kept in the SharedState, so every worker sees the same
+ones and they survive restarts. The pre-warm job evaluates them once per new data of each BA that
+has rules: the rules of that BA are kept as columns (one array per field), reloaded only when their
+version changes, and evaluated with a few array operations. Only the rules whose state flips produce
+an event, and their flags and events are written with one statement each.
+"""
+import collections
+import datetime
+import json
+import os
+import threading
+
+import numpy as np
+
+from .metrics import REGISTRY, STAGE_SECONDS, CallbackMetric, Counter
+from .shared import SHARED_STATE
+
+METRICS = ("green", "demand")  # the code of a metric is its position
+# dial value and centre of each metric in a stats response
+METRIC_FIELDS = {
+    "green": ("green_ratio_current", "green_ratio_mean"),
+    "demand": ("demand_ratio_current", "demand_ratio_mean"),
+}
+DIRECTIONS = ("above", "below")
+
+RULE_EVENTS = REGISTRY.register(Counter(
+    "alert_rule_events_total", "Alert rules that started or stopped firing", ["metric", "state"]
+))
+
+
+class RuleBlock:
+    """
+    The rules of one BA, one array per field, as loaded from the alert_rules table
+    """
+
+    COLUMNS = (
+        "rule_ids", "user_ids", "metrics", "above", "thresholds", "relative",
+        "quiet_starts", "quiet_ends", "utc_offsets", "firing",
+    )
+
+    def __init__(self):
+        self.rule_ids = np.empty(0, dtype=np.int64)
+        self.user_ids = np.empty(0, dtype=object)
+        self.metrics = np.empty(0, dtype=np.int8)
+        self.above = np.empty(0, dtype=bool)
+        self.thresholds = np.empty(0, dtype=np.float64)
+        # threshold is a multiple of the dial centre, else a ratio
+        self.relative = np.empty(0, dtype=bool)
+        # local hours, quiet from start (inclusive) to end (exclusive), never when they are equal
+        self.quiet_starts = np.empty(0, dtype=np.int8)
+        self.quiet_ends = np.empty(0, dtype=np.int8)
+        self.utc_offsets = np.empty(0, dtype=np.float64)  # hours, for the user's local time
+        self.firing = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.rule_ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Block of rules given as tuples of the COLUMNS
+        """
+        block = cls()
+        for column, values in zip(cls.COLUMNS, zip(*rows)):
+            setattr(block, column, np.asarray(values, dtype=getattr(block, column).dtype))
+        return block
+
+    def rows(self, positions):
+        """
+        Rules at positions as dicts, in the format add_rules takes
+        """
+        # tolist() once per column instead of converting numpy scalars one by one
+        columns = zip(*(getattr(self, column)[positions].tolist() for column in self.COLUMNS))
+        return [
+            {
+                "rule_id": rule_id,
+                "user_id": user_id,
+                "metric": METRICS[metric],
+                "direction": DIRECTIONS[0 if above else 1],
+                "threshold": threshold,
+                "relative": relative,
+                "quiet_hours": None if quiet_start == quiet_end else [quiet_start, quiet_end],
+                "utc_offset": utc_offset,
+                "firing": firing,
+            }
+            for (rule_id, user_id, metric, above, threshold, relative,
+                 quiet_start, quiet_end, utc_offset, firing) in columns
+        ]
+
+    def evaluate(self, response, now):
+        """
+        Update the firing state of every rule from a stats response, returns (positions of the rules
+        whose state changed, their values, their limits). Rules in their quiet hours keep their
+        state, so an alert that is still on when they end is sent then.
+        """
+        current, centres = np.array(
+            [[response[METRIC_FIELDS[metric][field]] for metric in METRICS] for field in (0, 1)],
+            dtype=np.float64,
+        )
+        values = current[self.metrics]
+        limits = np.where(self.relative, self.thresholds * centres[self.metrics], self.thresholds)
+        # a missing (NaN) ratio fires nothing, so it resolves alerts rather than raising them
+        firing = np.where(self.above, values > limits, values < limits)
+
+        local_hours = np.floor(now.hour + now.minute / 60 + self.utc_offsets) % 24
+        quiet = np.where(
+            self.quiet_starts <= self.quiet_ends,
+            (local_hours >= self.quiet_starts) & (local_hours < self.quiet_ends),
+            (local_hours >= self.quiet_starts) | (local_hours < self.quiet_ends),  # spans midnight
+        )
+        changed = np.flatnonzero((firing != self.firing) & ~quiet)
+        self.firing[changed] = firing[changed]
+        return changed, values[changed], limits[changed]
+
+
+class AlertRules:
+    """
+    Alert rules of every subscriber, grouped by BA and kept in a SharedState. evaluate() runs on
+    each new stats response of a BA and adds the rules that started or stopped firing to their
+    users' events.
+    """
+
+    # alert_rules columns in RuleBlock.COLUMNS order
+    SELECT = (
+        "SELECT rule_id, user_id, metric, above, threshold, relative, quiet_start, quiet_end, "
+        "utc_offset, firing FROM alert_rules"
+    )
+
+    def __init__(self, state=SHARED_STATE, max_events_per_user=50):
+        self.state = state
+        self.max_events_per_user = max_events_per_user
+        self._lock = threading.Lock()
+        # ba_name: (alert_rule_versions.version, RuleBlock) of the last evaluated rules of the BA
+        self._blocks = {}
+
+    @staticmethod
+    def _bump_versions(connection, ba_names):
+        connection.executemany(
+            "INSERT INTO alert_rule_versions (ba_name, version) VALUES (?, 1) "
+            "ON CONFLICT (ba_name) DO UPDATE SET version = version + 1",
+            [(ba_name,) for ba_name in sorted(set(ba_names))],
+        )
+
+    def add_rules(self, rules):
+        """
+        Add rules given as dicts with user_id, ba_name, metric ("green" or "demand"), direction
+        ("above" or "below") and threshold, plus optionally relative (default True: threshold is a
+        multiple of the dial centre, like the default 0.75 and 1.1), quiet_hours ([start, end) local
+        hours) and utc_offset (hours). Returns the ids of the new rules, raises ValueError without
+        adding any if one is invalid.
+        """
+        rows = []
+        for position, rule in enumerate(rules):
+            try:
+                ba_name = str(rule["ba_name"]).upper()
+                metric = METRICS.index(rule["metric"])
+                direction = DIRECTIONS.index(rule["direction"])
+                threshold = float(rule["threshold"])
+                quiet_start, quiet_end = rule.get("quiet_hours") or (0, 0)
+                quiet_start, quiet_end = int(quiet_start), int(quiet_end)
+                utc_offset = float(rule.get("utc_offset", 0))
+                user_id = str(rule["user_id"])
+            except (KeyError, TypeError, ValueError) as error:
+                raise ValueError(f"rule {position} is invalid: {error!r}") from None
+            if not (0 <= quiet_start < 24 and 0 <= quiet_end < 24) or not -12 <= utc_offset <= 14:
+                raise ValueError(
+                    f"rule {position} is invalid: "
+                    "quiet_hours must be hours and utc_offset in -12..14"
+                )
+            rows.append((
+                user_id, ba_name, metric, direction == 0, threshold,
+                bool(rule.get("relative", True)), quiet_start, quiet_end, utc_offset,
+            ))
+
+        with self.state.transaction() as connection:
+            rule_ids = [
+                connection.execute(
+                    "INSERT INTO alert_rules (user_id, ba_name, metric, above, threshold, "
+                    "relative, quiet_start, quiet_end, utc_offset) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING rule_id",
+                    row,
+                ).fetchone()[0]
+                for row in rows
+            ]
+            self._bump_versions(connection, [row[1] for row in rows])
+        return rule_ids
+
+    def remove_rules(self, rule_ids, user_id=None):
+        """
+        Remove rules by id (only those of user_id if given), returns how many were removed
+        """
+        rule_ids = [int(rule_id) for rule_id in rule_ids]
+        if not rule_ids:
+            return 0
+        sql = f"DELETE FROM alert_rules WHERE rule_id IN ({', '.join('?' * len(rule_ids))})"
+        parameters = list(rule_ids)
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            parameters.append(user_id)
+        with self.state.transaction() as connection:
+            removed = connection.execute(sql + " RETURNING ba_name", parameters).fetchall()
+            self._bump_versions(connection, [ba_name for ba_name, in removed])
+        return len(removed)
+
+    def rules_of(self, user_id):
+        """
+        Every rule of user_id, with its BA and whether it is firing
+        """
+        rows = self.state.execute(
+            self.SELECT.replace("SELECT ", "SELECT ba_name, ", 1)
+            + " WHERE user_id = ? ORDER BY rule_id",
+            (user_id,),
+        ).fetchall()
+        if not rows:
+            return []
+        block = RuleBlock.from_rows([row[1:] for row in rows])
+        rules = block.rows(np.arange(len(rows)))
+        return [dict(rule, ba_name=row[0]) for row, rule in zip(rows, rules)]
+
+    def rule_counts(self):
+        return dict(self.state.execute(
+            "SELECT ba_name, count(*) FROM alert_rules GROUP BY ba_name"
+        ).fetchall())
+
+    def ba_names(self):
+        """
+        The BAs that have rules, which the pre-warm job refreshes whether they are configured or not
+        """
+        rows = self.state.execute("SELECT DISTINCT ba_name FROM alert_rules ORDER BY 1")
+        return [ba_name for ba_name, in rows]
+
+    def _block(self, connection, ba_name, version):
+        """
+        RuleBlock of the rules of ba_name at version, loaded from the alert_rules table unless the
+        last evaluated one is still current. Taken out of the cache until evaluate puts it back, so
+        a failed evaluation never leaves half updated firing flags in it.
+        """
+        with self._lock:
+            cached = self._blocks.pop(ba_name, None)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        rows = connection.execute(
+            self.SELECT + " WHERE ba_name = ? ORDER BY rule_id", (ba_name,)
+        ).fetchall()
+        return RuleBlock.from_rows(rows)
+
+    @STAGE_SECONDS.time("evaluate_rules")
+    def evaluate(self, response, tag=None, now=None):
+        """
+        Evaluate every rule of the BA of a stats response, returns the events of the rules that
+        changed state. With the conditional.data_tag of the response, a response whose data was
+        already evaluated is skipped.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        ba_name = response["ba_name"].upper()
+        with self.state.transaction() as connection:
+            if tag is not None:
+                evaluated = connection.execute(
+                    "SELECT tag FROM alert_evaluations WHERE ba_name = ?", (ba_name,)
+                ).fetchone()
+                if evaluated is not None and evaluated[0] == tag:
+                    return []
+                connection.execute(
+                    "INSERT OR REPLACE INTO alert_evaluations (ba_name, tag) VALUES (?, ?)",
+                    (ba_name, tag),
+                )
+
+            row = connection.execute(
+                "SELECT version FROM alert_rule_versions WHERE ba_name = ?", (ba_name,)
+            ).fetchone()
+            version = 0 if row is None else row[0]
+            block = self._block(connection, ba_name, version)
+            changed, values, limits = block.evaluate(response, now) if len(block) else ([], [], [])
+            events = []
+            if len(changed):
+                rule_ids, user_ids, metrics, above, firing = (
+                    getattr(block, column)[changed].tolist()
+                    for column in ("rule_ids", "user_ids", "metrics", "above", "firing")
+                )
+                connection.executemany(
+                    "UPDATE alert_rules SET firing = ? WHERE rule_id = ?", zip(firing, rule_ids)
+                )
+                # the cached block already has the new flags
+                version += 1
+                connection.execute(
+                    "INSERT INTO alert_rule_versions (ba_name, version) VALUES (?, ?) "
+                    "ON CONFLICT (ba_name) DO UPDATE SET version = excluded.version",
+                    (ba_name, version),
+                )
+
+                timestamp = response.get("source_ratio_current", {}).get("timestamp")
+                created = now.isoformat()
+                events = [
+                    {
+                        "rule_id": rule_id,
+                        "user_id": user_id,
+                        "ba_name": ba_name,
+                        "metric": METRICS[metric],
+                        "direction": DIRECTIONS[0 if rule_above else 1],
+                        "state": "firing" if rule_firing else "resolved",
+                        "value": value,
+                        "limit": limit,
+                        "timestamp": timestamp,
+                        "created": created,
+                    }
+                    for rule_id, user_id, metric, rule_above, rule_firing, value, limit in zip(
+                        rule_ids, user_ids, metrics, above, firing, values.tolist(),
+                        limits.tolist(),
+                    )
+                ]
+                connection.executemany(
+                    "INSERT INTO alert_events (user_id, event) VALUES (?, ?)",
+                    [(event["user_id"], json.dumps(event)) for event in events],
+                )
+                # the transaction holds the write lock, so the new events got consecutive ids
+                last_id, = connection.execute("SELECT last_insert_rowid()").fetchone()
+                first_id = last_id - len(events) + 1
+                events = [dict(event, id=first_id + i) for i, event in enumerate(events)]
+
+                # each user keeps their most recent events
+                users = sorted(set(user_ids))
+                connection.execute(
+                    "DELETE FROM alert_events WHERE event_id IN ("
+                    "SELECT event_id FROM (SELECT event_id, row_number() OVER ("
+                    "PARTITION BY user_id ORDER BY event_id DESC) AS position "
+                    f"FROM alert_events WHERE user_id IN ({', '.join('?' * len(users))})) "
+                    "WHERE position > ?)",
+                    (*users, self.max_events_per_user),
+                )
+        with self._lock:
+            self._blocks[ba_name] = (version, block)
+
+        counts = collections.Counter((event["metric"], event["state"]) for event in events)
+        for (metric, state), count in counts.items():
+            RULE_EVENTS.inc(metric, state, amount=count)
+        return events
+
+    def events_of(self, user_id, since=0):
+        """
+        The most recent events of user_id with an id above since, oldest first
+        """
+        rows = self.state.execute(
+            "SELECT event_id, event FROM alert_events WHERE user_id = ? AND event_id > ? "
+            "ORDER BY event_id",
+            (user_id, since),
+        ).fetchall()
+        return [dict(json.loads(event), id=event_id) for event_id, event in rows]
+
+
+# Alert rules of every worker, evaluated by the pre-warm job (StatsRefresher.refresh)
+RULES = AlertRules(max_events_per_user=int(os.environ.get("ALERT_RULE_MAX_EVENTS", 50)))
+REGISTRY.register(CallbackMetric(
+    "alert_rules", "Alert rules registered, per BA", "gauge",
+    lambda: {(ba_name,): count for ba_name, count in RULES.rule_counts().items()},
+    ["ba_name"],
+))
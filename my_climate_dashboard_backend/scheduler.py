@@ -0,0 +1,315 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .cache import DATA_CACHE
+from .encoding import dumps
+from .shared import SHARED_STATE
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where nothing stops two refreshers from running
+    fcntl = None
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+
+# A stored response with the conditional.data_tag and fetch time of what it was computed from,
+# and the seconds until it is too old to serve
+Precomputed = namedtuple("Precomputed", ["response", "tag", "fetched_at", "expires_in"])
+
+
+def seconds_until_minute(minute, now=None):
+    """
+    Seconds until the clock next shows minute past the hour
+    """
+    now = now or datetime.datetime.now()
+    next_run = now.replace(minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += datetime.timedelta(hours=1)
+    return (next_run - now).total_seconds()
+
+
+class PrecomputedStats:
+    """
+    The read side of the stats a StatsRefresher keeps in the shared state: what the app's workers
+    serve, and the refresh status they report. It never computes or refreshes anything.
+    """
+
+    def __init__(self, max_age_seconds=None, state=SHARED_STATE):
+        # older responses are not served, by default they are no older than the cached data
+        self.max_age_seconds = DATA_CACHE.ttl if max_age_seconds is None else max_age_seconds
+        self.state = state
+        self._lock = threading.Lock()
+        # ba_name: (computed_at, response), so a response is only decoded once per process
+        self._loaded = {}
+
+    @property
+    def lock_path(self):
+        return f"{self.state.path}.refresher.lock"
+
+    def get(self, ba_name):
+        """
+        Returns the precomputed response for ba_name, or None if there isn't a recent one
+        """
+        precomputed = self.lookup(ba_name)
+        return None if precomputed is None else precomputed.response
+
+    def lookup(self, ba_name):
+        """
+        Returns the Precomputed stats of ba_name, or None if there aren't recent ones
+        """
+        ba_name = ba_name.upper()
+        row = self.state.execute(
+            "SELECT computed_at, tag, fetched_at FROM precomputed_stats WHERE ba_name = ?",
+            (ba_name,),
+        ).fetchone()
+        if row is None:
+            return None
+        computed_at, tag, fetched_at = row
+        expires_in = self.max_age_seconds - (time.time() - computed_at)
+        if expires_in < 0:
+            return None
+        with self._lock:
+            loaded = self._loaded.get(ba_name)
+        if loaded is None or loaded[0] != computed_at:
+            stored = self.state.execute(
+                "SELECT computed_at, response FROM precomputed_stats "
+                "WHERE ba_name = ? AND computed_at = ?",
+                (ba_name, computed_at),
+            ).fetchone()
+            if stored is None:  # replaced by a newer refresh meanwhile
+                return self.lookup(ba_name)
+            loaded = (stored[0], json.loads(stored[1]))
+            with self._lock:
+                self._loaded[ba_name] = loaded
+        fetched_at = None if fetched_at is None else datetime.datetime.fromisoformat(fetched_at)
+        return Precomputed(loaded[1], tag, fetched_at, expires_in)
+
+    def is_leader_running(self):
+        """
+        Whether some process on the machine is refreshing, i.e. holds the lock file
+        """
+        if fcntl is None or not os.path.exists(self.lock_path):
+            return False
+        with open(self.lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+
+    def status(self):
+        """
+        Whether the prewarm job is running, and when each BA it refreshed was last refreshed
+        """
+        rows = self.state.execute(
+            "SELECT ba_name, last_refreshed, last_duration, last_error, refreshes "
+            "FROM refresh_status"
+        ).fetchall()
+        return {
+            "running": self.is_leader_running(),
+            "ba": {
+                ba_name: {
+                    "last_refreshed": last_refreshed,
+                    "last_duration": last_duration,
+                    "last_error": last_error,
+                    "refreshes": refreshes,
+                }
+                for ba_name, last_refreshed, last_duration, last_error, refreshes in rows
+            },
+        }
+
+
+class StatsRefresher(PrecomputedStats):
+    """
+    Recomputes BAStats.return_stats for a configured list of BAs, and every BA with alert rules,
+    shortly after EIA publishes each hour. The responses are kept in the shared state so every
+    worker can serve them without computing anything, and the alert rules of the BA are evaluated
+    once per new data.
+
+    Only one process on the machine refreshes: start() takes a lock file and does nothing if another
+    process holds it. Run it as its own job (my_climate_dashboard_backend prewarm), the app itself
+    only reads, through a PrecomputedStats.
+    """
+
+    def __init__(
+            self,
+            ba_names,
+            publish_minute=15,
+            stagger_seconds=60,
+            concurrency=4,
+            max_age_seconds=None,
+            state=SHARED_STATE,
+            rules=None,
+            logger=LOCAL_LOGGER,
+    ):
+        super().__init__(max_age_seconds, state)
+        self.ba_names = [ba_name.upper() for ba_name in ba_names]
+        # minutes past the hour at which new EIA data is expected
+        self.publish_minute = publish_minute
+        self.stagger_seconds = stagger_seconds  # refreshes are spread out over this many seconds
+        self.concurrency = concurrency
+        self._rules = rules  # default rules.RULES
+        self.logger = logger
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._lock_file = None
+
+    @property
+    def rules(self):
+        if self._rules is None:
+            from .rules import RULES  # it loads numpy, which creating the app doesn't need
+
+            self._rules = RULES
+        return self._rules
+
+    def refresh(self, ba_name):
+        from .ba_stats import BAStats
+
+        t0 = time.monotonic()
+        try:
+            ba_stats = BAStats(ba_name, logger=self.logger)
+            ba_stats.expire_cached_data()
+            ba_stats.get_data_mix()
+            ba_stats.get_data_demand()
+            # the baselines are only written here, the app's workers only read them
+            ba_stats.refresh_baselines()
+            response = ba_stats.calculate_stats()
+        except Exception as error:
+            self.logger.exception(f"refreshing {ba_name} failed")
+            with self.state.transaction() as connection:
+                connection.execute(
+                    "INSERT INTO refresh_status (ba_name, last_error) VALUES (?, ?) "
+                    "ON CONFLICT (ba_name) DO UPDATE SET last_error = excluded.last_error",
+                    (ba_name, repr(error)),
+                )
+            return
+
+        # stored with the response, so it is served with the validator of what it was computed from
+        tag = ba_stats.stats_tag()
+        fetched_at = max(ba_stats.data_mix_datetime, ba_stats.data_demand_datetime)
+        try:
+            # skipped when the data hasn't changed since the rules were last evaluated
+            self.rules.evaluate(response, tag=tag)
+        except Exception:
+            self.logger.exception(f"evaluating the alert rules of {ba_name} failed")
+        with self.state.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO precomputed_stats "
+                "(ba_name, response, computed_at, tag, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (ba_name, dumps(response).decode(), time.time(), tag, fetched_at),
+            )
+            connection.execute(
+                "INSERT INTO refresh_status "
+                "(ba_name, last_refreshed, last_duration, last_error, refreshes) "
+                "VALUES (?, ?, ?, NULL, 1) ON CONFLICT (ba_name) DO UPDATE SET "
+                "last_refreshed = excluded.last_refreshed, last_duration = excluded.last_duration, "
+                "last_error = NULL, refreshes = refreshes + 1",
+                (ba_name, datetime.datetime.now().isoformat(), time.monotonic() - t0),
+            )
+
+    def all_ba_names(self):
+        """
+        The configured BAs and those with alert rules
+        """
+        return list(dict.fromkeys(self.ba_names + self.rules.ba_names()))
+
+    def refresh_all(self):
+        """
+        Queue a refresh of every BA, staggered so they don't all hit EIA at once
+        """
+        ba_names = self.all_ba_names()
+        futures = []
+        for i, ba_name in enumerate(ba_names):
+            if self._stop.wait(i and self.stagger_seconds / len(ba_names)):
+                break
+            futures.append(self._executor.submit(self.refresh, ba_name))
+        wait(futures)
+
+    def seconds_until_next_publish(self, now=None):
+        return seconds_until_minute(self.publish_minute, now)
+
+    def _run(self):
+        self.refresh_all()
+        while not self._stop.wait(self.seconds_until_next_publish()):
+            self.refresh_all()
+
+    def _take_lock(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def is_leader_running(self):
+        return self._thread is not None or super().is_leader_running()
+
+    def start(self):
+        """
+        Start refreshing in a background thread, returns False if another process is already
+        refreshing
+        """
+        if self._thread is not None:
+            return True
+        if not self._take_lock():
+            self.logger.info("another process is pre-warming stats, not starting a refresher")
+            return False
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="stats-refresher"
+        )
+        self._thread = threading.Thread(target=self._run, name="stats-refresher", daemon=True)
+        self._thread.start()
+        self.logger.info(f"pre-warming stats for {self.ba_names} and the BAs with alert rules")
+        return True
+
+    def stop(self, timeout=None):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread.join(timeout)
+        self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the lock
+            self._lock_file = None
+
+    def interrupt(self):
+        """
+        Make wait() return, safe to call from a signal handler
+        """
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        """
+        Block until stop() or interrupt() is called
+        """
+        return self._stop.wait(timeout)
+
+    def status(self):
+        status = super().status()
+        status["ba"] = dict(
+            {
+                ba_name: {
+                    "last_refreshed": None, "last_duration": None, "last_error": None,
+                    "refreshes": 0,
+                }
+                for ba_name in self.ba_names
+            },
+            **status["ba"],
+        )
+        status["seconds_until_next_refresh"] = self.seconds_until_next_publish()
+        return status
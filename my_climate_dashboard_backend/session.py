@@ -0,0 +1,158 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from .metrics import EIA_ERRORS, EIA_REQUEST_SECONDS, EIA_RETRIES
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EIASession:
+    """
+    Pooled keep-alive HTTP session used by every EIA fetch helper.
+
+    Retries 429/5xx responses and connection errors with exponential backoff and full jitter,
+    and keeps per endpoint latency and retry counters so slow upstream calls can be told apart
+    from slow local processing.
+    """
+
+    def __init__(
+            self,
+            pool_size=10,
+            connect_timeout=5.0,
+            read_timeout=30.0,
+            max_retries=3,
+            backoff_base=0.5,
+            backoff_max=30.0,
+            logger=LOCAL_LOGGER,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._endpoint_stats = {}
+        self.pool_size = pool_size
+        self._session = None
+
+    @property
+    def session(self):
+        # requests is only imported, and the pool only created, when EIA is first called
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def configure(
+            self,
+            pool_size=None,
+            connect_timeout=None,
+            read_timeout=None,
+            max_retries=None,
+            backoff_base=None,
+    ):
+        if pool_size is not None and pool_size != self.pool_size:
+            with self._lock:
+                if self._session is not None:
+                    self._session.close()
+                    self._session = None
+                self.pool_size = pool_size
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            self.read_timeout = read_timeout
+        if max_retries is not None:
+            self.max_retries = max_retries
+        if backoff_base is not None:
+            self.backoff_base = backoff_base
+
+    def backoff_delay(self, attempt, retry_after=None):
+        # Respect Retry-After when EIA rate limits us, otherwise exponential backoff with full
+        # jitter
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def record(self, endpoint, latency, retries, error):
+        EIA_REQUEST_SECONDS.observe(latency, endpoint)
+        if retries:
+            EIA_RETRIES.inc(endpoint, amount=retries)
+        if error:
+            EIA_ERRORS.inc(endpoint)
+        with self._lock:
+            stats = self._endpoint_stats.setdefault(
+                endpoint,
+                {
+                    "requests": 0, "errors": 0, "retries": 0,
+                    "latency_total": 0.0, "latency_max": 0.0,
+                },
+            )
+            stats["requests"] += 1
+            stats["errors"] += int(error)
+            stats["retries"] += retries
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+
+    def get(self, url, endpoint=None, **kwargs):
+        """
+        GET url with retries, endpoint is the label used for the latency/retry counters
+        """
+        import requests
+
+        endpoint = endpoint or url.split("?")[0]
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.get(url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    self.record(endpoint, time.perf_counter() - t0, attempt, not response.ok)
+                    return response
+                self.logger.warning(f"EIA {endpoint} returned {response.status_code}, retrying")
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt >= self.max_retries:
+                    self.record(endpoint, time.perf_counter() - t0, attempt, True)
+                    raise
+                # only the type: the error's message holds the URL, api_key and all
+                self.logger.warning(f"EIA {endpoint} failed with {type(error).__name__}, retrying")
+
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            time.sleep(self.backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: dict(
+                    stats,
+                    latency_mean=stats["latency_total"] / stats["requests"],
+                )
+                for endpoint, stats in self._endpoint_stats.items()
+            }
+
+
+EIA_SESSION = EIASession(
+    pool_size=int(os.environ.get("EIA_POOL_SIZE", 10)),
+    connect_timeout=float(os.environ.get("EIA_CONNECT_TIMEOUT", 5)),
+    read_timeout=float(os.environ.get("EIA_READ_TIMEOUT", 30)),
+    max_retries=int(os.environ.get("EIA_MAX_RETRIES", 3)),
+    backoff_base=float(os.environ.get("EIA_BACKOFF_BASE", 0.5)),
+)
@@ -0,0 +1,133 @@
+import contextlib
+import os
+import sqlite3
+import tempfile
+import threading
+
+# Every table of the shared state, created on first use
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS precomputed_stats (
+    ba_name TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    computed_at REAL NOT NULL,
+    tag TEXT,  -- conditional.data_tag of the data and baselines the response was computed from
+    fetched_at TEXT  -- when that data was fetched, ISO format
+);
+CREATE TABLE IF NOT EXISTS refresh_status (
+    ba_name TEXT PRIMARY KEY,
+    last_refreshed TEXT,
+    last_duration REAL,
+    last_error TEXT,
+    refreshes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS baseline_samples (
+    ba_name TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    hour INTEGER NOT NULL,  -- hours since the epoch
+    value REAL NOT NULL,
+    PRIMARY KEY (ba_name, metric, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS baseline_series (
+    ba_name TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    latest INTEGER NOT NULL,
+    version INTEGER NOT NULL,  -- bumped on every change, so processes know to reload their copy
+    PRIMARY KEY (ba_name, metric)
+);
+CREATE TABLE IF NOT EXISTS baseline_backfills (
+    ba_name TEXT PRIMARY KEY,
+    claimed_at REAL,
+    backfilled_at REAL,
+    horizon_days INTEGER
+);
+CREATE TABLE IF NOT EXISTS alert_rules (
+    rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    ba_name TEXT NOT NULL,
+    metric INTEGER NOT NULL,  -- position in rules.METRICS
+    above INTEGER NOT NULL,
+    threshold REAL NOT NULL,
+    relative INTEGER NOT NULL,
+    quiet_start INTEGER NOT NULL,
+    quiet_end INTEGER NOT NULL,
+    utc_offset REAL NOT NULL,
+    firing INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS alert_rules_ba_name ON alert_rules (ba_name);
+CREATE INDEX IF NOT EXISTS alert_rules_user_id ON alert_rules (user_id);
+CREATE TABLE IF NOT EXISTS alert_rule_versions (
+    ba_name TEXT PRIMARY KEY,
+    -- bumped whenever the rules of the BA or their firing state change
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    event TEXT NOT NULL  -- JSON
+);
+CREATE INDEX IF NOT EXISTS alert_events_user_id ON alert_events (user_id, event_id);
+CREATE TABLE IF NOT EXISTS alert_evaluations (
+    ba_name TEXT PRIMARY KEY,
+    -- conditional.data_tag of the stats the rules of the BA were last evaluated on
+    tag TEXT NOT NULL
+);
+"""
+
+
+class SharedState:
+    """
+    SQLite database holding the state that every worker process on the machine has to agree on and
+    that has to survive restarts. Each thread of each process gets its own connection, writers are
+    serialized by SQLite (WAL mode, so readers don't wait on them).
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self):
+        local = self._local
+        # a connection must not be used by a forked child, e.g. a gunicorn worker forked
+        # after --preload
+        if getattr(local, "connection", None) is None or local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            local.connection, local.pid = connection, os.getpid()
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(SCHEMA)
+                    self._schema_ready = True
+        return local.connection
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Connection inside a write transaction, taken up front so read-modify-write sequences
+        can't interleave with other processes
+        """
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def execute(self, sql, parameters=()):
+        return self.connection().execute(sql, parameters)
+
+
+# State shared by the workers of this machine: pre-computed stats, refresh status, baselines and
+# alert rules
+SHARED_STATE = SharedState(os.environ.get(
+    "SHARED_STATE_PATH",
+    os.path.join(tempfile.gettempdir(), "my_climate_dashboard", "state.sqlite3"),
+))
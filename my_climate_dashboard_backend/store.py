@@ -0,0 +1,191 @@
+import datetime
+import logging
+import os
+import re
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+except ImportError:  # the store is optional, install with pip install -e .[store]
+    pa = None
+    pc = None
+    feather = None
+
+LOCAL_LOGGER = logging.getLogger(__name__)
+PARTITION_COLUMNS = ["respondent", "toba", "fromba"]  # facets we can partition by
+# EIA keeps revising recent data, partitions written sooner than this after the day are refetched
+SETTLE_HOURS = 48
+
+
+class EIAStore:
+    """
+    Local columnar store of fetched EIA data, one uncompressed Feather file per endpoint, respondent
+    and day:
+
+        <root>/<endpoint>/<respondent>/<YYYY-MM-DD>.feather
+
+    A range query only opens the day partitions inside the range. They are read memory-mapped and
+    filtered to the range as Arrow tables, so the files themselves are shared through the OS page
+    cache and only the rows that are returned are converted into each worker's own DataFrame.
+
+    Every respondent and day of a download gets a partition, an empty one if EIA had no rows for it,
+    so such days settle like the others instead of being downloaded again on every query.
+    """
+
+    def __init__(self, root, settle_hours=SETTLE_HOURS, logger=LOCAL_LOGGER):
+        if feather is None:
+            raise ImportError("EIAStore needs pyarrow, install it with pip install -e .[store]")
+        self.root = root
+        self.settle_hours = settle_hours
+        self.logger = logger
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def endpoint_key(url_segment, facets, frequency, partition_column):
+        """
+        Directory name for a query, the facets we don't partition by (e.g. type filters) are part
+        of it
+        """
+        extra_facets = ",".join(
+            f"{name}={'+'.join(sorted(values))}"
+            for name, values in sorted(facets.items())
+            if name != partition_column
+        )
+        name = "-".join(filter(None, [url_segment, frequency, extra_facets]))
+        return re.sub(r"[^A-Za-z0-9=+,_-]", "_", name)
+
+    def _partition_path(self, endpoint, respondent, day):
+        return os.path.join(self.root, endpoint, respondent, f"{day.isoformat()}.feather")
+
+    def is_settled(self, endpoint, respondent, day):
+        """
+        True if the partition exists and was written long enough after the day for EIA to have
+        finished it
+        """
+        path = self._partition_path(endpoint, respondent, day)
+        if not os.path.exists(path):
+            return False
+        written = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+        day_end = datetime.datetime.combine(day, datetime.time()) + datetime.timedelta(days=1)
+        return written > day_end + datetime.timedelta(hours=self.settle_hours)
+
+    def read(self, endpoint, respondents, start_day, end_day, start=None):
+        """
+        Rows for respondents from start_day to end_day (inclusive), only opening those partitions,
+        and only those from the start timestamp on if given
+        """
+        tables = []
+        for respondent in respondents:
+            for day in pd.date_range(start_day, end_day).date:
+                path = self._partition_path(endpoint, respondent, day)
+                if os.path.exists(path):
+                    tables.append(feather.read_table(path, memory_map=True))
+        if not tables:
+            return pd.DataFrame()
+        # empty partitions only add their columns, which may be typed differently
+        tables = [table for table in tables if table.num_rows] or tables[:1]
+        table = pa.concat_tables(tables, promote_options="permissive")
+        if start is not None and table.num_rows:
+            timestamps = table["timestamp"]
+            start_scalar = pa.scalar(start.to_pydatetime(), timestamps.type)
+            table = table.filter(pc.greater_equal(timestamps, start_scalar))
+        return table.to_pandas()
+
+    def write(self, endpoint, dataframe, partition_column, respondents=(), days=()):
+        """
+        Append fetched rows, replacing stored rows for the same periods. The fetch covered
+        respondents x days: those it had no rows for get an empty partition, or keep theirs but are
+        marked as written now.
+        """
+        # categories differ between partitions, store the labels as plain strings
+        dataframe = dataframe.astype(
+            {column: object for column in dataframe.select_dtypes("category")}
+        )
+        if dataframe.empty:
+            partitions = []
+        else:
+            period_days = dataframe["period"].astype(str).str[:10]
+            partitions = dataframe.groupby([dataframe[partition_column].astype(str), period_days])
+        written = set()
+        for (respondent, day), partition in partitions:
+            day = datetime.date.fromisoformat(day)
+            written.add((respondent, day))
+            path = self._partition_path(endpoint, respondent, day)
+            if os.path.exists(path):
+                stored = feather.read_table(path).to_pandas()
+                stored = stored[~stored["period"].isin(partition["period"])]
+                partition = pd.concat([partition, stored], ignore_index=True)
+
+            # write to a temporary file and rename, so readers in other processes never see a
+            # partial file
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            feather.write_feather(
+                partition.reset_index(drop=True), tmp_path, compression="uncompressed"
+            )
+            os.replace(tmp_path, path)
+
+        for respondent in respondents:
+            for day in days:
+                if (respondent, day) in written:
+                    continue
+                path = self._partition_path(endpoint, respondent, day)
+                if os.path.exists(path):
+                    os.utime(path)
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                feather.write_feather(dataframe.iloc[:0], tmp_path, compression="uncompressed")
+                os.replace(tmp_path, path)
+
+    def read_through(self, url_segment, facets, frequency, start_date, end_date, download):
+        """
+        Serve settled days from the store and download(start_date) the rest from EIA, storing what
+        was downloaded
+        """
+        partition_column = next((column for column in PARTITION_COLUMNS if column in facets), None)
+        if partition_column is None or frequency not in ("hourly", "daily"):
+            return download(start_date)
+
+        endpoint = self.endpoint_key(url_segment, facets, frequency, partition_column)
+        respondents = facets[partition_column]
+        start = pd.Timestamp(start_date)
+        days = pd.date_range(start.normalize(), pd.Timestamp(end_date).normalize()).date
+
+        # the first day that isn't settled for every respondent, everything from there on comes
+        # from EIA
+        first_unsettled = next(
+            (
+                day for day in days
+                if not all(self.is_settled(endpoint, respondent, day) for respondent in respondents)
+            ),
+            None,
+        )
+        if first_unsettled is None:
+            return self._sorted(self.read(endpoint, respondents, days[0], days[-1], start))
+
+        download_start = start_date if first_unsettled == days[0] else first_unsettled.isoformat()
+        downloaded = download(download_start)
+        if downloaded is None:
+            return None
+        # like partitions with rows, those without are settled by what was downloaded of their day
+        covered = [day for day in days if day >= first_unsettled]
+        self.write(endpoint, downloaded, partition_column, respondents, covered)
+        if first_unsettled == days[0]:
+            return downloaded
+
+        last_settled = first_unsettled - datetime.timedelta(days=1)
+        stored = self.read(endpoint, respondents, days[0], last_settled, start)
+        self.logger.info(
+            f"{endpoint}: {len(stored)} rows from the store, {len(downloaded)} from EIA"
+        )
+        return self._sorted(pd.concat([downloaded, stored], ignore_index=True))
+
+    @staticmethod
+    def _sorted(dataframe):
+        # same order as the EIA response
+        return dataframe.sort_values("period", ascending=False, kind="stable", ignore_index=True)
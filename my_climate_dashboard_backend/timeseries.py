@@ -0,0 +1,265 @@
+import functools
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+PERIOD_FORMATS = {"hourly": "%Y-%m-%dT%H", "daily": "%Y-%m-%d", "monthly": "%Y-%m"}
+
+
+def epoch_hours(timestamps):
+    """
+    Hours since the epoch of datetime-like values, as int64
+    """
+    return np.asarray(timestamps, dtype="datetime64[ns]").astype("datetime64[h]").astype(np.int64)
+
+
+class CompactTimeseries:
+    """
+    One BA's EIA timeseries as a dense matrix of series (fuel types, or D/DF/NG/TI) x hours, NaN
+    where EIA sent nothing, on an ascending int64 axis of hours since the epoch. The rows EIA sent
+    without a value are NaN too, and flagged in a mask of the same shape. Label columns,
+    which are the same on every row of a series (type-name, respondent, value-units...), are kept
+    once per series instead of once per row.
+
+    Shared between requests through the data cache, so treat it as read only.
+    """
+
+    def __init__(
+            self,
+            hours,
+            values,
+            series_column,
+            labels,
+            columns,
+            frequency="hourly",
+            value_column="Generation (MWh)",
+            nulls=None,
+    ):
+        self.hours = hours  # int64 hours since the epoch, ascending
+        self.values = values  # series x hours
+        # series x hours, True where EIA sent a row with a null value, None if it sent none
+        self.nulls = nulls
+        # label column that tells the series apart, e.g. "fueltype"
+        self.series_column = series_column
+        self.labels = labels  # {label column: array with one value per series}
+        self.columns = columns  # column order of the long format frame
+        self.frequency = frequency
+        self.value_column = value_column
+
+    @classmethod
+    def from_frame(
+            cls,
+            frame,
+            series_column,
+            frequency="hourly",
+            value_column="Generation (MWh)",
+            dtype=np.float64,
+    ):
+        """
+        Convert a long format frame as returned by the get_eia_* helpers, series are kept in order
+        of first appearance. Of several rows of the same series and hour, the first one with a value
+        wins, since EIA sends the newest revision first.
+        """
+        label_columns = [
+            column for column in frame.columns
+            if column not in ("period", "timestamp", value_column)
+        ]
+        if frame.empty or series_column not in frame.columns:
+            # EIA had no rows, so the frame may not even have the label columns
+            labels = {
+                column: np.empty(0, dtype=object)
+                for column in dict.fromkeys(label_columns + [series_column])
+            }
+            columns = list(dict.fromkeys(list(frame.columns) + [series_column]))
+            return cls(
+                np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=dtype), series_column, labels,
+                columns, frequency, value_column,
+            )
+
+        codes, _ = pd.factorize(frame[series_column])
+        hours, hour_codes = np.unique(epoch_hours(frame["timestamp"]), return_inverse=True)
+        row_values = frame[value_column].to_numpy(dtype=np.float64)
+        is_null = np.isnan(row_values)
+        # rows with a value ahead of null ones, each in frame order, then the first row of each cell
+        order = np.argsort(is_null, kind="stable")
+        cells = codes[order] * len(hours) + hour_codes[order]
+        _, first = np.unique(cells, return_index=True)
+        kept = order[first]
+
+        values = np.full((codes.max() + 1, len(hours)), np.nan, dtype=dtype)
+        values[codes[kept], hour_codes[kept]] = row_values[kept]
+        nulls = None
+        if is_null[kept].any():
+            nulls = np.zeros(values.shape, dtype=bool)
+            nulls[codes[kept], hour_codes[kept]] = is_null[kept]
+
+        _, first_rows = np.unique(codes, return_index=True)
+        labels = {
+            column: np.asarray(frame[column].to_numpy(), dtype=object)[first_rows]
+            for column in label_columns
+        }
+        return cls(
+            hours, values, series_column, labels, list(frame.columns), frequency, value_column,
+            nulls,
+        )
+
+    def __len__(self):
+        """
+        Number of rows of the long format frame, null valued ones included
+        """
+        return int(np.count_nonzero(self.present()))
+
+    @property
+    def nbytes(self):
+        labels_nbytes = sum(labels.nbytes for labels in self.labels.values())
+        nulls_nbytes = 0 if self.nulls is None else self.nulls.nbytes
+        return self.hours.nbytes + self.values.nbytes + labels_nbytes + nulls_nbytes
+
+    @property
+    def series(self):
+        return self.labels[self.series_column]
+
+    @functools.cached_property
+    def fingerprint(self):
+        """
+        Short digest of the hours, series and values, changes whenever the data does
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(self.hours.tobytes())
+        digest.update(repr(list(self.series)).encode())
+        digest.update(np.ascontiguousarray(self.values).tobytes())
+        if self.nulls is not None:
+            digest.update(np.packbits(self.nulls).tobytes())
+        return digest.hexdigest()
+
+    def present(self):
+        """
+        series x hours, True where EIA sent a row, with or without a value
+        """
+        present = ~np.isnan(self.values)
+        return present if self.nulls is None else present | self.nulls
+
+    def timestamps(self, hours=None):
+        return pd.to_datetime(self.hours if hours is None else hours, unit="h")
+
+    def periods(self, hours=None):
+        return self.timestamps(hours).strftime(PERIOD_FORMATS.get(self.frequency, "%Y-%m-%d"))
+
+    def rows_of(self, series_values):
+        """
+        Row positions of the series whose series_column value is in series_values, in series order
+        """
+        return np.flatnonzero(np.isin(self.series, list(series_values)))
+
+    def latest_hour(self):
+        """
+        Position on the hour axis of the newest hour with any value, None if there are no values
+        """
+        has_values = np.flatnonzero((~np.isnan(self.values)).any(axis=0))
+        return has_values[-1] if len(has_values) else None
+
+    def latest(self):
+        position = self.latest_hour()
+        return None if position is None else self.timestamps(self.hours[position:position + 1])[0]
+
+    def row(self, series_value):
+        """
+        Values of one series along the hour axis, all NaN if there is no such series
+        """
+        rows = self.rows_of([series_value])
+        if not len(rows):
+            return np.full(len(self.hours), np.nan, dtype=self.values.dtype)
+        return self.values[rows[0]]
+
+    def label(self, series_value, column):
+        """
+        Label column of one series, None if there is no such series
+        """
+        rows = self.rows_of([series_value])
+        return self.labels[column][rows[0]] if len(rows) and column in self.labels else None
+
+    def series_values(self, series_value):
+        """
+        (hour positions newest first, values) of one series, empty if there is no such series
+        """
+        row = self.row(series_value)
+        positions = np.flatnonzero(~np.isnan(row))[::-1]
+        return positions, row[positions]
+
+    def delta_start(self, overlap_hours):
+        """
+        Period an incremental refresh should start from: series are published at different times
+        (e.g. demand lags the forecast), so everything before the oldest "newest hour" across series
+        is settled. Refetch from there, with some overlap for revisions.
+        """
+        present = ~np.isnan(self.values)
+        newest = [self.hours[np.flatnonzero(row)[-1]] for row in present if row.any()]
+        return self.periods(np.array([min(newest) - overlap_hours]))[0]
+
+    def since(self, timestamp):
+        """
+        The hours from timestamp onwards
+        """
+        keep = self.hours >= epoch_hours([timestamp])[0]
+        return CompactTimeseries(
+            self.hours[keep], self.values[:, keep], self.series_column, self.labels, self.columns,
+            self.frequency, self.value_column, None if self.nulls is None else self.nulls[:, keep],
+        )
+
+    @classmethod
+    def merge(cls, previous, delta, since, window_start):
+        """
+        Replace the hours of previous from since onwards with a freshly fetched delta and trim to
+        window_start
+        """
+        since_hour, start_hour = epoch_hours([since, window_start])
+        kept = (previous.hours < since_hour) & (previous.hours >= start_hour)
+        hours = np.union1d(previous.hours[kept], delta.hours)
+
+        # the delta's series first, like concatenating the newest rows in front of the older ones
+        delta_series = set(delta.series)
+        series = list(delta.series) + [
+            value for value in previous.series if value not in delta_series
+        ]
+        values = np.full(
+            (len(series), len(hours)), np.nan,
+            dtype=np.result_type(previous.values, delta.values),
+        )
+        labels = {column: np.empty(len(series), dtype=object) for column in previous.labels}
+        nulls = None
+        if previous.nulls is not None or delta.nulls is not None:
+            nulls = np.zeros(values.shape, dtype=bool)
+        for source, hour_mask in [(previous, kept), (delta, slice(None))]:
+            rows = [series.index(value) for value in source.series]
+            hour_columns = np.searchsorted(hours, source.hours[hour_mask])
+            values[np.ix_(rows, hour_columns)] = source.values[:, hour_mask]
+            if nulls is not None:
+                nulls[np.ix_(rows, hour_columns)] = (
+                    False if source.nulls is None else source.nulls[:, hour_mask]
+                )
+        for source in [previous, delta]:  # labels of the delta win
+            rows = [series.index(value) for value in source.series]
+            for column, column_labels in source.labels.items():
+                labels.setdefault(column, np.empty(len(series), dtype=object))[rows] = column_labels
+        return cls(
+            hours, values, previous.series_column, labels, previous.columns, previous.frequency,
+            previous.value_column, nulls,
+        )
+
+    def to_frame(self):
+        """
+        The long format frame, newest period first, with a row per value and per row EIA sent
+        without one (NaN)
+        """
+        hour_positions, rows = np.nonzero(self.present()[:, ::-1].T)
+        hour_positions = len(self.hours) - 1 - hour_positions
+        data = {
+            "period": np.asarray(self.periods(), dtype=object)[hour_positions],
+            "timestamp": self.timestamps(self.hours[hour_positions]),
+            self.value_column: self.values[rows, hour_positions].astype(float),
+        }
+        data.update({
+            column: pd.Categorical(labels[rows]) for column, labels in self.labels.items()
+        })
+        return pd.DataFrame(data, columns=[column for column in self.columns if column in data])
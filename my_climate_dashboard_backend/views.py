@@ -0,0 +1,270 @@
+"""
+Views of the app: the stats, batch and green windows resources, and the blueprint of the export and
+alert rule routes. They are registered by create_app, and find the stats precomputed by the
+prewarm job in current_app.extensions["precomputed_stats"].
+"""
+import itertools
+
+from flask import Blueprint, Response, current_app, request
+from flask_restful import Resource, reqparse
+
+# ba_stats (pandas, numpy), rules (numpy) and requests are imported by the views that use them,
+# so that gunicorn workers boot quickly, see benchmarks/startup_benchmark.py
+from .conditional import is_not_modified, make_validator, stats_validator, validator_headers
+from .export import (
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    end_on_eia_failure,
+    export_chunks,
+    parse_export_date,
+)
+from .metrics import STATS_RESPONSES
+
+URL_PREFIX = "/my-climate-dashboard"
+
+views = Blueprint("views", __name__, url_prefix=URL_PREFIX)
+
+
+def wire_format(response):
+    # ?format=compact puts every series on one shared timestamp axis, see compact_stats
+    if request.args.get("format") == "compact":
+        from .ba_stats import compact_stats
+
+        return compact_stats(response)
+    return response
+
+
+def not_modified(validator):
+    """
+    A 304 response if the If-None-Match or If-Modified-Since of the request matches validator,
+    else None
+    """
+    if_none_match, if_modified_since = (
+        request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since")
+    )
+    if is_not_modified(validator, if_none_match, if_modified_since):
+        STATS_RESPONSES.inc("304")
+        return Response(status=304, headers=validator_headers(validator))
+    return None
+
+
+def stats_response(ba_name, logger):
+    # The EIA data only changes hourly, so pollers that send back the ETag (or Last-Modified) of the
+    # data they have get a 304 straight from the cache metadata, without computing any stats.
+    # Validators always describe the data and baselines the response is (or would be) computed from.
+    from . import VERSION
+
+    wire_format_name = request.args.get("format")
+    precomputed = current_app.extensions["precomputed_stats"].lookup(ba_name)
+    if precomputed is not None:
+        validator = make_validator(
+            ba_name, VERSION, wire_format_name,
+            precomputed.tag, precomputed.fetched_at, precomputed.expires_in,
+        )
+        response = precomputed.response
+    else:
+        validator = stats_validator(ba_name, VERSION, wire_format_name)
+        response = None
+    not_modified_response = not_modified(validator)
+    if not_modified_response is not None:
+        return not_modified_response
+
+    if response is None:
+        from .ba_stats import BAStats
+
+        ba_stats = BAStats(ba_name, logger=logger)
+        response = ba_stats.return_stats()
+        validator = ba_stats.stats_validator(wire_format_name)
+        # a refresh that brought no new data still saves sending the body
+        not_modified_response = not_modified(validator)
+        if not_modified_response is not None:
+            return not_modified_response
+    STATS_RESPONSES.inc("200")
+    return wire_format(response), 200, validator_headers(validator)
+
+
+# raw EIA rows of a BA for any date range, streamed page by page as NDJSON or CSV, e.g.
+# /my-climate-dashboard/export?ba_name=PSEI&dataset=mix&start=2024-01-01&end=2024-06-30&format=csv
+@views.route('/export')
+def export():
+    ba_name = request.args.get("ba_name")
+    dataset = request.args.get("dataset", "mix")
+    export_format = request.args.get("format", "ndjson")
+    start, end = request.args.get("start"), request.args.get("end")
+    errors = {}
+    if not ba_name:
+        errors["ba_name"] = "No ba_name provided"
+    if dataset not in EXPORT_DATASETS:
+        errors["dataset"] = f"dataset must be one of {sorted(EXPORT_DATASETS)}"
+    if export_format not in EXPORT_FORMATS:
+        errors["format"] = f"format must be one of {sorted(EXPORT_FORMATS)}"
+    dates = {}
+    for name, value in [("start", start), ("end", end)]:
+        try:
+            dates[name] = parse_export_date(value)
+        except ValueError:
+            errors[name] = f"{name} must be an ISO date"
+    # compared once parsed, e.g. 20240102 is after 2024-01-01
+    if not errors.keys() & {"start", "end"} and dates["start"] > dates["end"]:
+        errors["end"] = "end must not be before start"
+    if errors:
+        return {"message": errors}, 400
+
+    import requests
+
+    start, end = dates["start"], dates["end"]
+    chunks = export_chunks(ba_name, dataset, start, end, export_format)
+    try:
+        # fetch the first page before answering, so a failing EIA gives an error status instead of
+        # an empty file. A range EIA has no rows for is an empty file.
+        first_chunk = next(chunks, b"")
+    except (RuntimeError, requests.RequestException):
+        return {"message": "EIA request failed"}, 502
+    chunks = end_on_eia_failure(chunks, export_format, current_app.logger)
+    filename = f"{ba_name.upper()}-{dataset}-{start}-{end}.{export_format}"
+    return Response(
+        itertools.chain([first_chunk], chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# per user alert rules, evaluated by the prewarm job whenever their BA has new data:
+# POST {"rules": [...]} adds rules, GET ?user_id= lists them,
+# DELETE ?user_id=&rule_ids=1,2 removes them
+@views.route('/alert-rules', methods=["GET", "POST", "DELETE"])
+def alert_rules():
+    from .rules import RULES
+
+    if request.method == "POST":
+        rules = (request.get_json(silent=True) or {}).get("rules")
+        if not isinstance(rules, list) or not rules:
+            return {"message": {"rules": "No rules provided"}}, 400
+        try:
+            return {"rule_ids": RULES.add_rules(rules)}, 201
+        except ValueError as error:
+            return {"message": {"rules": str(error)}}, 400
+
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return {"message": {"user_id": "No user_id provided"}}, 400
+    if request.method == "GET":
+        return {"rules": RULES.rules_of(user_id)}
+    try:
+        rule_ids = [
+            int(rule_id) for rule_id in request.args.get("rule_ids", "").split(",") if rule_id
+        ]
+    except ValueError:
+        return {"message": {"rule_ids": "rule_ids must be comma separated integers"}}, 400
+    return {"removed": RULES.remove_rules(rule_ids, user_id=user_id)}
+
+
+# alerts of a user's rules that started or stopped firing, newer than the event id ?since=
+@views.route('/alert-events')
+def alert_events():
+    from .rules import RULES
+
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return {"message": {"user_id": "No user_id provided"}}, 400
+    return {"events": RULES.events_of(user_id, request.args.get("since", 0, type=int))}
+
+
+# Post (or get with ?ba_name=) for climate stats
+class ClimateStats(Resource):
+    def __init__(self, logger=None):
+        self._required_features = ["ba_name"]
+        self.inputs = reqparse.RequestParser()
+        self.logger = logger or current_app.logger
+
+        for feature in self._required_features:
+            self.inputs.add_argument(
+                feature,
+                type=str,
+                required=True,
+                location="json",
+                help="No {} provided".format(feature),
+            )
+        super(ClimateStats, self).__init__()
+
+    def get(self):
+        ba_name = request.args.get("ba_name")
+        if not ba_name:
+            return {"message": {"ba_name": "No ba_name provided"}}, 400
+        return stats_response(ba_name, self.logger)
+
+    def post(self):
+        args = self.inputs.parse_args()
+        return stats_response(args["ba_name"], self.logger)
+
+
+# Post for climate stats of several BAs at once
+class ClimateStatsBatch(Resource):
+    def __init__(self, logger=None):
+        self.inputs = reqparse.RequestParser()
+        self.logger = logger or current_app.logger
+        self.inputs.add_argument(
+            "ba_names",
+            type=str,
+            action="append",
+            required=True,
+            location="json",
+            help="No ba_names provided",
+        )
+        super(ClimateStatsBatch, self).__init__()
+
+    def post(self):
+        args = self.inputs.parse_args()
+        precomputed_stats = current_app.extensions["precomputed_stats"]
+        results = {}
+        for ba_name in args["ba_names"]:
+            response = precomputed_stats.get(ba_name)
+            if response is not None:
+                results[ba_name.upper()] = response
+        from .ba_stats import get_batch_stats
+
+        remaining = [ba_name for ba_name in args["ba_names"] if ba_name.upper() not in results]
+        computed, errors = get_batch_stats(remaining, logger=self.logger)
+        results.update(computed)
+        results = {ba_name: wire_format(response) for ba_name, response in results.items()}
+        return {"results": results, "errors": errors}
+
+
+# Post for the best upcoming windows to run a load of each duration in, for one or more BAs
+class GreenWindows(Resource):
+    def __init__(self, logger=None):
+        self.inputs = reqparse.RequestParser()
+        self.logger = logger or current_app.logger
+        self.inputs.add_argument(
+            "ba_names",
+            type=str,
+            action="append",
+            required=True,
+            location="json",
+            help="No ba_names provided",
+        )
+        self.inputs.add_argument(
+            "durations", type=int, action="append", location="json", default=[1]
+        )
+        self.inputs.add_argument("horizon_hours", type=int, location="json", default=24)
+        super(GreenWindows, self).__init__()
+
+    def post(self):
+        args = self.inputs.parse_args()
+        if not 1 <= args["horizon_hours"] <= 72:
+            return {"message": {"horizon_hours": "horizon_hours must be between 1 and 72"}}, 400
+        if not all(1 <= duration <= args["horizon_hours"] for duration in args["durations"]):
+            return {"message": {"durations": "durations must be between 1 and horizon_hours"}}, 400
+        from .planner import plan_green_windows
+
+        plans, errors = plan_green_windows(
+            args["ba_names"], args["durations"], args["horizon_hours"], logger=self.logger
+        )
+        return {"results": plans, "errors": errors}
+
+
+RESOURCES = [
+    (ClimateStats, f"{URL_PREFIX}/green-energy-stats"),
+    (ClimateStatsBatch, f"{URL_PREFIX}/green-energy-stats/batch"),
+    (GreenWindows, f"{URL_PREFIX}/green-windows"),
+]
@@ -14,26 +14,38 @@ setup(
         "flask-restful",
         "gunicorn",
         "pandas",
-        "matplotlib",
         "requests",
     ],
     extras_require={
-            "dev": [
-                "black",  # lint & formatting helper
-                "flake8",  # lint & formatting helper
-                "isort",  # lint & formatting helper
-                "sphinx",  # documentation
-                "sphinx-autoapi",  # documentation
-                "sphinx-mdinclude",  # documentation
-                "sphinx-rtd-theme",  # read-the-docs theme
-                "docstr-coverage",  # doc string coverage
-                "wily",
-                "coverage",
-                "coverage-badge",
-                "docstr-coverage",
-                "pybadges",
-                "pylint",
-                "pytest",
+        "async": [
+            "aiohttp",  # asyncio EIA client and stats endpoint
+        ],
+        "store": [
+            "pyarrow",  # local columnar store of fetched EIA data
+        ],
+        "plot": [
+            "matplotlib",  # plots of a BA's data, my_climate_dashboard_backend plot
+        ],
+        "speedups": [
+            "orjson",  # faster JSON encoding of the stats responses
+            "brotli",  # br content encoding
+        ],
+        "dev": [
+            "black",  # lint & formatting helper
+            "flake8",  # lint & formatting helper
+            "isort",  # lint & formatting helper
+            "sphinx",  # documentation
+            "sphinx-autoapi",  # documentation
+            "sphinx-mdinclude",  # documentation
+            "sphinx-rtd-theme",  # read-the-docs theme
+            "docstr-coverage",  # doc string coverage
+            "wily",
+            "coverage",
+            "coverage-badge",
+            "docstr-coverage",
+            "pybadges",
+            "pylint",
+            "pytest",
         ],
     },
     entry_points={
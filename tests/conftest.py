@@ -0,0 +1,100 @@
+import datetime
+import os
+import tempfile
+
+import pytest
+
+# the shared state is opened when the package is imported, keep it out of the real one
+os.environ.setdefault(
+    "SHARED_STATE_PATH", os.path.join(tempfile.mkdtemp(), "state.sqlite3")
+)
+
+from benchmarks.eia_fixture_server import start_fixture_server  # noqa: E402
+from my_climate_dashboard_backend import ba_stats  # noqa: E402
+
+FUEL_TYPES = {"COL": "Coal", "NG": "Natural gas", "SUN": "Solar", "WND": "Wind"}
+REGION_TYPES = {"D": "Demand", "DF": "Day-ahead demand forecast"}
+UNKNOWN_BA = "XXXX"
+
+
+def eia_value(code, timestamp):
+    """
+    Deterministic value of a series at an hour, with a daily cycle
+    """
+    return 1000 + 100 * len(code) + 40 * (timestamp.hour % 12) + timestamp.day
+
+
+class FakeEIA:
+    """
+    EIA pages served from memory: every respondent has hours hours of hourly data from the start
+    of each query, for the fuel types of FUEL_TYPES and the demand types of REGION_TYPES, except
+    UNKNOWN_BA which has none. Queries are recorded in queries as (url segment, params).
+    """
+
+    def __init__(self, hours=48):
+        self.hours = hours
+        self.queries = []
+
+    def get_page(self, api_url, params, offset, endpoint=None):
+        self.queries.append((endpoint, params))
+        start = datetime.datetime.fromisoformat(params["start"][:10])
+        if len(params["start"]) > 10:
+            start = start.replace(hour=int(params["start"][11:13]))
+        series, code_column = (
+            (FUEL_TYPES, "fueltype") if "fuel-type" in (endpoint or api_url)
+            else (REGION_TYPES, "type")
+        )
+        rows = [
+            {
+                "period": timestamp.strftime("%Y-%m-%dT%H"),
+                "respondent": respondent,
+                "respondent-name": f"{respondent} name",
+                code_column: code,
+                "type-name": name,
+                "value": str(eia_value(code, timestamp)),
+                "value-units": "megawatthours",
+            }
+            for hour in reversed(range(self.hours))
+            for timestamp in [start + datetime.timedelta(hours=hour)]
+            for respondent in params["facets"].get("respondent", [])
+            if respondent != UNKNOWN_BA
+            for code, name in series.items()
+        ]
+        page = rows[offset:offset + ba_stats.EIA_PAGE_LENGTH]
+        return {"total": len(rows), "data": page}
+
+    async def get_page_async(self, api_url, params, offset, endpoint=None):
+        return self.get_page(api_url, params, offset, endpoint)
+
+
+@pytest.fixture
+def fake_eia(monkeypatch):
+    """
+    FakeEIA answering every EIA request, with an empty data cache
+    """
+    fake = FakeEIA()
+    monkeypatch.setattr(ba_stats, "_get_eia_page", fake.get_page)
+    ba_stats.DATA_CACHE.invalidate()
+    yield fake
+    ba_stats.DATA_CACHE.invalidate()
+
+
+@pytest.fixture(scope="session")
+def eia_url():
+    """
+    Base URL of a local EIA fixture server, on which UNKNOWN_BA has no rows
+    """
+    server, url = start_fixture_server(unknown_bas=[UNKNOWN_BA])
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def eia(eia_url, monkeypatch):
+    """
+    The EIA fixture server answering every EIA request, with an empty data cache
+    """
+    monkeypatch.setattr(ba_stats, "EIA_API_BASE_URL", eia_url)
+    ba_stats.DATA_CACHE.invalidate()
+    yield eia_url
+    ba_stats.DATA_CACHE.invalidate()
@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+import pytest
+
+from my_climate_dashboard_backend.alerts import AlertBroker, AlertPublisher, alert_state
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from my_climate_dashboard_backend import alerts  # noqa: E402
+from my_climate_dashboard_backend.async_app import create_async_app  # noqa: E402
+from my_climate_dashboard_backend.async_client import AsyncEIAClient  # noqa: E402
+
+
+def stats(ba_name="PSEI", green_ratio=0.5):
+    return {
+        "ba_name": ba_name,
+        "green_ratio_current": green_ratio,
+        "green_alert_text": "",
+        "source_ratio_current": {"timestamp": "2024-01-01 00:00:00"},
+        "sw_version": "0.0.0",
+    }
+
+
+def event_data(payload):
+    lines = payload.decode().splitlines()
+    assert lines[1] == "event: alert"
+    return int(lines[0].removeprefix("id: ")), json.loads(lines[2].removeprefix("data: "))
+
+
+def test_alert_state_keeps_only_the_alert_fields():
+    state = alert_state(stats())
+    assert state["ba_name"] == "PSEI" and state["green_ratio_current"] == 0.5
+    assert state["timestamp"] == "2024-01-01 00:00:00"
+    assert "sw_version" not in state
+
+
+def test_broker_sends_changes_only():
+    async def run():
+        broker = AlertBroker()
+        subscriber = broker.subscribe("psei")
+        assert broker.publish(stats())
+        assert not broker.publish(stats())  # same state
+        assert broker.publish(stats("CISO"))  # other BAs have their own state
+        assert broker.publish(stats(green_ratio=0.6))
+
+        first, second = await subscriber.next(0.1), await subscriber.next(0.1)
+        assert event_data(first)[1]["green_ratio_current"] == 0.5
+        assert event_data(second)[1]["green_ratio_current"] == 0.6
+        assert await subscriber.next(0.01) is None
+        assert broker.subscriber_counts() == {"PSEI": 1}
+
+    asyncio.run(run())
+
+
+def test_new_subscribers_get_the_current_state_unless_they_have_it():
+    async def run():
+        broker = AlertBroker()
+        broker.subscribe("PSEI")
+        broker.publish(stats())
+        event_id, _ = event_data(await broker.subscribe("PSEI").next(0.1))
+        assert await broker.subscribe("psei", str(event_id)).next(0.01) is None
+
+    asyncio.run(run())
+
+
+def test_slow_subscribers_lose_the_oldest_events():
+    async def run():
+        broker = AlertBroker(max_pending=2)
+        subscriber = broker.subscribe("PSEI")
+        for green_ratio in [0.1, 0.2, 0.3]:
+            broker.publish(stats(green_ratio=green_ratio))
+        received = [event_data(await subscriber.next(0.1))[1] for _ in range(2)]
+        assert [state["green_ratio_current"] for state in received] == [0.2, 0.3]
+
+    asyncio.run(run())
+
+
+def test_state_is_dropped_with_the_last_subscriber():
+    async def run():
+        broker = AlertBroker()
+        subscriber = broker.subscribe("PSEI")
+        broker.publish(stats())
+        broker.unsubscribe(subscriber)
+        assert broker.ba_names() == [] and not broker.has_state("PSEI")
+
+    asyncio.run(run())
+
+
+def test_publisher_shares_one_computation_per_ba():
+    calls = []
+
+    async def compute(ba_name, refresh):
+        calls.append((ba_name, refresh))
+        await asyncio.sleep(0.01)
+        return stats(ba_name)
+
+    async def run():
+        broker = AlertBroker()
+        subscriber = broker.subscribe("PSEI")
+        publisher = AlertPublisher(broker, compute)
+        publisher.ensure_state("psei")
+        publisher.ensure_state("PSEI")
+        await asyncio.gather(publisher.refresh("PSEI"), publisher.refresh_all())
+        assert calls == [("PSEI", False)]
+        assert event_data(await subscriber.next(0.1))[1]["ba_name"] == "PSEI"
+        # once published, a new subscriber doesn't cause a computation
+        publisher.ensure_state("PSEI")
+        await publisher.refresh_all()
+        assert calls == [("PSEI", False), ("PSEI", True)]
+
+    asyncio.run(run())
+
+
+def test_alert_stream(fake_eia, monkeypatch):
+    async def get_page(client, *args, **kwargs):
+        return await fake_eia.get_page_async(*args, **kwargs)
+
+    monkeypatch.setattr(AsyncEIAClient, "_get_eia_page", get_page)
+    monkeypatch.setattr(alerts, "ALERT_BROKER", AlertBroker())
+    monkeypatch.setattr("my_climate_dashboard_backend.async_app.ALERT_BROKER", alerts.ALERT_BROKER)
+
+    async def stream():
+        async with TestClient(TestServer(create_async_app())) as client:
+            assert (await client.get("/my-climate-dashboard/alerts")).status == 400
+            response = await client.get("/my-climate-dashboard/alerts?ba_name=psei")
+            assert response.headers["Content-Type"] == "text/event-stream"
+            assert await response.content.readuntil(b"\n\n") == b"retry: 10000\n\n"
+            event = await asyncio.wait_for(response.content.readuntil(b"\n\n"), 5)
+            response.close()
+            return event
+
+    event_id, state = event_data(asyncio.run(stream()))
+    assert state["ba_name"] == "PSEI"
+    assert alerts.ALERT_BROKER.ba_names() == []
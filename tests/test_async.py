@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from my_climate_dashboard_backend import ba_stats
+from my_climate_dashboard_backend.ba_stats import BAStats
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from my_climate_dashboard_backend import async_client  # noqa: E402
+from my_climate_dashboard_backend.async_app import create_async_app  # noqa: E402
+from my_climate_dashboard_backend.async_client import AsyncEIAClient  # noqa: E402
+
+
+@pytest.fixture
+def fake_async_eia(fake_eia, monkeypatch):
+    async def get_page(client, *args, **kwargs):
+        return await fake_eia.get_page_async(*args, **kwargs)
+
+    monkeypatch.setattr(AsyncEIAClient, "_get_eia_page", get_page)
+    return fake_eia
+
+
+def without_created(response):
+    return {key: value for key, value in response.items() if key != "created"}
+
+
+def test_async_stats_match_the_sync_ones(fake_async_eia):
+    async def stats():
+        async with AsyncEIAClient() as client:
+            return await BAStats("psei").return_stats_async(client)
+
+    response = asyncio.run(stats())
+    assert [endpoint for endpoint, params in fake_async_eia.queries] == [
+        "fuel-type-data", "region-data",
+    ]
+    # the sync path is served from the cache the async one filled
+    assert without_created(BAStats("PSEI").return_stats()) == without_created(response)
+    assert len(fake_async_eia.queries) == 2
+
+
+def test_async_pages_are_all_fetched(fake_async_eia, monkeypatch):
+    monkeypatch.setattr(ba_stats, "EIA_PAGE_LENGTH", 50)
+    monkeypatch.setattr(async_client, "EIA_PAGE_LENGTH", 50)
+
+    async def mix():
+        async with AsyncEIAClient() as client:
+            return await client.get_eia_grid_mix_timeseries(
+                ["PSEI"], start_date="2024-01-01", end_date="2024-01-02"
+            )
+
+    data_mix = asyncio.run(mix())
+    assert len(data_mix) == 48 * 4
+    assert sorted(params["start"] for endpoint, params in fake_async_eia.queries) == [
+        "2024-01-01"
+    ] * 4
+    assert data_mix["Generation (MWh)"].dtype == float
+
+
+def test_async_endpoint(fake_async_eia):
+    async def post(body):
+        async with TestClient(TestServer(create_async_app())) as client:
+            response = await client.post("/my-climate-dashboard/green-energy-stats", json=body)
+            return response.status, await response.json()
+
+    status, response = asyncio.run(post({"ba_name": "psei"}))
+    assert status == 200 and response["ba_name"] == "PSEI"
+    status, response = asyncio.run(post({}))
+    assert status == 400
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from benchmarks.attribution_benchmark import (
+    legacy_consumed_locally_by_source_ba,
+    legacy_usage_by_ba_and_generation_type,
+    sorted_usage,
+    synthetic_frames,
+)
+from my_climate_dashboard_backend.ba_stats import (
+    consumed_locally_by_source_ba,
+    usage_by_ba_and_generation_type,
+)
+
+
+def test_vectorized_attribution_matches_the_original():
+    interchange_df, demand_df, mix_df = synthetic_frames("PSEI", ["BPAT", "SCL", "TPWR"], days=20)
+
+    legacy_consumed = legacy_consumed_locally_by_source_ba("PSEI", interchange_df, demand_df)
+    consumed = consumed_locally_by_source_ba("PSEI", interchange_df, demand_df)
+    pd.testing.assert_frame_equal(
+        legacy_consumed.astype({"fromba": str}), consumed.astype({"fromba": str}), check_dtype=False
+    )
+
+    pd.testing.assert_frame_equal(
+        sorted_usage(legacy_usage_by_ba_and_generation_type(legacy_consumed, mix_df)),
+        sorted_usage(usage_by_ba_and_generation_type(consumed, mix_df)),
+        check_dtype=False,
+    )
+
+
+def test_imports_are_clipped_to_local_demand():
+    interchange_df, demand_df, mix_df = synthetic_frames("PSEI", ["BPAT"], days=5)
+    # exports (negative interchange) are not consumed locally
+    interchange_df["Interchange to local BA (MWh)"] = -1.0
+    consumed = consumed_locally_by_source_ba("PSEI", interchange_df, demand_df)
+    assert (consumed.loc[consumed["fromba"] == "BPAT", "Power consumed locally (MWh)"] == 0).all()
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from my_climate_dashboard_backend.ba_stats import BAStats
+from my_climate_dashboard_backend.baselines import (
+    BaselineIndex,
+    HOURS_PER_WEEK,
+    RollingBaseline,
+    week_hour,
+)
+from my_climate_dashboard_backend.shared import SharedState
+
+
+def hourly(start, hours):
+    return pd.date_range(start, periods=hours, freq="h")
+
+
+def test_week_hour_starts_on_monday():
+    assert week_hour(pd.Timestamp("2024-01-01 00:00")) == 0  # a Monday
+    assert week_hour(pd.Timestamp("2024-01-02 05:00")) == 29
+    assert week_hour(pd.Timestamp("2024-01-07 23:00")) == HOURS_PER_WEEK - 1
+
+
+def test_buckets_hold_the_same_hour_of_each_week():
+    baseline = RollingBaseline(horizon_days=28)
+    timestamps = hourly("2024-01-01", 3 * HOURS_PER_WEEK)
+    values = np.arange(len(timestamps), dtype=float)
+    baseline.update(timestamps, values)
+
+    summary = baseline.lookup("2024-01-29 00:00")  # a Monday 00h, three weeks later
+    assert summary["samples"] == 3
+    assert summary["mean"] == pytest.approx(HOURS_PER_WEEK)
+    assert summary["p10"] == pytest.approx(np.percentile([0, 168, 336], 10))
+    assert summary["p50"] == pytest.approx(HOURS_PER_WEEK)
+    assert summary["p90"] == pytest.approx(np.percentile([0, 168, 336], 90))
+    assert baseline.latest == timestamps[-1]
+
+
+def test_missing_values_are_skipped():
+    baseline = RollingBaseline()
+    baseline.update(hourly("2024-01-01", 2), [np.nan, 5.0])
+    assert baseline.lookup("2024-01-01 00:00") is None
+    assert baseline.lookup("2024-01-01 01:00")["samples"] == 1
+
+
+def test_updates_only_take_new_and_revised_hours():
+    baseline = RollingBaseline()
+    baseline.update(hourly("2024-01-01", 10), np.ones(10))
+    # an older hour is ignored, the recent ones are revised
+    baseline.update(hourly("2024-01-01", 10), np.full(10, 3.0))
+    assert baseline.lookup("2024-01-01 00:00")["mean"] == 1.0
+    assert baseline.lookup("2024-01-01 09:00")["mean"] == 3.0
+    # unless it is a backfill
+    baseline.update(hourly("2024-01-01", 10), np.full(10, 3.0), backfill=True)
+    assert baseline.lookup("2024-01-01 00:00")["mean"] == 3.0
+
+
+def test_samples_older_than_the_horizon_are_dropped():
+    baseline = RollingBaseline(horizon_days=7)
+    baseline.update(hourly("2024-01-01", 1), [1.0])
+    baseline.update(hourly("2024-01-08", 1), [3.0])
+    baseline.update(hourly("2024-01-15", 1), [5.0])
+    summary = baseline.lookup("2024-01-15 00:00")
+    assert summary["samples"] == 1 and summary["mean"] == 5.0
+
+
+def test_index_needs_min_samples():
+    index = BaselineIndex(horizon_days=28, min_samples=2)
+    index.get("psei", "green").update(hourly("2024-01-01", 1), [0.5])
+    assert index.lookup("PSEI", "green", "2024-01-08 00:00") is None
+    index.get("PSEI", "green").update(hourly("2024-01-08", 1), [0.7])
+    assert index.lookup("psei", "green", "2024-01-15 00:00")["mean"] == pytest.approx(0.6)
+
+    baselines = index.to_dict("psei")
+    assert baselines["min_samples"] == 2
+    assert baselines["metrics"]["green"]["latest"] == "2024-01-08T00:00:00"
+    assert len(baselines["metrics"]["green"]["week_hours"]) == HOURS_PER_WEEK
+    assert index.to_dict("CISO")["metrics"] == {}
+
+
+def test_reconfiguring_the_horizon_starts_over():
+    index = BaselineIndex()
+    index.get("PSEI", "green").update(hourly("2024-01-01", 1), [0.5])
+    index.mark_backfilled("psei")
+    index.configure(horizon_days=7)
+    assert not index.is_backfilled("PSEI")
+    assert index.get("PSEI", "green").latest is None
+
+
+def refreshed(baselines):
+    """
+    BAStats of PSEI whose baselines were refreshed like the prewarm job does
+    """
+    ba_stats = BAStats("psei", baselines=baselines)
+    ba_stats.get_data_mix()
+    ba_stats.get_data_demand()
+    ba_stats.refresh_baselines()
+    return ba_stats
+
+
+def test_stats_use_the_baseline_once_it_has_enough_samples(fake_eia):
+    # two days of data hold one sample per hour of the week, not enough for min_samples=3
+    response = refreshed(BaselineIndex(min_samples=3)).calculate_stats()
+    assert response["green_ratio_mean"] != pytest.approx(response["green_ratio_current"])
+
+    # with one sample, the centre of the dial is the latest hour itself
+    response = refreshed(BaselineIndex(min_samples=1)).calculate_stats()
+    assert response["green_ratio_mean"] == pytest.approx(response["green_ratio_current"])
+
+
+def test_baselines_are_shared_through_the_state(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite3"))
+    writer, reader = BaselineIndex(min_samples=1, state=state), BaselineIndex(state=state)
+    writer.update("psei", "green", hourly("2024-01-01", 2), [0.5, 0.7])
+    assert reader.get("PSEI", "green").lookup("2024-01-01 01:00")["mean"] == 0.7
+
+    # a later update of the writer is reloaded by the reader
+    writer.update("PSEI", "green", hourly("2024-01-01 02:00", 1), [0.9])
+    assert reader.get("PSEI", "green").latest == pd.Timestamp("2024-01-01 02:00")
+
+
+def test_the_token_only_reads_the_stored_versions(tmp_path, monkeypatch):
+    state = SharedState(str(tmp_path / "state.sqlite3"))
+    writer, reader = BaselineIndex(state=state), BaselineIndex(state=state)
+    assert reader.token("psei") == "0.0"
+    writer.update("PSEI", "green", hourly("2024-01-01", 2), [0.5, 0.7])
+    writer.update("PSEI", "demand", hourly("2024-01-01", 1), [1.0])
+    writer.update("PSEI", "demand", hourly("2024-01-01 01:00", 1), [1.1])
+
+    def get(*args):
+        raise AssertionError("the token loaded a baseline")
+
+    monkeypatch.setattr(reader, "get", get)
+    assert reader.token("psei") == "1.2"
+
+    local = BaselineIndex()
+    assert local.token("PSEI") == "0.0"
+    local.update("PSEI", "demand", hourly("2024-01-01", 1), [1.0])
+    assert local.token("psei") == "0.1"
+
+
+def test_only_one_caller_gets_to_backfill(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite3"))
+    first, second = BaselineIndex(state=state), BaselineIndex(state=state)
+    assert first.claim_backfill("psei")
+    assert not second.claim_backfill("PSEI")
+    first.mark_backfilled("PSEI")
+    assert second.is_backfilled("psei")
+    assert not second.claim_backfill("PSEI")
+
+
+def test_stats_only_read_the_baselines(fake_eia, tmp_path):
+    baselines = BaselineIndex(min_samples=1, state=SharedState(str(tmp_path / "state.sqlite3")))
+    response = BAStats("psei", baselines=baselines).return_stats()
+    assert not baselines.is_backfilled("PSEI")
+    assert baselines.get("PSEI", "green").latest is None
+    # without a baseline the dial centre is the middle of the window
+    assert response["green_ratio_mean"] != pytest.approx(response["green_ratio_current"])
+
+
+def test_refreshes_backfill_the_baselines_once(fake_eia, tmp_path):
+    baselines = BaselineIndex(state=SharedState(str(tmp_path / "state.sqlite3")))
+    refreshed(baselines)
+    assert baselines.is_backfilled("PSEI")
+    assert baselines.get("PSEI", "green").latest is not None
+    queries = len(fake_eia.queries)
+    refreshed(baselines)
+    assert len(fake_eia.queries) == queries  # the data is cached and the backfill done
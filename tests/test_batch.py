@@ -0,0 +1,49 @@
+from conftest import UNKNOWN_BA
+from my_climate_dashboard_backend import create_app
+from my_climate_dashboard_backend.ba_stats import BAStats, get_batch_stats
+
+
+def without_created(response):
+    return {key: value for key, value in response.items() if key != "created"}
+
+
+def test_batch_fetches_every_ba_with_one_query_per_dataset(fake_eia):
+    results, errors = get_batch_stats(["psei", "CISO", "PSEI"])
+    assert errors == {}
+    assert list(results) == ["PSEI", "CISO"]
+    assert [
+        (endpoint, params["facets"]["respondent"]) for endpoint, params in fake_eia.queries
+    ] == [("fuel-type-data", ["PSEI", "CISO"]), ("region-data", ["PSEI", "CISO"])]
+
+    # the same stats as one BA at a time, computed from the cache filled by the batch
+    for ba_name, response in results.items():
+        assert without_created(BAStats(ba_name).return_stats()) == without_created(response)
+    assert len(fake_eia.queries) == 2
+
+
+def test_batch_endpoint(fake_eia):
+    client = create_app().test_client()
+    response = client.post(
+        "/my-climate-dashboard/green-energy-stats/batch", json={"ba_names": ["psei", "ciso"]}
+    )
+    assert response.status_code == 200
+    assert list(response.get_json()["results"]) == ["PSEI", "CISO"]
+    assert client.post("/my-climate-dashboard/green-energy-stats/batch", json={}).status_code == 400
+
+
+def test_batch_reports_unknown_bas_next_to_the_known_ones(fake_eia):
+    results, errors = get_batch_stats(["psei", UNKNOWN_BA])
+    assert list(results) == ["PSEI"]
+    assert list(errors) == [UNKNOWN_BA]
+
+
+def test_batch_endpoint_reports_unknown_bas_per_ba(fake_eia):
+    client = create_app().test_client()
+    response = client.post(
+        "/my-climate-dashboard/green-energy-stats/batch", json={"ba_names": ["psei", UNKNOWN_BA]}
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    assert list(body["results"]) == ["PSEI"]
+    assert body["results"]["PSEI"]["ba_name"] == "PSEI"
+    assert list(body["errors"]) == [UNKNOWN_BA]
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+
+import pandas as pd
+
+from my_climate_dashboard_backend import ba_stats
+from my_climate_dashboard_backend.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("timed out")
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = TTLCache(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch(previous):
+        calls.append(previous)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+
+    def get():
+        results.append(cache.get_or_fetch("key", fetch))
+
+    threads = [threading.Thread(target=get)]
+    threads[0].start()
+    assert started.wait(5)
+    threads += [threading.Thread(target=get) for _ in range(4)]
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: cache.waits == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [None]
+    assert [entry.value for entry in results] == ["value"] * 5
+    assert (cache.misses, cache.waits, cache.hits) == (1, 4, 0)
+    assert cache.get_or_fetch("key", fetch).value == "value"
+    assert cache.hits == 1
+
+
+def test_waiters_get_the_error_of_the_fetch():
+    cache = TTLCache(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fetch(previous):
+        started.set()
+        release.wait(5)
+        raise RuntimeError("EIA is down")
+
+    def get():
+        try:
+            cache.get_or_fetch("key", fetch)
+        except RuntimeError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=get), threading.Thread(target=get)]
+    threads[0].start()
+    assert started.wait(5)
+    threads[1].start()
+    wait_for(lambda: cache.waits == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2
+    assert cache.peek("key") is None
+
+
+def test_concurrent_async_misses_share_one_fetch():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    async def fetch(previous):
+        calls.append(previous)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(
+            *(cache.get_or_fetch_async("key", fetch) for _ in range(20))
+        )
+
+    entries = asyncio.run(main())
+    assert calls == [None]
+    assert {entry.value for entry in entries} == {"value"}
+    assert (cache.misses, cache.waits) == (1, 19)
+
+
+def test_async_waiters_retry_if_the_fetch_is_cancelled():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    async def fetch(previous):
+        calls.append(previous)
+        await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_fetch_async("key", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_fetch_async("key", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(main()).value == 2
+    assert len(calls) == 2
+
+
+def test_expired_entries_are_refetched_with_the_previous_value():
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, clock=clock)
+    calls = []
+
+    def fetch(previous):
+        calls.append(previous)
+        return len(calls)
+
+    assert cache.get_or_fetch("key", fetch).value == 1
+    clock.now = 59
+    assert cache.get_or_fetch("key", fetch).value == 1
+    clock.now = 60
+    assert cache.get_or_fetch("key", fetch).value == 2
+    assert calls == [None, 1]
+
+
+def test_none_is_not_stored():
+    cache = TTLCache(ttl=60)
+    assert cache.get_or_fetch("key", lambda previous: None).value is None
+    assert cache.peek("key") is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache(ttl=60, max_entries=2)
+    for key in ["a", "b", "a", "c"]:
+        cache.get_or_fetch(key, lambda previous: key.upper())
+    assert cache.peek("b") is None
+    assert cache.peek("a").value == "A" and cache.peek("c").value == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_bas_share_the_fetched_data(monkeypatch):
+    calls = []
+
+    def get_eia_grid_mix_timeseries(ba_names, **kwargs):
+        calls.append(ba_names)
+        return pd.DataFrame({
+            "period": ["2024-01-01T00"],
+            "timestamp": [pd.Timestamp(2024, 1, 1)],
+            "fueltype": ["WND"],
+            "Generation (MWh)": [1.0],
+        })
+
+    monkeypatch.setattr(ba_stats, "get_eia_grid_mix_timeseries", get_eia_grid_mix_timeseries)
+    cache = TTLCache(ttl=60)
+    for ba_name in ["psei", "PSEI", "ciso"]:
+        ba_stats.BAStats(ba_name, cache=cache).get_data_mix()
+    assert calls == [["PSEI"], ["CISO"]]
+
+    # explicit date ranges bypass the cache
+    ba_stats.BAStats("PSEI", cache=cache).get_data_mix("2024-01-01", "2024-01-02")
+    assert len(calls) == 3
+
+
+def test_put_stores_fetched_values():
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, clock=clock)
+    assert not cache.is_fresh("key")
+    cache.put("key", "value")
+    assert cache.is_fresh("key")
+    assert cache.get_or_fetch("key", lambda previous: "fetched").value == "value"
+    clock.now = 60
+    assert not cache.is_fresh("key")
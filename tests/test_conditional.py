@@ -0,0 +1,84 @@
+import pytest
+
+from my_climate_dashboard_backend import create_app
+from my_climate_dashboard_backend.cache import DATA_CACHE
+from my_climate_dashboard_backend.conditional import Validator, is_not_modified
+from my_climate_dashboard_backend.scheduler import StatsRefresher
+from my_climate_dashboard_backend.shared import SharedState
+
+STATS_URL = "/my-climate-dashboard/green-energy-stats"
+VALIDATOR = Validator('W/"0.0.0-PSEI-full"', "Mon, 01 Jan 2024 10:00:00 GMT", 60)
+
+
+@pytest.mark.parametrize("if_none_match, if_modified_since, expected", [
+    (None, None, False),
+    ('W/"0.0.0-PSEI-full"', None, True),
+    ('"0.0.0-PSEI-full"', None, True),  # weak comparison
+    ('W/"other", W/"0.0.0-PSEI-full"', None, True),
+    ("*", None, True),
+    ('W/"other"', "Mon, 01 Jan 2024 11:00:00 GMT", False),  # If-None-Match takes precedence
+    (None, "Mon, 01 Jan 2024 10:00:00 GMT", True),
+    (None, "Mon, 01 Jan 2024 09:59:59 GMT", False),
+    (None, "not a date", False),
+])
+def test_is_not_modified(if_none_match, if_modified_since, expected):
+    assert is_not_modified(VALIDATOR, if_none_match, if_modified_since) == expected
+
+
+def test_nothing_matches_without_a_validator():
+    assert not is_not_modified(None, "*")
+
+
+@pytest.fixture
+def client(fake_eia):
+    return create_app().test_client()
+
+
+def test_stats_are_not_modified_while_the_data_is_the_same(client, fake_eia):
+    response = client.get(f"{STATS_URL}?ba_name=psei")
+    assert response.status_code == 200
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert response.headers["Cache-Control"].endswith("must-revalidate")
+
+    not_modified = client.get(f"{STATS_URL}?ba_name=psei", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b""
+    assert not_modified.headers["ETag"] == etag
+    since = client.post(
+        STATS_URL, json={"ba_name": "psei"}, headers={"If-Modified-Since": last_modified}
+    )
+    assert since.status_code == 304
+    assert len(fake_eia.queries) == 2
+
+
+def test_stats_of_another_format_or_tag_are_sent(client):
+    etag = client.get(f"{STATS_URL}?ba_name=psei").headers["ETag"]
+    compact = client.get(
+        f"{STATS_URL}?ba_name=psei&format=compact", headers={"If-None-Match": etag}
+    )
+    assert compact.status_code == 200
+    other = client.get(f"{STATS_URL}?ba_name=psei", headers={"If-None-Match": 'W/"other"'})
+    assert other.status_code == 200
+
+
+def test_precomputed_stats_are_served_with_their_stored_validator(fake_eia, tmp_path, monkeypatch):
+    state = SharedState(str(tmp_path / "state.sqlite3"))
+    refresher = StatsRefresher(["PSEI"], state=state)
+    refresher.refresh("PSEI")
+    app = create_app()
+    monkeypatch.setattr(app.extensions["precomputed_stats"], "state", state)
+    client = app.test_client()
+    response = client.get(f"{STATS_URL}?ba_name=psei")
+    assert response.get_json()["created"] == refresher.lookup("PSEI").response["created"]
+    etag = response.headers["ETag"]
+
+    # the validator comes with the stored response, not from the cached data
+    DATA_CACHE.invalidate()
+    queries = len(fake_eia.queries)
+    not_modified = client.get(f"{STATS_URL}?ba_name=psei", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert len(fake_eia.queries) == queries
+
+
+def test_get_needs_a_ba_name(client):
+    assert client.get(STATS_URL).status_code == 400
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from my_climate_dashboard_backend.ba_stats import (
+    BAStats,
+    append_green_ratio,
+    green_ratio_by_period,
+)
+
+
+def test_frames_are_shared_by_requests_served_from_one_cache_entry(fake_eia):
+    first, second = BAStats("psei"), BAStats("PSEI")
+    for stats in (first, second):
+        stats.get_data_mix()
+        stats.get_data_demand()
+    assert first.create_green_df() is second.create_green_df()
+    assert first.create_demand_df() is second.create_demand_df()
+    assert len(fake_eia.queries) == 2
+
+
+def test_new_data_drops_the_memo(fake_eia):
+    stats = BAStats("psei")
+    stats.get_data_mix()
+    green_df = stats.create_green_df()
+    assert stats.create_green_df() is green_df
+
+    stats.data_mix = stats.data_mix.iloc[4:]
+    recomputed = stats.create_green_df()
+    assert recomputed is not green_df
+    assert len(recomputed) == len(green_df) - 1
+
+
+def test_appended_green_ratio_equals_a_recompute(fake_eia):
+    stats = BAStats("psei")
+    stats.get_data_mix()
+    mix = stats.mix_timeseries
+    since = mix.latest() - pd.Timedelta(hours=5)
+    window_start = mix.timestamps()[2]
+
+    previous = green_ratio_by_period(mix)
+    appended = append_green_ratio(previous, mix, since, window_start)
+    expected = green_ratio_by_period(mix.since(window_start))
+    pd.testing.assert_frame_equal(
+        appended.reset_index(drop=True), expected.reset_index(drop=True)
+    )
@@ -0,0 +1,118 @@
+import pandas as pd
+import pytest
+
+from my_climate_dashboard_backend import ba_stats
+
+
+def eia_rows(hours):
+    return [
+        {"period": f"2024-01-01T{hour:02d}", "respondent": "PSEI", "fueltype": "WND",
+         "value": str(hour)}
+        for hour in hours
+    ]
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    """
+    EIA pages of 2 rows served by a fake _get_eia_page, set pages.rows (newest first) to what
+    EIA has and pages.failing to the offsets that fail
+    """
+    class Pages:
+        rows = []
+        failing = set()
+        offsets = []
+
+    def get_page(api_url, params, offset, endpoint=None):
+        Pages.offsets.append(offset)
+        if offset in Pages.failing:
+            return None
+        rows = Pages.rows[offset:offset + ba_stats.EIA_PAGE_LENGTH]
+        return {"total": len(Pages.rows), "data": rows}
+
+    monkeypatch.setattr(ba_stats, "EIA_PAGE_LENGTH", 2)
+    monkeypatch.setattr(ba_stats, "_get_eia_page", get_page)
+    return Pages
+
+
+def download():
+    return ba_stats.get_eia_timeseries(
+        "fuel-type-data", {"respondent": ["PSEI"]}, start_date="2024-01-01",
+        end_date="2024-01-02", frequency="hourly",
+    )
+
+
+def test_download_follows_every_page(pages):
+    pages.rows = eia_rows(range(4, -1, -1))
+    dataframe = download()
+    assert sorted(pages.offsets) == [0, 2, 4]
+    assert dataframe["value"].tolist() == [4.0, 3.0, 2.0, 1.0, 0.0]
+    assert dataframe["timestamp"].dt.hour.tolist() == [4, 3, 2, 1, 0]
+
+
+def test_download_drops_rows_repeated_across_pages(pages, monkeypatch):
+    # a row published while paging shifts the older ones onto the next page
+    rows = eia_rows([3, 2, 1, 0])
+    served = {0: rows[0:2], 2: [rows[1], rows[2]], 4: [rows[3]]}
+    monkeypatch.setattr(
+        ba_stats, "_get_eia_page",
+        lambda api_url, params, offset, endpoint=None: {"total": 5, "data": served[offset]},
+    )
+    assert download()["value"].tolist() == [3.0, 2.0, 1.0, 0.0]
+
+
+def test_download_of_a_single_page(pages):
+    pages.rows = eia_rows([1, 0])
+    assert download()["value"].tolist() == [1.0, 0.0]
+    assert pages.offsets == [0]
+
+
+def test_download_of_an_empty_range_is_an_empty_frame(pages):
+    dataframe = download()
+    assert pages.offsets == [0]
+    assert len(dataframe) == 0
+    assert {"period", "timestamp", "value"} <= set(dataframe.columns)
+
+
+def test_download_fails_if_a_page_fails(pages):
+    pages.rows = eia_rows(range(4, -1, -1))
+    pages.failing = {2}
+    assert download() is None
+
+
+@pytest.mark.parametrize("frequency, periods, expected", [
+    ("hourly", ["2024-01-01T05", "2024-01-01T04"], ["2024-01-01 05:00", "2024-01-01 04:00"]),
+    ("daily", ["2024-01-02", "2024-01-01"], ["2024-01-02", "2024-01-01"]),
+    ("monthly", ["2024-02", "2024-01"], ["2024-02-01", "2024-01-01"]),
+    (None, ["2024-01-01T05", "2024-01-01T04"], ["2024-01-01 05:00", "2024-01-01 04:00"]),
+])
+def test_periods_are_parsed_in_one_call(frequency, periods, expected):
+    parsed = ba_stats.parse_eia_periods(pd.Series(periods), frequency)
+    assert parsed.tolist() == pd.to_datetime(expected).tolist()
+
+
+def test_mixed_utc_offsets_are_parsed_row_by_row():
+    parsed = ba_stats.parse_eia_periods(pd.Series(["2024-03-10T01-08", "2024-03-10T03-07"]))
+    assert [timestamp.utcoffset().total_seconds() / 3600 for timestamp in parsed] == [-8, -7]
+
+
+def test_label_columns_are_categorical(pages):
+    pages.rows = eia_rows(range(4, -1, -1))
+    dataframe = download()
+    assert dataframe["respondent"].dtype == "category"
+    assert dataframe["fueltype"].cat.categories.tolist() == ["WND"]
+
+
+def test_iter_pages_yields_each_page_without_repeats(pages):
+    pages.rows = eia_rows(range(4, -1, -1))
+    yielded = list(ba_stats.iter_eia_pages("fuel-type-data", {}, "2024-01-01", "2024-01-02"))
+    assert [[row["value"] for row in rows] for rows in yielded] == [["4", "3"], ["2", "1"], ["0"]]
+
+
+def test_iter_pages_raises_if_a_page_fails(pages):
+    pages.rows = eia_rows(range(4, -1, -1))
+    pages.failing = {2}
+    yielded = ba_stats.iter_eia_pages("fuel-type-data", {}, "2024-01-01", "2024-01-02")
+    assert len(next(yielded)) == 2
+    with pytest.raises(RuntimeError):
+        next(yielded)
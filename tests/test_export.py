@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import UNKNOWN_BA
+from my_climate_dashboard_backend import ba_stats, create_app
+from my_climate_dashboard_backend.export import INCOMPLETE_RECORD
+
+EXPORT_URL = "/my-climate-dashboard/export"
+
+
+def test_export_ndjson(fake_eia):
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?ba_name=psei&dataset=mix&start=2024-01-01&end=2024-01-02"
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert 'filename="PSEI-mix-2024-01-01-2024-01-02.ndjson"' in (
+        response.headers["Content-Disposition"]
+    )
+    rows = [json.loads(line) for line in response.data.splitlines()]
+    assert len(rows) == 48 * 4
+    assert {row["respondent"] for row in rows} == {"PSEI"}
+    assert [endpoint for endpoint, params in fake_eia.queries] == ["fuel-type-data"]
+
+
+def test_export_csv_has_one_header(fake_eia, monkeypatch):
+    monkeypatch.setattr(ba_stats, "EIA_PAGE_LENGTH", 50)
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?ba_name=psei&dataset=demand&start=2024-01-01&end=2024-01-02&format=csv"
+    )
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 48 * 2
+    assert {row["type"] for row in rows} == {"D", "DF"}
+    assert len(fake_eia.queries) == 2
+
+
+def test_export_of_a_range_without_rows_is_an_empty_file(fake_eia):
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?ba_name={UNKNOWN_BA}&dataset=mix&start=2024-01-01&end=2024-01-02"
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.data == b""
+
+
+def test_export_checks_its_arguments(fake_eia):
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?dataset=prices&start=2024-01-01&end=January&format=xml"
+    )
+    assert response.status_code == 400
+    assert set(response.get_json()["message"]) == {"ba_name", "dataset", "end", "format"}
+    assert fake_eia.queries == []
+
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?ba_name=psei&start=2024-01-02&end=2024-01-01"
+    )
+    assert response.status_code == 400
+    assert set(response.get_json()["message"]) == {"end"}
+
+
+def test_export_dates_are_compared_once_parsed(fake_eia):
+    client = create_app().test_client()
+    # as strings, "20240101" sorts after "2024-01-02"
+    response = client.get(f"{EXPORT_URL}?ba_name=psei&start=20240101&end=2024-01-02")
+    assert response.status_code == 200
+    assert 'filename="PSEI-mix-2024-01-01-2024-01-02.ndjson"' in (
+        response.headers["Content-Disposition"]
+    )
+    assert fake_eia.queries[0][1]["start"] == "2024-01-01"
+    response = client.get(f"{EXPORT_URL}?ba_name=psei&start=20240103&end=2024-01-02")
+    assert set(response.get_json()["message"]) == {"end"}
+
+
+def test_export_fails_if_eia_fails_at_once(monkeypatch):
+    monkeypatch.setattr(ba_stats, "_get_eia_page", lambda *args, **kwargs: None)
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?ba_name=psei&start=2024-01-01&end=2024-01-02"
+    )
+    assert response.status_code == 502
+
+
+@pytest.fixture
+def failing_after_the_first_page(fake_eia, monkeypatch):
+    def get_page(api_url, params, offset, endpoint=None):
+        return fake_eia.get_page(api_url, params, offset, endpoint) if offset == 0 else None
+
+    monkeypatch.setattr(ba_stats, "EIA_PAGE_LENGTH", 50)
+    monkeypatch.setattr(ba_stats, "_get_eia_page", get_page)
+
+
+def test_ndjson_export_ends_with_an_error_if_eia_fails_midway(failing_after_the_first_page):
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?ba_name=psei&start=2024-01-01&end=2024-01-02"
+    )
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.data.splitlines()]
+    assert len(rows) == 50 + 1
+    assert rows[-1] == INCOMPLETE_RECORD
+
+
+def test_csv_export_is_aborted_if_eia_fails_midway(failing_after_the_first_page):
+    response = create_app().test_client().get(
+        f"{EXPORT_URL}?ba_name=psei&start=2024-01-01&end=2024-01-02&format=csv"
+    )
+    with pytest.raises(RuntimeError):
+        response.get_data()
@@ -0,0 +1,36 @@
+import json
+
+import requests
+
+from my_climate_dashboard_backend import ba_stats
+from my_climate_dashboard_backend.ba_stats import BAStats
+
+
+def test_pages_follow_the_requested_offset(eia_url):
+    url = f"{eia_url}/fuel-type-data/data/"
+    params = {
+        "frequency": "hourly",
+        "facets": {"respondent": ["PSEI"]},
+        "start": "2024-01-01",
+        "end": "2024-01-02",
+        "length": 100,
+    }
+    first, second = (
+        requests.get(url, headers={"X-Params": json.dumps({**params, "offset": offset})})
+        .json()["response"]
+        for offset in (0, 100)
+    )
+    assert int(first["total"]) == int(second["total"]) > 100
+    assert len(first["data"]) == 100
+    assert first["data"][0] != second["data"][0]
+    assert {row["respondent"] for row in first["data"]} == {"PSEI"}
+
+
+def test_stats_end_to_end(eia, monkeypatch):
+    monkeypatch.setattr(ba_stats, "EIA_PAGE_LENGTH", 500)
+    response = BAStats("psei").return_stats()
+    assert response["ba_name"] == "PSEI"
+    # the synthetic server has 7 fuel types per BA
+    assert len(response["source_ratio_current"]["mix_ratio"]) == 7
+    assert 0 <= response["green_ratio_current"] <= 1
+    assert response["data_timeseries"]["demand_data"][0]["demand"]
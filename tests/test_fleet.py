@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from my_climate_dashboard_backend.ba_stats import BAStats
+from my_climate_dashboard_backend.baselines import BaselineIndex
+from my_climate_dashboard_backend.fleet import (
+    SharedTimeseries, compute_fleet_stats, fetch_fleet_data,
+)
+from my_climate_dashboard_backend.shared import SharedState
+from my_climate_dashboard_backend.timeseries import CompactTimeseries
+
+
+def without_created(response):
+    return {key: value for key, value in response.items() if key != "created"}
+
+
+def test_shared_timeseries_round_trip():
+    timeseries = {
+        "PSEI": CompactTimeseries.from_frame(pd.DataFrame({
+            "period": ["2024-01-01T01", "2024-01-01T01", "2024-01-01T00", "2024-01-01T00"],
+            "timestamp": pd.to_datetime(
+                ["2024-01-01 01:00", "2024-01-01 01:00", "2024-01-01 00:00", "2024-01-01 00:00"]
+            ),
+            "fueltype": ["WND", "SUN", "WND", "SUN"],
+            "type-name": ["Wind", "Solar", "Wind", "Solar"],
+            "Generation (MWh)": [1.5, None, 2.5, 0.5],
+        }), "fueltype"),
+        "CISO": CompactTimeseries.from_frame(pd.DataFrame({
+            "period": ["2024-01-02T00"],
+            "timestamp": pd.to_datetime(["2024-01-02 00:00"]),
+            "fueltype": ["COL"],
+            "type-name": ["Coal"],
+            "Generation (MWh)": [3.5],
+        }), "fueltype"),
+    }
+    shared = SharedTimeseries.pack(timeseries)
+    try:
+        attached = SharedTimeseries.attach(shared.manifest)
+        for key, original in timeseries.items():
+            copy = attached.timeseries(key)
+            np.testing.assert_array_equal(copy.hours, original.hours)
+            np.testing.assert_array_equal(copy.values, original.values)
+            assert (copy.nulls is None) == (original.nulls is None)
+            assert not copy.values.flags.writeable
+            assert list(copy.series) == list(original.series)
+            pd.testing.assert_frame_equal(copy.to_frame(), original.to_frame())
+            del copy  # views of the shared memory, which can't be closed while they exist
+        attached.close()
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_read_only_baselines_are_never_written():
+    baselines = BaselineIndex(read_only=True)
+    with pytest.raises(RuntimeError):
+        baselines.update("PSEI", "green_ratio", pd.to_datetime(["2024-01-01"]), np.array([0.5]))
+    with pytest.raises(RuntimeError):
+        baselines.mark_backfilled("PSEI")
+    assert not baselines.claim_backfill("PSEI")
+
+
+def test_fleet_stats_match_the_in_process_ones(fake_eia):
+    data, errors = fetch_fleet_data(["psei", "CISO", "PSEI"])
+    assert errors == {} and list(data["mix"]) == ["PSEI", "CISO"]
+    assert isinstance(data["mix"]["PSEI"], CompactTimeseries)
+    assert len(fake_eia.queries) == 2  # one query per dataset for the whole fleet
+
+    results, errors, timings = compute_fleet_stats(data, workers=1, baselines=BaselineIndex())
+    assert errors == {} and set(results) == {"PSEI", "CISO"}
+    assert timings["startup"] > 0 and timings["compute"] > 0
+    for ba_name, response in results.items():
+        stats = BAStats(ba_name, baselines=BaselineIndex())
+        stats.mix_timeseries = data["mix"][ba_name]
+        stats.demand_timeseries = data["demand"][ba_name]
+        assert without_created(response) == without_created(stats.calculate_stats())
+
+
+def test_fleet_workers_leave_the_shared_state_alone(fake_eia, tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite3"))
+    data, _ = fetch_fleet_data(["PSEI"])
+
+    results, errors, _ = compute_fleet_stats(
+        data, workers=1, baselines=BaselineIndex(state=state)
+    )
+    assert errors == {} and set(results) == {"PSEI"}
+    for table in ["baseline_samples", "baseline_series", "baseline_backfills"]:
+        assert state.execute(f"SELECT count(*) FROM {table}").fetchone() == (0,)
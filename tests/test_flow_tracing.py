@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.flow_tracing_benchmark import synthetic_grid
+from my_climate_dashboard_backend.flow_tracing import UNKNOWN_FUEL, FlowNetwork
+from my_climate_dashboard_backend.timeseries import CompactTimeseries
+
+HOUR = pd.Timestamp(2024, 1, 1)
+
+
+def mix(generation):
+    """
+    {ba_name: mix CompactTimeseries} of one hour from {ba_name: {fueltype: MWh}}
+    """
+    return {
+        ba_name: CompactTimeseries.from_frame(
+            pd.DataFrame({
+                "timestamp": [HOUR] * len(fuels),
+                "fueltype": list(fuels),
+                "Generation (MWh)": list(fuels.values()),
+            }),
+            "fueltype",
+        )
+        for ba_name, fuels in generation.items()
+    }
+
+
+def interchange(flows):
+    """
+    Interchange frame from {(fromba, toba): MWh}, reported by both ends like EIA does
+    """
+    rows = [
+        row for (from_ba, to_ba), value in flows.items()
+        for row in [(from_ba, to_ba, value), (to_ba, from_ba, -value)]
+    ]
+    return pd.DataFrame({
+        "timestamp": [HOUR] * len(rows),
+        "fromba": [row[0] for row in rows],
+        "toba": [row[1] for row in rows],
+        "Interchange (MWh)": [row[2] for row in rows],
+    })
+
+
+def chain():
+    # A exports half its coal to B, which passes 50 MWh of its mixed pool on to C
+    return FlowNetwork.from_timeseries(
+        mix({"A": {"COL": 100.0}, "B": {"WND": 100.0}, "C": {"WND": 0.0}}),
+        interchange({("A", "B"): 50.0, ("B", "C"): 50.0}),
+    )
+
+
+def test_pools_mix_imports_over_several_hops():
+    network = chain()
+    assert network.ba_names == ["A", "B", "C"]
+    consumption_mix = network.consumption_mix().set_index(["ba_name", "fueltype"])
+    assert consumption_mix.loc[("A", "COL"), "Consumption (MWh)"] == pytest.approx(50)
+    assert consumption_mix.loc[("B", "COL"), "share"] == pytest.approx(1 / 3)
+    assert consumption_mix.loc[("B", "WND"), "Consumption (MWh)"] == pytest.approx(200 / 3)
+    # C only imports from B, but a third of that is A's coal
+    assert consumption_mix.loc[("C", "COL"), "Consumption (MWh)"] == pytest.approx(50 / 3)
+    assert consumption_mix.loc[("C", "WND"), "Consumption (MWh)"] == pytest.approx(100 / 3)
+
+
+def test_usage_by_source_follows_every_hop():
+    usage = chain().usage_by_source("c").set_index(["fromba", "generation_type"])["Usage (MWh)"]
+    assert usage.to_dict() == pytest.approx({("A", "COL"): 50 / 3, ("B", "WND"): 100 / 3})
+
+
+def test_bas_without_mix_supply_what_they_export():
+    network = FlowNetwork.from_timeseries(
+        # BCHA (British Columbia) reports interchange but no fuel mix
+        mix({"A": {"COL": 100.0}}), interchange({("BCHA", "A"): 100.0})
+    )
+    assert network.fuel_types == ["COL", UNKNOWN_FUEL]
+    shares = network.consumption_mix().set_index(["ba_name", "fueltype"])["share"]
+    assert shares[("A", "COL")] == pytest.approx(0.5)
+    assert shares[("A", UNKNOWN_FUEL)] == pytest.approx(0.5)
+
+
+def test_region_aggregates_are_left_out():
+    network = FlowNetwork.from_timeseries(
+        mix({"A": {"COL": 100.0}, "B": {"WND": 100.0}, "US48": {"COL": 100.0, "WND": 100.0}}),
+        interchange({("A", "B"): 50.0, ("NW", "A"): 20.0}),
+    )
+    assert network.ba_names == ["A", "B"]
+    assert network.fuel_types == ["COL", "WND"]
+    consumed = network.consumption_mix().groupby("ba_name")["Consumption (MWh)"].sum()
+    assert consumed.to_dict() == pytest.approx({"A": 50.0, "B": 150.0})
+
+
+def test_synthetic_grid_conserves_energy():
+    network = FlowNetwork.from_timeseries(*synthetic_grid(20, 1))
+    pool = network.generation.sum(axis=2) + network.flows.sum(axis=1)
+    overexported = np.clip(network.flows.sum(axis=2) - pool, 0, None).sum(axis=1)
+    consumed = network.consumption_mix().groupby("timestamp")["Consumption (MWh)"].sum()
+    shares = network.pool_shares()[..., :len(network.fuel_types)].sum(axis=2)
+    assert np.allclose(shares[pool > 0], 1)
+    assert np.allclose(consumed, network.generation.sum(axis=(1, 2)) + overexported)
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from my_climate_dashboard_backend import ba_stats
+from my_climate_dashboard_backend.cache import TTLCache
+
+START = pd.Timestamp(2024, 1, 1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def eia(monkeypatch):
+    """
+    Fake EIA mix endpoint serving eia.newest[fueltype] hours of data from START, each value being
+    eia.version, and recording the start of each query in eia.starts
+    """
+    class EIA:
+        newest = {"WND": 30, "SUN": 28}
+        version = 1
+        starts = []
+
+    def get_eia_grid_mix_timeseries(ba_names, start_date, end_date, frequency):
+        EIA.starts.append(start_date)
+        start = pd.Timestamp(start_date)
+        rows = [
+            {"period": timestamp.strftime("%Y-%m-%dT%H"), "timestamp": timestamp,
+             "fueltype": fueltype, "Generation (MWh)": float(EIA.version)}
+            for hour in range(max(EIA.newest.values()), -1, -1)
+            for fueltype, newest in EIA.newest.items()
+            for timestamp in [START + pd.Timedelta(hours=hour)]
+            if hour <= newest and timestamp >= start
+        ]
+        return pd.DataFrame(rows)
+
+    monkeypatch.setattr(ba_stats, "get_eia_grid_mix_timeseries", get_eia_grid_mix_timeseries)
+    monkeypatch.setattr(
+        ba_stats, "default_window", lambda *window_days: ("2024-01-01", "2024-01-03")
+    )
+    return EIA
+
+
+def mix(cache):
+    stats = ba_stats.BAStats("PSEI", cache=cache)
+    stats.get_data_mix()
+    return stats.data_mix
+
+
+def test_expired_data_is_refreshed_from_the_oldest_newest_period(eia):
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, clock=clock)
+    assert len(mix(cache)) == 31 + 29
+    assert eia.starts == ["2024-01-01"]
+
+    eia.newest, eia.version = {"WND": 31, "SUN": 31}, 2
+    clock.now = 60
+    data_mix = mix(cache)
+    # SUN's newest hour was 28, refetched with 2 hours of overlap for revisions
+    assert eia.starts[1] == "2024-01-02T02"
+    assert len(data_mix) == 64
+    by_hour = data_mix.groupby("timestamp")["Generation (MWh)"].max()
+    assert (by_hour[by_hour.index < START + pd.Timedelta(hours=26)] == 1).all()
+    assert (by_hour[by_hour.index >= START + pd.Timedelta(hours=26)] == 2).all()
+    assert not data_mix.duplicated(["timestamp", "fueltype"]).any()
+
+
+def test_refresh_fetches_everything_when_disabled(eia):
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, clock=clock)
+    ba_stats.BAStats("PSEI", cache=cache, incremental=False).get_data_mix()
+    clock.now = 60
+    ba_stats.BAStats("PSEI", cache=cache, incremental=False).get_data_mix()
+    assert eia.starts == ["2024-01-01", "2024-01-01"]
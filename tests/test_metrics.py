@@ -0,0 +1,49 @@
+from my_climate_dashboard_backend import create_app
+from my_climate_dashboard_backend.metrics import CallbackMetric, Counter, Histogram
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test", ["stage"], buckets=(0.1, 1.0))
+    for value in [0.05, 0.5, 0.5, 5.0]:
+        histogram.observe(value, "fetch")
+    assert histogram.render() == [
+        "# HELP climate_dashboard_test_seconds Test",
+        "# TYPE climate_dashboard_test_seconds histogram",
+        'climate_dashboard_test_seconds_bucket{stage="fetch",le="0.1"} 1',
+        'climate_dashboard_test_seconds_bucket{stage="fetch",le="1.0"} 3',
+        'climate_dashboard_test_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'climate_dashboard_test_seconds_sum{stage="fetch"} 6.05',
+        'climate_dashboard_test_seconds_count{stage="fetch"} 4',
+    ]
+
+
+def test_timer_decorator_observes_every_call():
+    histogram = Histogram("test_seconds", "Test", ["stage"])
+
+    @histogram.time("work")
+    def work():
+        pass
+
+    work()
+    work()
+    assert 'climate_dashboard_test_seconds_count{stage="work"} 2' in histogram.render()
+
+
+def test_counters_and_callbacks_escape_labels():
+    counter = Counter("test_total", "Test", ["endpoint"])
+    counter.inc('say "hi"')
+    counter.inc('say "hi"', amount=2)
+    assert counter.render()[-1] == 'climate_dashboard_test_total{endpoint="say \\"hi\\""} 3'
+
+    callback = CallbackMetric("test_hits", "Test", "gauge", lambda: {(): 7})
+    assert callback.render()[-1] == "climate_dashboard_test_hits 7"
+
+
+def test_metrics_endpoint_after_a_request(fake_eia):
+    client = create_app().test_client()
+    client.post("/my-climate-dashboard/green-energy-stats", json={"ba_name": "psei"})
+    response = client.get("/my-climate-dashboard/metrics")
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert 'climate_dashboard_stage_seconds_count{stage="create_green_df"}' in text
+    assert 'climate_dashboard_eia_rows_fetched_total{endpoint="fuel-type-data"}' in text
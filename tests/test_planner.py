@@ -0,0 +1,86 @@
+import datetime
+import itertools
+
+import numpy as np
+import pytest
+
+from conftest import UNKNOWN_BA
+from my_climate_dashboard_backend import create_app
+from my_climate_dashboard_backend.planner import best_windows, current_hour, plan_green_windows
+
+WINDOWS_URL = "/my-climate-dashboard/green-windows"
+
+
+def brute_force(scores, duration):
+    means = [
+        np.mean(scores[start:start + duration]) for start in range(len(scores) - duration + 1)
+    ]
+    means = [-np.inf if np.isnan(mean) else mean for mean in means]
+    best = int(np.argmax(means)) if means and np.isfinite(max(means)) else -1
+    return best, (means[best] if best >= 0 else np.nan)
+
+
+def test_current_hour_is_the_utc_hour_since_the_epoch():
+    now = datetime.datetime(2024, 3, 1, 13, 59, tzinfo=datetime.timezone.utc).timestamp()
+    assert current_hour(now) == int(now // 3600)
+    assert current_hour(now + 60) == current_hour(now) + 1
+
+
+def test_best_windows_skip_unknown_hours():
+    scores = [[0.1, 0.9, np.nan, 0.8, 0.7, 0.2]]
+    starts, means = best_windows(scores, [1, 2, 7])
+    assert starts.tolist() == [[1, 3, -1]]
+    np.testing.assert_allclose(means, [[0.9, 0.75, np.nan]])
+
+
+def test_best_windows_match_a_brute_force_search():
+    rng = np.random.default_rng(0)
+    scores = rng.uniform(size=(5, 24))
+    scores[rng.uniform(size=scores.shape) < 0.1] = np.nan
+    durations = [1, 2, 3, 6, 12]
+    starts, means = best_windows(scores, durations)
+    for row, (position, duration) in itertools.product(range(5), enumerate(durations)):
+        start, mean = brute_force(scores[row], duration)
+        assert starts[row, position] == start
+        np.testing.assert_allclose(means[row, position], mean)
+
+
+def test_plans_rank_the_upcoming_hours(fake_eia):
+    plans, errors = plan_green_windows(["psei", "CISO"], [3, 1], horizon_hours=6)
+    assert errors == {} and list(plans) == ["PSEI", "CISO"]
+    plan = plans["PSEI"]
+    ratios = [hour["expected_green_ratio"] for hour in plan["ranked_hours"]]
+    assert ratios == sorted(ratios, reverse=True)
+    assert [window["duration_hours"] for window in plan["windows"]] == [1, 3]
+    # one query per dataset for both BAs
+    assert len(fake_eia.queries) == 2
+
+
+def test_windows_start_from_the_current_utc_hour(eia):
+    now = datetime.datetime.now(datetime.timezone.utc).replace(minute=30, second=0, microsecond=0)
+    plans, errors = plan_green_windows(["psei", UNKNOWN_BA], [2], horizon_hours=6,
+                                       now=now.timestamp())
+    assert list(errors) == [UNKNOWN_BA]
+    plan = plans["PSEI"]
+    assert plan["forecast_start"] == now.strftime("%Y-%m-%d %H:00:00")
+    assert len(plan["ranked_hours"]) == 6
+    window = plan["windows"][0]
+    start = datetime.datetime.fromisoformat(window["start"])
+    assert start >= now.replace(minute=0, tzinfo=None)
+    assert datetime.datetime.fromisoformat(window["end"]) - start == datetime.timedelta(hours=2)
+
+    earlier = now - datetime.timedelta(hours=3)
+    plans, _ = plan_green_windows(["PSEI"], [2], horizon_hours=6, now=earlier.timestamp())
+    assert plans["PSEI"]["forecast_start"] == earlier.strftime("%Y-%m-%d %H:00:00")
+
+
+@pytest.mark.parametrize("body, field", [
+    ({"ba_names": ["PSEI"], "horizon_hours": 100}, "horizon_hours"),
+    ({"ba_names": ["PSEI"], "durations": [0]}, "durations"),
+    ({"ba_names": ["PSEI"], "horizon_hours": 4, "durations": [5]}, "durations"),
+    ({}, "ba_names"),
+])
+def test_windows_endpoint_checks_its_arguments(body, field):
+    response = create_app().test_client().post(WINDOWS_URL, json=body)
+    assert response.status_code == 400
+    assert field in response.get_json()["message"]
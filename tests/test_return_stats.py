@@ -0,0 +1,38 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from my_climate_dashboard_backend.ba_stats import BAStats, group_positions
+
+
+def test_group_positions_in_order_of_first_appearance():
+    positions = group_positions(pd.Series(["WND", "SUN", None, "WND", "COL", "SUN"]))
+    assert list(positions) == ["WND", "SUN", "COL"]
+    assert {label: rows.tolist() for label, rows in positions.items()} == {
+        "WND": [0, 3], "SUN": [1, 5], "COL": [4],
+    }
+    assert group_positions(pd.Series([], dtype=object)) == {}
+
+
+def test_time_series_match_a_scan_per_type(fake_eia):
+    ba_stats = BAStats("psei")
+    response = json.loads(json.dumps(ba_stats.return_stats()))
+    data_mix, data_demand = ba_stats.data_mix, ba_stats.data_demand
+
+    mix_data = response["data_timeseries"]["mix_data"]
+    assert set(mix_data) == {
+        f"{name}{suffix}" for name in ["Coal", "Natural gas", "Solar", "Wind"]
+        for suffix in ["", "_timestamp"]
+    }
+    for name in ["Coal", "Natural gas", "Solar", "Wind"]:
+        rows = data_mix[data_mix["type-name"] == name]
+        assert mix_data[name] == rows["Generation (MWh)"].tolist()
+        assert mix_data[f"{name}_timestamp"] == rows["timestamp"].astype(str).tolist()
+
+    demand_data, = response["data_timeseries"]["demand_data"]  # wrapped in a list
+    for code, key in [("D", "demand"), ("DF", "forecast")]:
+        rows = data_demand[data_demand["type"] == code]
+        assert demand_data[key] == rows["Generation (MWh)"].tolist()
+        assert demand_data[f"timestamp_{key}"] == rows["timestamp"].astype(str).tolist()
+    assert np.isclose(sum(response["source_ratio_current"]["mix_ratio"].values()), 1)
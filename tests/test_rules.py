@@ -0,0 +1,164 @@
+import datetime
+
+import pytest
+
+from my_climate_dashboard_backend import create_app
+from my_climate_dashboard_backend import rules as rules_module
+from my_climate_dashboard_backend.rules import AlertRules
+from my_climate_dashboard_backend.scheduler import StatsRefresher
+from my_climate_dashboard_backend.shared import SharedState
+
+NOON = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def state(tmp_path):
+    return SharedState(str(tmp_path / "state.sqlite3"))
+
+
+@pytest.fixture
+def rules(state):
+    return AlertRules(state, max_events_per_user=3)
+
+
+def stats(green_ratio, demand_ratio=1.0):
+    return {
+        "ba_name": "PSEI",
+        "green_ratio_current": green_ratio,
+        "green_ratio_mean": 0.5,
+        "demand_ratio_current": demand_ratio,
+        "demand_ratio_mean": 1.0,
+        "source_ratio_current": {"timestamp": "2024-01-01 12:00:00"},
+    }
+
+
+def rule(**overrides):
+    return dict(
+        {"user_id": "ada", "ba_name": "psei", "metric": "green", "direction": "above",
+         "threshold": 1.2},
+        **overrides,
+    )
+
+
+def test_events_are_sent_when_a_rule_starts_and_stops_firing(rules):
+    rule_id, = rules.add_rules([rule()])
+    assert rules.evaluate(stats(0.5), now=NOON) == []
+
+    fired, = rules.evaluate(stats(0.7), now=NOON)  # above 1.2 x 0.5
+    assert (fired["rule_id"], fired["state"], fired["limit"]) == (rule_id, "firing", 0.6)
+    assert rules.evaluate(stats(0.8), now=NOON) == []
+    assert rules.rules_of("ada")[0]["firing"] is True
+
+    resolved, = rules.evaluate(stats(0.4), now=NOON)
+    assert resolved["state"] == "resolved"
+    assert [event["state"] for event in rules.events_of("ada")] == ["firing", "resolved"]
+    assert rules.events_of("ada", since=fired["id"]) == [resolved]
+
+
+def test_absolute_thresholds_and_other_users(rules):
+    rules.add_rules([
+        rule(metric="demand", direction="below", threshold=0.9, relative=False),
+        rule(user_id="bob", ba_name="OTHER"),
+    ])
+    event, = rules.evaluate(stats(0.5, demand_ratio=0.8), now=NOON)
+    assert (event["user_id"], event["metric"]) == ("ada", "demand")
+    assert rules.events_of("bob") == []
+
+
+def test_rules_keep_their_state_during_quiet_hours(rules):
+    # quiet from 11 to 14 local time, the user is at UTC+1
+    rules.add_rules([rule(quiet_hours=[11, 14], utc_offset=1)])
+    assert rules.evaluate(stats(0.7), now=NOON) == []
+    assert rules.rules_of("ada")[0]["firing"] is False
+
+    event, = rules.evaluate(stats(0.7), now=NOON + datetime.timedelta(hours=2))
+    assert event["state"] == "firing"
+
+
+def test_data_already_evaluated_is_skipped(rules):
+    rules.add_rules([rule()])
+    assert len(rules.evaluate(stats(0.7), tag="a", now=NOON)) == 1
+    assert rules.evaluate(stats(0.4), tag="a", now=NOON) == []
+    assert rules.rules_of("ada")[0]["firing"] is True
+    assert len(rules.evaluate(stats(0.4), tag="b", now=NOON)) == 1
+
+
+def test_users_keep_their_most_recent_events(rules):
+    rules.add_rules([rule()])
+    for green_ratio in [0.7, 0.4, 0.7, 0.4, 0.7]:
+        rules.evaluate(stats(green_ratio), now=NOON)
+    events = rules.events_of("ada")
+    assert [event["state"] for event in events] == ["firing", "resolved", "firing"]
+
+
+def test_events_of_several_users_are_trimmed_together(rules):
+    rules.add_rules([rule(user_id=user_id) for user_id in ["ada", "bob", "ada"]])
+    sent = []
+    for green_ratio in [0.7, 0.4, 0.7]:
+        events = rules.evaluate(stats(green_ratio), now=NOON)
+        assert [event["user_id"] for event in events] == ["ada", "bob", "ada"]
+        sent += events
+    # each keeps their 3 most recent, with the ids they were returned with
+    for user_id in ["ada", "bob"]:
+        assert rules.events_of(user_id) == [
+            event for event in sent if event["user_id"] == user_id
+        ][-3:]
+
+
+def test_rules_are_reloaded_only_when_they_change(rules, state, monkeypatch):
+    loads = []
+    from_rows = rules_module.RuleBlock.from_rows
+    monkeypatch.setattr(
+        rules_module.RuleBlock, "from_rows", lambda rows: loads.append(rows) or from_rows(rows)
+    )
+    rule_id, = rules.add_rules([rule()])
+    assert len(rules.evaluate(stats(0.7), now=NOON)) == 1
+    assert rules.evaluate(stats(0.8), now=NOON) == []
+    assert len(loads) == 1
+
+    # another process sees the new firing state, and its changes are seen here
+    other = AlertRules(state)
+    assert other.evaluate(stats(0.8), now=NOON) == []
+    other.remove_rules([rule_id])
+    assert rules.evaluate(stats(0.4), now=NOON) == []
+    assert len(loads) == 3
+    rules.add_rules([rule()])
+    assert len(rules.evaluate(stats(0.7), now=NOON)) == 1
+
+
+def test_invalid_rules_add_nothing(rules):
+    with pytest.raises(ValueError):
+        rules.add_rules([rule(), rule(metric="price")])
+    with pytest.raises(ValueError):
+        rules.add_rules([rule(quiet_hours=[22, 25])])
+    assert rules.rules_of("ada") == []
+
+
+def test_refreshes_evaluate_the_rules_of_every_ba_with_rules(fake_eia, state, rules):
+    rules.add_rules([rule(threshold=0.0, relative=False)])
+    refresher = StatsRefresher([], state=state, rules=rules)
+    assert refresher.all_ba_names() == ["PSEI"]
+    refresher.refresh("PSEI")
+    event, = rules.events_of("ada")
+    assert (event["ba_name"], event["state"]) == ("PSEI", "firing")
+
+
+def test_alert_rule_routes(monkeypatch, state):
+    monkeypatch.setattr(rules_module, "RULES", AlertRules(state))
+    client = create_app().test_client()
+    url = "/my-climate-dashboard/alert-rules"
+    assert client.post(url, json={"rules": []}).status_code == 400
+    assert client.post(url, json={"rules": [rule(direction="sideways")]}).status_code == 400
+    created = client.post(url, json={"rules": [rule(), rule(metric="demand")]})
+    assert created.status_code == 201
+    rule_ids = created.get_json()["rule_ids"]
+
+    assert client.get(url).status_code == 400
+    listed = client.get(f"{url}?user_id=ada").get_json()["rules"]
+    assert [listed_rule["rule_id"] for listed_rule in listed] == rule_ids
+    assert client.delete(f"{url}?user_id=ada&rule_ids=x").status_code == 400
+    removed = client.delete(f"{url}?user_id=ada&rule_ids={rule_ids[0]}").get_json()
+    assert removed == {"removed": 1}
+    assert client.get("/my-climate-dashboard/alert-events?user_id=ada").get_json() == {
+        "events": []
+    }
@@ -0,0 +1,76 @@
+import datetime
+
+import pytest
+
+from my_climate_dashboard_backend import ba_stats
+from my_climate_dashboard_backend.scheduler import PrecomputedStats, StatsRefresher
+from my_climate_dashboard_backend.shared import SharedState
+
+
+@pytest.fixture
+def state(tmp_path):
+    return SharedState(str(tmp_path / "state.sqlite3"))
+
+
+def test_next_refresh_is_at_the_publish_minute():
+    refresher = StatsRefresher([], publish_minute=15)
+    now = datetime.datetime(2024, 1, 1, 10, 5)
+    assert refresher.seconds_until_next_publish(now) == 10 * 60
+    assert refresher.seconds_until_next_publish(now.replace(minute=15)) == 3600
+    assert refresher.seconds_until_next_publish(now.replace(minute=50)) == 25 * 60
+
+
+def test_refreshed_responses_are_served_until_they_are_too_old(fake_eia, state):
+    refresher = StatsRefresher(["psei"], max_age_seconds=3600, state=state)
+    assert refresher.get("PSEI") is None
+    refresher.refresh("PSEI")
+    response = refresher.get("psei")
+    assert response["ba_name"] == "PSEI"
+    status = refresher.status()["ba"]["PSEI"]
+    assert status["refreshes"] == 1 and status["last_error"] is None
+
+    refresher.max_age_seconds = 0
+    assert refresher.get("PSEI") is None
+
+
+def test_refreshes_refetch_the_data(fake_eia, state):
+    refresher = StatsRefresher(["PSEI"], state=state)
+    refresher.refresh("PSEI")
+    queries = len(fake_eia.queries)
+    refresher.refresh("PSEI")
+    # the cached data is expired first, so the second refresh goes back to EIA
+    assert len(fake_eia.queries) > queries
+    assert refresher.status()["ba"]["PSEI"]["refreshes"] == 2
+
+
+def test_responses_are_shared_through_the_state(fake_eia, state):
+    StatsRefresher(["PSEI"], state=state).refresh("PSEI")
+    # e.g. a web worker, which only reads what the prewarm job refreshed
+    reader = PrecomputedStats(state=state)
+    assert reader.get("PSEI")["ba_name"] == "PSEI"
+    status = reader.status()
+    assert not status["running"]
+    assert list(status["ba"]) == ["PSEI"] and status["ba"]["PSEI"]["refreshes"] == 1
+
+
+def test_failed_refreshes_are_reported(fake_eia, monkeypatch, state):
+    def fail(*args, **kwargs):
+        raise RuntimeError("EIA is down")
+
+    monkeypatch.setattr(ba_stats, "get_eia_grid_mix_timeseries", fail)
+    refresher = StatsRefresher(["PSEI"], state=state)
+    refresher.refresh("PSEI")
+    assert refresher.get("PSEI") is None
+    assert "EIA is down" in refresher.status()["ba"]["PSEI"]["last_error"]
+
+
+def test_the_running_job_is_reported(state):
+    refresher = StatsRefresher([], publish_minute=15, state=state)
+    refresher.refresh_all = lambda: None
+    assert refresher.start()
+    try:
+        assert PrecomputedStats(state=state).status()["running"] is True
+        assert not StatsRefresher([], state=state).start()  # a second job doesn't refresh too
+    finally:
+        refresher.stop()
+    assert PrecomputedStats(state=state).status()["running"] is False
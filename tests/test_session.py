@@ -0,0 +1,73 @@
+import pytest
+import requests
+
+from my_climate_dashboard_backend import session
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.ok = status_code < 400
+
+
+@pytest.fixture
+def eia_session(monkeypatch):
+    """
+    EIASession whose requests get the responses (or raise the errors) in eia_session.replies
+    """
+    eia_session = session.EIASession(max_retries=2, backoff_base=1.0)
+    eia_session.replies, eia_session.sleeps = [], []
+
+    def get(url, **kwargs):
+        reply = eia_session.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(eia_session.session, "get", get)
+    monkeypatch.setattr(session.time, "sleep", eia_session.sleeps.append)
+    return eia_session
+
+
+def test_server_errors_are_retried(eia_session):
+    eia_session.replies = [FakeResponse(503), FakeResponse(429, {"Retry-After": "7"}),
+                           FakeResponse(200)]
+    response = eia_session.get("https://eia/fuel-type-data?api_key=secret", endpoint="mix")
+    assert response.status_code == 200
+    assert len(eia_session.sleeps) == 2
+    assert 0 <= eia_session.sleeps[0] <= 1.0
+    assert eia_session.sleeps[1] == 7.0  # Retry-After wins over the backoff
+    stats = eia_session.stats()["mix"]
+    assert (stats["requests"], stats["retries"], stats["errors"]) == (1, 2, 0)
+
+
+def test_the_last_error_response_is_returned(eia_session):
+    eia_session.replies = [FakeResponse(500)] * 3
+    assert eia_session.get("https://eia/fuel-type-data").status_code == 500
+    assert eia_session.stats()["https://eia/fuel-type-data"]["errors"] == 1
+
+
+def test_other_errors_are_not_retried(eia_session):
+    eia_session.replies = [FakeResponse(404)]
+    assert eia_session.get("https://eia/fuel-type-data").status_code == 404
+    assert eia_session.sleeps == []
+
+
+def test_connection_errors_are_retried_then_raised(eia_session):
+    eia_session.replies = [requests.ConnectionError("reset"), FakeResponse(200)]
+    assert eia_session.get("https://eia/fuel-type-data").status_code == 200
+
+    eia_session.replies = [requests.Timeout("slow")] * 3
+    with pytest.raises(requests.Timeout):
+        eia_session.get("https://eia/fuel-type-data")
+    assert len(eia_session.sleeps) == 3
+
+
+def test_retry_warnings_leave_out_the_api_key(eia_session, caplog):
+    url = "https://eia/fuel-type-data/data/?api_key=secret"
+    eia_session.replies = [requests.ConnectionError(f"Max retries exceeded with url: {url}"),
+                           FakeResponse(200)]
+    eia_session.get(url, endpoint="fuel-type-data")
+    assert "EIA fuel-type-data failed with ConnectionError, retrying" in caplog.text
+    assert "secret" not in caplog.text
@@ -0,0 +1,11 @@
+from benchmarks.startup_benchmark import measure
+
+
+def test_create_app_loads_no_heavy_module():
+    assert measure()["heavy_modules"] == []
+
+
+def test_ba_stats_still_exposes_the_data_cache():
+    from my_climate_dashboard_backend import ba_stats, cache
+
+    assert ba_stats.DATA_CACHE is cache.DATA_CACHE
@@ -0,0 +1,133 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+from my_climate_dashboard_backend.store import EIAStore
+
+pytest.importorskip("pyarrow")
+
+FACETS = {"respondent": ["PSEI"]}
+
+
+def eia_frame(start_date, end_date, value=1.0):
+    """
+    Hourly rows of PSEI from start_date to the end of end_date, newest first like EIA
+    """
+    timestamps = pd.date_range(start_date, pd.Timestamp(end_date) + pd.Timedelta(hours=23),
+                               freq="h")[::-1]
+    return pd.DataFrame({
+        "period": timestamps.strftime("%Y-%m-%dT%H"),
+        "timestamp": timestamps,
+        "respondent": "PSEI",
+        "value": value,
+    })
+
+
+class Downloads:
+    """
+    download callback for read_through, recording the start of each download
+    """
+
+    def __init__(self, end_date, value=1.0):
+        self.end_date, self.value = end_date, value
+        self.starts = []
+
+    def __call__(self, start_date):
+        self.starts.append(start_date)
+        return eia_frame(start_date, self.end_date, self.value)
+
+
+def endpoint(store):
+    return store.endpoint_key("region-data", FACETS, "hourly", "respondent")
+
+
+def test_partitions_are_written_per_respondent_and_day(tmp_path):
+    store = EIAStore(str(tmp_path))
+    store.write(endpoint(store), eia_frame("2024-01-01", "2024-01-02"), "respondent")
+    assert sorted(os.listdir(tmp_path / endpoint(store) / "PSEI")) == [
+        "2024-01-01.feather", "2024-01-02.feather",
+    ]
+    assert len(store.read(endpoint(store), ["PSEI"], datetime.date(2024, 1, 2),
+                          datetime.date(2024, 1, 2))) == 24
+
+    # rewritten periods replace the stored ones
+    store.write(endpoint(store), eia_frame("2024-01-02", "2024-01-02", value=2.0), "respondent")
+    stored = store.read(endpoint(store), ["PSEI"], datetime.date(2024, 1, 1),
+                        datetime.date(2024, 1, 2))
+    assert len(stored) == 48
+    assert sorted(stored.groupby(stored["period"].str[:10])["value"].max()) == [1.0, 2.0]
+
+
+def test_days_are_settled_once_written_long_after_they_ended(tmp_path):
+    store = EIAStore(str(tmp_path), settle_hours=48)
+    day = datetime.date(2024, 1, 1)
+    assert not store.is_settled(endpoint(store), "PSEI", day)
+    store.write(endpoint(store), eia_frame("2024-01-01", "2024-01-01"), "respondent")
+    assert store.is_settled(endpoint(store), "PSEI", day)  # written now, years after the day
+    assert not store.is_settled(endpoint(store), "PSEI", datetime.date.today())
+
+
+def test_read_through_only_downloads_the_unsettled_days(tmp_path):
+    store = EIAStore(str(tmp_path))
+    # days before the 3rd were final when they were written
+    store.is_settled = lambda endpoint, respondent, day: (
+        os.path.exists(store._partition_path(endpoint, respondent, day))
+        and day < datetime.date(2024, 1, 3)
+    )
+    downloads = Downloads("2024-01-04")
+    first = store.read_through("region-data", FACETS, "hourly", "2024-01-01", "2024-01-04",
+                               downloads)
+    assert downloads.starts == ["2024-01-01"]
+    assert len(first) == 4 * 24
+
+    downloads.value = 2.0
+    second = store.read_through("region-data", FACETS, "hourly", "2024-01-01", "2024-01-04",
+                                downloads)
+    assert downloads.starts == ["2024-01-01", "2024-01-03"]
+    assert second["period"].tolist() == first["period"].tolist()  # newest first
+    by_day = second.groupby(second["period"].str[:10])["value"].max()
+    assert by_day.tolist() == [1.0, 1.0, 2.0, 2.0]
+
+
+def test_read_through_of_settled_days_does_not_download(tmp_path):
+    store = EIAStore(str(tmp_path))
+    downloads = Downloads("2024-01-02")
+    store.read_through("region-data", FACETS, "hourly", "2024-01-01T05", "2024-01-02", downloads)
+    stored = store.read_through("region-data", FACETS, "hourly", "2024-01-01T05", "2024-01-02",
+                                downloads)
+    assert downloads.starts == ["2024-01-01T05"]
+    assert len(stored) == 48 - 5
+    assert stored["period"].iloc[-1] == "2024-01-01T05"
+
+
+def test_queries_without_a_partition_facet_are_downloaded(tmp_path):
+    store = EIAStore(str(tmp_path))
+    downloads = Downloads("2024-01-01")
+    store.read_through("region-data", {}, "hourly", "2024-01-01", "2024-01-01", downloads)
+    store.read_through("region-data", {}, "hourly", "2024-01-01", "2024-01-01", downloads)
+    assert downloads.starts == ["2024-01-01", "2024-01-01"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_days_without_rows_settle_with_an_empty_partition(tmp_path):
+    store = EIAStore(str(tmp_path))
+    days = [datetime.date(2024, 1, 1), datetime.date(2024, 1, 2)]
+    # EIA had rows for PSEI on the 1st only, and none at all for CISO
+    store.write(endpoint(store), eia_frame("2024-01-01", "2024-01-01"), "respondent",
+                respondents=["PSEI", "CISO"], days=days)
+    for respondent in ("PSEI", "CISO"):
+        for day in days:
+            assert store.is_settled(endpoint(store), respondent, day)
+    assert len(store.read(endpoint(store), ["CISO"], days[0], days[1])) == 0
+    assert len(store.read(endpoint(store), ["PSEI", "CISO"], days[0], days[1])) == 24
+
+
+def test_read_only_returns_rows_from_the_start(tmp_path):
+    store = EIAStore(str(tmp_path))
+    store.write(endpoint(store), eia_frame("2024-01-01", "2024-01-01"), "respondent")
+    stored = store.read(endpoint(store), ["PSEI"], datetime.date(2024, 1, 1),
+                        datetime.date(2024, 1, 1), start=pd.Timestamp("2024-01-01T20"))
+    assert sorted(stored["period"]) == ["2024-01-01T20", "2024-01-01T21", "2024-01-01T22",
+                                        "2024-01-01T23"]
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from my_climate_dashboard_backend.ba_stats import eia_pages_to_dataframe
+from my_climate_dashboard_backend.timeseries import CompactTimeseries, epoch_hours
+
+
+def frame(values):
+    """
+    Long format frame of {(fueltype, hour of 2024-01-01): value}
+    """
+    rows = [
+        {
+            "period": f"2024-01-01T{hour:02d}",
+            "timestamp": pd.Timestamp(2024, 1, 1, hour),
+            "respondent": "PSEI",
+            "fueltype": fueltype,
+            "type-name": {"WND": "Wind", "SUN": "Solar", "COL": "Coal"}[fueltype],
+            "Generation (MWh)": value,
+        }
+        for (fueltype, hour), value in values.items()
+    ]
+    return pd.DataFrame(rows)
+
+
+def timeseries(values):
+    return CompactTimeseries.from_frame(frame(values), "fueltype")
+
+
+def hour(number):
+    return pd.Timestamp(2024, 1, 1, number)
+
+
+def test_since_keeps_the_hours_from_timestamp_on():
+    data = timeseries({("WND", 0): 1.0, ("WND", 1): 2.0, ("SUN", 2): 3.0})
+    recent = data.since(hour(1))
+    assert recent.hours.tolist() == epoch_hours([hour(1), hour(2)]).tolist()
+    assert list(recent.series) == ["WND", "SUN"]
+    np.testing.assert_array_equal(recent.row("WND"), [2.0, np.nan])
+    np.testing.assert_array_equal(recent.row("SUN"), [np.nan, 3.0])
+    assert len(data.since(hour(3)).hours) == 0
+
+
+def test_merge_replaces_the_refetched_hours_and_trims_the_window():
+    previous = timeseries({
+        ("WND", 0): 1.0, ("WND", 1): 2.0, ("WND", 2): 3.0, ("COL", 2): 9.0,
+    })
+    # EIA revised hour 2 and published hour 3, and a fuel type shows up
+    delta = timeseries({("WND", 2): 30.0, ("WND", 3): 40.0, ("SUN", 3): 5.0})
+    merged = CompactTimeseries.merge(previous, delta, since=hour(2), window_start=hour(1))
+
+    assert merged.hours.tolist() == epoch_hours([hour(1), hour(2), hour(3)]).tolist()
+    assert list(merged.series) == ["WND", "SUN", "COL"]
+    np.testing.assert_array_equal(merged.row("WND"), [2.0, 30.0, 40.0])
+    np.testing.assert_array_equal(merged.row("SUN"), [np.nan, np.nan, 5.0])
+    # hours from since on come from the delta only, so values EIA dropped are gone
+    np.testing.assert_array_equal(merged.row("COL"), [np.nan, np.nan, np.nan])
+    assert merged.label("SUN", "type-name") == "Solar"
+    assert merged.label("COL", "type-name") == "Coal"
+
+
+def test_merge_matches_a_full_fetch():
+    full = {(fueltype, number): float(number * 10 + len(fueltype))
+            for fueltype in ("WND", "SUN") for number in range(6)}
+    previous = timeseries({key: value for key, value in full.items() if key[1] < 4})
+    delta = timeseries({key: value for key, value in full.items() if key[1] >= 3})
+    merged = CompactTimeseries.merge(previous, delta, since=hour(3), window_start=hour(0))
+
+    expected = timeseries(full)
+    assert merged.hours.tolist() == expected.hours.tolist()
+    for fueltype in ("WND", "SUN"):
+        np.testing.assert_array_equal(merged.row(fueltype), expected.row(fueltype))
+    assert merged.fingerprint == expected.fingerprint
+    pd.testing.assert_frame_equal(
+        merged.to_frame().astype({"fueltype": str, "type-name": str, "respondent": str}),
+        expected.to_frame().astype({"fueltype": str, "type-name": str, "respondent": str}),
+    )
+
+
+def test_an_empty_frame_gives_an_empty_timeseries():
+    empty = eia_pages_to_dataframe([[]], "hourly")
+    data = CompactTimeseries.from_frame(empty, "fueltype", value_column="value")
+    assert len(data) == 0 and data.values.shape == (0, 0) and len(data.series) == 0
+    assert data.latest() is None
+    assert data.to_frame().empty
+
+
+def test_null_values_are_kept_as_nan_rows():
+    data = timeseries({("WND", 0): 1.0, ("WND", 1): None, ("SUN", 1): 2.0})
+    np.testing.assert_array_equal(data.row("WND"), [1.0, np.nan])
+    assert len(data) == 3
+    round_trip = data.to_frame()
+    assert len(round_trip) == 3
+    wind = round_trip[round_trip["fueltype"] == "WND"]
+    assert wind["period"].tolist() == ["2024-01-01T01", "2024-01-01T00"]
+    np.testing.assert_array_equal(wind["Generation (MWh)"], [np.nan, 1.0])
+    # the null row changes the data as much as a value does
+    assert data.fingerprint != timeseries({("WND", 0): 1.0, ("SUN", 1): 2.0}).fingerprint
+
+
+def test_merge_keeps_the_null_rows():
+    previous = timeseries({("WND", 0): None, ("WND", 1): 2.0})
+    delta = timeseries({("WND", 1): None, ("WND", 2): 3.0})
+    merged = CompactTimeseries.merge(previous, delta, since=hour(1), window_start=hour(0))
+    np.testing.assert_array_equal(merged.row("WND"), [np.nan, np.nan, 3.0])
+    assert merged.nulls.tolist() == [[True, True, False]]
+    assert len(merged.since(hour(2))) == 1
+
+
+def test_duplicate_rows_keep_the_first_value():
+    rows = frame({("WND", 0): 1.0, ("SUN", 0): None})
+    duplicates = frame({("WND", 0): 5.0, ("SUN", 0): 4.0})
+    data = CompactTimeseries.from_frame(
+        pd.concat([rows, duplicates], ignore_index=True), "fueltype"
+    )
+    # the first row of each, unless it has no value and a later one does
+    np.testing.assert_array_equal(data.row("WND"), [1.0])
+    np.testing.assert_array_equal(data.row("SUN"), [4.0])
+    assert data.nulls is None and len(data) == 2
@@ -0,0 +1,94 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from my_climate_dashboard_backend import create_app, encoding
+from my_climate_dashboard_backend.ba_stats import compact_stats
+from my_climate_dashboard_backend.encoding import accepted_encodings, compress, dumps
+
+
+def stats_response():
+    return {
+        "ba_name": "PSEI",
+        "data_timeseries": {
+            "demand_data": [{
+                "timestamp_demand": ["2024-01-01 01:00:00", "2024-01-01 00:00:00"],
+                "demand": [110.0, 100.0],
+                "timestamp_forecast": ["2024-01-01 02:00:00", "2024-01-01 01:00:00"],
+                "forecast": [120.0, 115.0],
+            }],
+            "mix_data": {
+                "Wind": [10.0, 20.0],
+                "Wind_timestamp": ["2024-01-01 00:00:00", "2024-01-01 01:00:00"],
+            },
+        },
+    }
+
+
+def test_compact_stats_share_one_timestamp_axis():
+    response = stats_response()
+    compact = compact_stats(response)
+    assert response["data_timeseries"]["mix_data"]  # the original is left alone
+    assert compact["ba_name"] == "PSEI"
+    assert json.loads(dumps(compact["data_timeseries"])) == {
+        "format": "compact",
+        "timestamps": ["2024-01-01 00:00:00", "2024-01-01 01:00:00", "2024-01-01 02:00:00"],
+        "demand": [100.0, 110.0, None],
+        "forecast": [None, 115.0, 120.0],
+        "mix": {"Wind": [10.0, 20.0, None]},
+    }
+
+
+def test_dumps_numpy_values():
+    assert json.loads(dumps({"a": np.array([1.5, np.nan]), "b": np.int64(3)})) == {
+        "a": [1.5, None], "b": 3,
+    }
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, set()),
+    ("gzip, deflate, br", {"gzip", "deflate", "br"}),
+    ("gzip;q=0, br;q=0.5", {"br"}),
+    ("GZIP;q=1.0, *;q=0.0", {"gzip"}),
+])
+def test_accepted_encodings(accept_encoding, expected):
+    assert accepted_encodings(accept_encoding) == expected
+
+
+def test_compress_negotiation(monkeypatch):
+    body = b"x" * encoding.MIN_COMPRESS_BYTES
+    assert compress(body[:-1], "gzip") == (body[:-1], None)
+    assert compress(body, "identity") == (body, None)
+    compressed, content_encoding = compress(body, "gzip")
+    assert content_encoding == "gzip" and gzip.decompress(compressed) == body
+
+    # brotli is preferred when it is installed, gzip is the fallback
+    monkeypatch.setattr(encoding, "brotli", None)
+    assert compress(body, "br, gzip")[1] == "gzip"
+    assert compress(body, "br") == (body, None)
+
+    class FakeBrotli:
+        @staticmethod
+        def compress(body, quality):
+            return b"br:" + body
+
+    monkeypatch.setattr(encoding, "brotli", FakeBrotli)
+    assert compress(body, "gzip, br") == (b"br:" + body, "br")
+    assert compress(body, "gzip, br;q=0")[1] == "gzip"
+
+
+def test_endpoint_compact_and_gzip(fake_eia):
+    client = create_app().test_client()
+    response = client.post(
+        "/my-climate-dashboard/green-energy-stats?format=compact",
+        json={"ba_name": "psei"},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    data_timeseries = json.loads(gzip.decompress(response.data))["data_timeseries"]
+    assert data_timeseries["format"] == "compact"
+    assert len(data_timeseries["timestamps"]) == len(data_timeseries["demand"])